@@ -0,0 +1,104 @@
+"""Benchmark concurrent retrieval: sync client in executor threads vs async client.
+
+Simulates N users whose research steps each fan out M queries at the same
+time, against a local stand-in server. The "sync" run is the previous
+implementation, `WeaviateVectorStore` on the synchronous client, whose
+`ainvoke` runs in the event loop's default thread pool. The "async" run uses
+`make_weaviate_retriever` with pooled async clients.
+
+Usage:
+    PYTHONPATH=$(pwd) python _scripts/benchmarks/async_retrieval.py --users 16 --queries 5
+"""
+
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+from typing import Awaitable, Callable
+
+from fake_weaviate import FakeWeaviateClient, FakeWeaviateServer, connect_async
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_weaviate import WeaviateVectorStore
+
+from backend.configuration import BaseConfiguration
+from backend.constants import WEAVIATE_DOCS_INDEX_NAME
+from backend.retrieval import make_weaviate_retriever
+from backend.weaviate_pool import WeaviateClientPool
+
+embeddings = DeterministicFakeEmbedding(size=64)
+
+
+async def run(
+    retrieve: Callable[[str], Awaitable[None]], users: int, queries: int
+) -> tuple[float, list[float]]:
+    async def timed(query: str) -> float:
+        start = time.perf_counter()
+        await retrieve(query)
+        return time.perf_counter() - start
+
+    async def user(u: int) -> list[float]:
+        return await asyncio.gather(
+            *(timed(f"user {u} query {q}") for q in range(queries))
+        )
+
+    start = time.perf_counter()
+    per_user = await asyncio.gather(*(user(u) for u in range(users)))
+    return time.perf_counter() - start, [t for ts in per_user for t in ts]
+
+
+def report(name: str, wall: float, latencies: list[float]) -> None:
+    ms = sorted(t * 1000 for t in latencies)
+    p95 = ms[int(0.95 * (len(ms) - 1))]
+    print(
+        f"{name:<6} wall={wall * 1000:8.1f}ms p50={statistics.median(ms):7.2f}ms "
+        f"p95={p95:7.2f}ms throughput={len(ms) / wall:7.1f} queries/s"
+    )
+
+
+async def main(args: argparse.Namespace) -> None:
+    with FakeWeaviateServer(query_latency=args.query_ms / 1000) as server:
+        # one sync client per executor thread, opened up front
+        local = threading.local()
+
+        def thread_store() -> WeaviateVectorStore:
+            if not hasattr(local, "store"):
+                local.store = WeaviateVectorStore(
+                    client=FakeWeaviateClient(server.address),
+                    index_name=WEAVIATE_DOCS_INDEX_NAME,
+                    text_key="text",
+                    embedding=embeddings,
+                    attributes=["source", "title"],
+                )
+            return local.store
+
+        async def retrieve_sync(query: str) -> None:
+            loop = asyncio.get_running_loop()
+            store = await loop.run_in_executor(None, thread_store)
+            await store.as_retriever(search_kwargs={"k": 6}).ainvoke(query)
+
+        report("sync", *await run(retrieve_sync, args.users, args.queries))
+
+        configuration = BaseConfiguration(search_kwargs={"k": 6})
+        pool = WeaviateClientPool(
+            lambda: connect_async(server.address), max_idle=args.users
+        )
+
+        async def retrieve_async(query: str) -> None:
+            async with make_weaviate_retriever(
+                configuration, embeddings, pool
+            ) as retriever:
+                await retriever.ainvoke(query)
+
+        # warm the pool so both runs start with open connections
+        await run(retrieve_async, args.users, 1)
+        report("async", *await run(retrieve_async, args.users, args.queries))
+        await pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=16)
+    parser.add_argument("--queries", type=int, default=5)
+    parser.add_argument("--query-ms", type=float, default=20.0)
+    asyncio.run(main(parser.parse_args()))
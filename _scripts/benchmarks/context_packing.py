@@ -0,0 +1,123 @@
+"""Report the response prompt size with and without token-budgeted context packing.
+
+The fixture set is built from this repository: its Markdown and Python files
+are split into chunks like `ingest_docs` does, and every fixture question
+"retrieves" `--top-k` random chunks. A share of the retrieved chunks are
+re-crawled copies of another retrieved chunk of the same source, with one
+sentence changed, like pages that are indexed twice under different URLs.
+
+For every fixture the context is formatted as `respond` did before, from
+the first `--top-k` documents, and after packing into `--budget` tokens.
+The prefill time saved is estimated from `--prefill-tokens-per-second`.
+Token counts use the response model's tokenizer if it can be loaded, and
+are estimated from the text length otherwise.
+
+Usage:
+    PYTHONPATH=$(pwd) python _scripts/benchmarks/context_packing.py
+"""
+
+import argparse
+import pathlib
+import random
+import statistics
+import time
+import uuid
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from backend import context_packing
+from backend.context_packing import get_token_counter, pack_context
+from backend.utils import format_docs
+
+ROOT = pathlib.Path(__file__).resolve().parents[2]
+
+
+def load_chunks() -> list[Document]:
+    splitter = RecursiveCharacterTextSplitter(chunk_size=4000, chunk_overlap=200)
+    docs = [
+        Document(
+            page_content=path.read_text(),
+            metadata={"source": str(path.relative_to(ROOT)), "title": path.name},
+        )
+        for pattern in ("*.md", "backend/**/*.py", "_scripts/**/*.py")
+        for path in sorted(ROOT.glob(pattern))
+    ]
+    chunks = splitter.split_documents(docs)
+    for chunk in chunks:
+        chunk.metadata["uuid"] = str(uuid.uuid4())
+    return chunks
+
+
+def recrawl(doc: Document, rng: random.Random) -> Document:
+    lines = doc.page_content.splitlines()
+    lines[rng.randrange(len(lines))] = "This line changed since the last crawl."
+    return Document(
+        page_content="\n".join(lines),
+        metadata={**doc.metadata, "uuid": str(uuid.uuid4())},
+    )
+
+
+def fixture(chunks: list[Document], args: argparse.Namespace, rng: random.Random):
+    retrieved: list[Document] = []
+    while len(retrieved) < args.top_k:
+        if retrieved and rng.random() < args.recrawled_share:
+            retrieved.append(recrawl(rng.choice(retrieved), rng))
+        else:
+            retrieved.append(rng.choice([c for c in chunks if c not in retrieved]))
+    return retrieved
+
+
+def main(args: argparse.Namespace) -> None:
+    rng = random.Random(0)
+    chunks = load_chunks()
+    counter = get_token_counter(args.response_model)
+    fixtures = [fixture(chunks, args, rng) for _ in range(args.fixtures)]
+    print(
+        f"{len(chunks)} chunks, {args.fixtures} fixtures of {args.top_k} documents, "
+        f"tokenizer: {counter.name}"
+    )
+
+    before, after, overlapping, over_budget = [], [], 0, 0
+    for documents in fixtures:
+        before.append(counter.count(format_docs(documents)))
+        packed = pack_context(documents, counter, args.budget)
+        after.append(counter.count(format_docs(packed.documents)))
+        overlapping += packed.overlapping
+        over_budget += packed.over_budget
+
+    timings = {}
+    for label in ("cold", "warm"):
+        if label == "cold":
+            context_packing._token_counts.clear()
+        start = time.perf_counter()
+        for documents in fixtures:
+            pack_context(documents, counter, args.budget)
+        timings[label] = (time.perf_counter() - start) / len(fixtures) * 1000
+
+    saved = statistics.mean(before) - statistics.mean(after)
+    print(
+        f"context tokens: {statistics.mean(before):.0f} -> {statistics.mean(after):.0f} "
+        f"(-{saved / statistics.mean(before):.0%}), "
+        f"max {max(before)} -> {max(after)}"
+    )
+    print(
+        f"documents left out per fixture: {overlapping / len(fixtures):.2f} overlapping, "
+        f"{over_budget / len(fixtures):.2f} over budget"
+    )
+    print(
+        f"packing: {timings['cold']:.2f}ms cold, {timings['warm']:.2f}ms with cached "
+        f"token counts; estimated prefill saved: "
+        f"{saved / args.prefill_tokens_per_second * 1000:.0f}ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--budget", type=int, default=6000)
+    parser.add_argument("--recrawled-share", type=float, default=0.2)
+    parser.add_argument("--response-model", default="openai/gpt-4o-mini")
+    parser.add_argument("--prefill-tokens-per-second", type=float, default=5000.0)
+    main(parser.parse_args())
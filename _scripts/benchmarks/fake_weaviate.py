@@ -0,0 +1,297 @@
+"""Local stand-in for a Weaviate cluster, used by the benchmark scripts.
+
+The server speaks a small line-delimited JSON protocol over TCP. Opening a
+connection costs `handshake_latency` seconds (standing in for the TLS and gRPC
+channel setup of a real cluster) and every search costs `query_latency`
+seconds. Like a gRPC channel, a single connection can carry many requests at
+once; responses are matched to requests by id. The clients mimic the subset of
+the `weaviate` v4 client API used by `backend.retrieval`.
+"""
+
+import asyncio
+import itertools
+import json
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Any, Optional
+from uuid import UUID
+
+import numpy as np
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "_Server"
+
+    def handle(self) -> None:
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        time.sleep(self.server.handshake_latency)
+        self.wfile.write(b"ready\n")
+        write_lock = threading.Lock()
+
+        def respond(request: dict[str, Any]) -> None:
+            result = self.server.handle_request(request)
+            line = json.dumps({"id": request.get("id"), "result": result})
+            with write_lock:
+                self.wfile.write(line.encode() + b"\n")
+
+        with ThreadPoolExecutor(max_workers=64) as executor:
+            for line in self.rfile:
+                executor.submit(respond, json.loads(line))
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(
+        self, corpus: "FakeCorpus", handshake_latency: float, query_latency: float
+    ):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.corpus = corpus
+        self.handshake_latency = handshake_latency
+        self.query_latency = query_latency
+
+    def handle_request(self, request: dict[str, Any]) -> Any:
+        op = request["op"]
+        if op in ("ready", "exists"):
+            return True
+        if op == "config":
+            return {"multi_tenancy": False}
+        if op == "search":
+            time.sleep(self.query_latency)
+            return self.corpus.search(
+                request["vector"],
+                request["limit"],
+                request.get("include_vector", False),
+            )
+        raise ValueError(f"Unknown op {op}")
+
+
+class FakeCorpus:
+    """A random corpus of unit vectors with brute-force cosine search."""
+
+    def __init__(self, size: int = 2000, dim: int = 64, seed: int = 0) -> None:
+        rng = np.random.default_rng(seed)
+        vectors = rng.normal(size=(size, dim)).astype(np.float32)
+        self.vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.dim = dim
+
+    def search(
+        self, vector: list[float], limit: int, include_vector: bool = False
+    ) -> list[dict[str, Any]]:
+        query = np.asarray(vector, dtype=np.float32)[: self.dim]
+        query = query / (np.linalg.norm(query) or 1.0)
+        distances = 1.0 - self.vectors @ query
+        top = np.argsort(distances)[:limit]
+        return [
+            {
+                "uuid": str(UUID(int=int(i))),
+                "properties": {
+                    "text": f"Chunk {i} of the fake corpus.",
+                    "source": f"https://example.com/docs/{i // 10}",
+                    "title": f"Page {i // 10}",
+                },
+                "distance": float(distances[i]),
+                **({"vector": self.vectors[i].tolist()} if include_vector else {}),
+            }
+            for i in top
+        ]
+
+
+class FakeWeaviateServer:
+    """Run a stand-in Weaviate server in a background thread.
+
+    Use it as a context manager; `address` is the `(host, port)` to connect to.
+    """
+
+    def __init__(
+        self,
+        *,
+        handshake_latency: float = 0.05,
+        query_latency: float = 0.005,
+        corpus: Optional[FakeCorpus] = None,
+    ) -> None:
+        self._server = _Server(corpus or FakeCorpus(), handshake_latency, query_latency)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self._server.server_address
+
+    def __enter__(self) -> "FakeWeaviateServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _to_query_return(objects: list[dict[str, Any]]) -> SimpleNamespace:
+    return SimpleNamespace(
+        objects=[
+            SimpleNamespace(
+                uuid=UUID(obj["uuid"]),
+                properties=dict(obj["properties"]),
+                metadata=SimpleNamespace(
+                    distance=obj["distance"], score=1.0 - obj["distance"]
+                ),
+                vector={"default": obj["vector"]} if "vector" in obj else {},
+            )
+            for obj in objects
+        ]
+    )
+
+
+class FakeWeaviateClient:
+    """Synchronous client for `FakeWeaviateServer`.
+
+    Connecting pays the server's handshake latency. Requests are serialized
+    over a single socket.
+    """
+
+    def __init__(self, address: tuple[str, int]) -> None:
+        self._sock = socket.create_connection(address)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._sock.makefile("rwb")
+        self._lock = threading.Lock()
+        self._file.readline()
+        self.collections = _Collections(self)
+
+    def request(self, **payload: Any) -> Any:
+        with self._lock:
+            self._file.write(json.dumps(payload).encode() + b"\n")
+            self._file.flush()
+            return json.loads(self._file.readline())["result"]
+
+    def is_ready(self) -> bool:
+        return self.request(op="ready")
+
+    def close(self) -> None:
+        self._file.close()
+        self._sock.close()
+
+    def __enter__(self) -> "FakeWeaviateClient":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+class _Collections:
+    def __init__(self, client: FakeWeaviateClient) -> None:
+        self._client = client
+
+    def exists(self, name: str) -> bool:
+        return self._client.request(op="exists", name=name)
+
+    def get(self, name: str) -> "_Collection":
+        return _Collection(self._client)
+
+
+class _Collection:
+    def __init__(self, client: FakeWeaviateClient) -> None:
+        self._client = client
+        self.query = self
+        self.config = self
+
+    def get(self, simple: bool = True) -> SimpleNamespace:
+        config = self._client.request(op="config")
+        return SimpleNamespace(
+            multi_tenancy_config=SimpleNamespace(enabled=config["multi_tenancy"])
+        )
+
+    def with_tenant(self, tenant: Optional[str]) -> "_Collection":
+        return self
+
+    def hybrid(
+        self, query: Optional[str], vector: list[float], limit: int, **kwargs: Any
+    ) -> SimpleNamespace:
+        return _to_query_return(
+            self._client.request(
+                op="search",
+                vector=list(vector),
+                limit=limit,
+                include_vector=kwargs.get("include_vector", False),
+            )
+        )
+
+
+class FakeWeaviateAsyncClient:
+    """Async client for `FakeWeaviateServer`.
+
+    Requests are multiplexed over a single connection, like the gRPC channel
+    of the real async client.
+    """
+
+    def __init__(self, address: tuple[str, int]) -> None:
+        self._address = address
+        self._ids = itertools.count()
+        self._pending: dict[int, asyncio.Future] = {}
+        self.collections = _AsyncCollections(self)
+
+    async def connect(self) -> None:
+        self._reader, self._writer = await asyncio.open_connection(*self._address)
+        sock = self._writer.get_extra_info("socket")
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        await self._reader.readline()
+        self._read_task = asyncio.create_task(self._read_responses())
+
+    async def _read_responses(self) -> None:
+        async for line in self._reader:
+            response = json.loads(line)
+            self._pending.pop(response["id"]).set_result(response["result"])
+
+    async def request(self, **payload: Any) -> Any:
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self._writer.write(json.dumps({**payload, "id": request_id}).encode() + b"\n")
+        await self._writer.drain()
+        return await future
+
+    async def is_ready(self) -> bool:
+        return await self.request(op="ready")
+
+    async def close(self) -> None:
+        self._read_task.cancel()
+        self._writer.close()
+        await self._writer.wait_closed()
+
+
+async def connect_async(address: tuple[str, int]) -> FakeWeaviateAsyncClient:
+    """Open a connected `FakeWeaviateAsyncClient`."""
+    client = FakeWeaviateAsyncClient(address)
+    await client.connect()
+    return client
+
+
+class _AsyncCollections:
+    def __init__(self, client: FakeWeaviateAsyncClient) -> None:
+        self._client = client
+
+    def get(self, name: str) -> "_AsyncCollection":
+        return _AsyncCollection(self._client)
+
+
+class _AsyncCollection:
+    def __init__(self, client: FakeWeaviateAsyncClient) -> None:
+        self._client = client
+        self.query = self
+
+    async def hybrid(
+        self, query: Optional[str], vector: list[float], limit: int, **kwargs: Any
+    ) -> SimpleNamespace:
+        return _to_query_return(
+            await self._client.request(
+                op="search",
+                vector=list(vector),
+                limit=limit,
+                include_vector=kwargs.get("include_vector", False),
+            )
+        )
@@ -0,0 +1,88 @@
+"""Benchmark research-step retrieval latency: per-query fan-out vs one batched search.
+
+A research step searches for every generated query. The "fan-out" run mirrors
+one `retrieve_documents` node per query, each borrowing its own retriever from
+the pool; the "batched" run borrows one retriever and calls `abatch_search`,
+pipelining all searches over a single connection. Query vectors are
+precomputed in both runs, as with `batch_query_embeddings`.
+
+Usage:
+    PYTHONPATH=$(pwd) python _scripts/benchmarks/multi_query_search.py
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from fake_weaviate import FakeWeaviateServer, connect_async
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from backend.configuration import BaseConfiguration
+from backend.retrieval import make_weaviate_retriever
+from backend.weaviate_pool import WeaviateClientPool
+
+configuration = BaseConfiguration(search_kwargs={"k": 6})
+embeddings = DeterministicFakeEmbedding(size=64)
+
+
+async def fan_out(
+    pool: WeaviateClientPool, queries: list[str], vectors: list[list[float]]
+) -> None:
+    async def retrieve(query: str, vector: list[float]) -> None:
+        async with make_weaviate_retriever(
+            configuration, embeddings, pool
+        ) as retriever:
+            await retriever.ainvoke(query, vector=vector)
+
+    await asyncio.gather(*(retrieve(q, v) for q, v in zip(queries, vectors)))
+
+
+async def batched(
+    pool: WeaviateClientPool, queries: list[str], vectors: list[list[float]]
+) -> None:
+    async with make_weaviate_retriever(configuration, embeddings, pool) as retriever:
+        await retriever.abatch_search(queries, vectors)
+
+
+def report(name: str, latencies: list[float]) -> None:
+    ms = sorted(t * 1000 for t in latencies)
+    p95 = ms[int(0.95 * (len(ms) - 1))]
+    print(f"{name:<8} p50={statistics.median(ms):7.2f}ms p95={p95:7.2f}ms")
+
+
+async def main(args: argparse.Namespace) -> None:
+    with FakeWeaviateServer(
+        handshake_latency=args.handshake_ms / 1000,
+        query_latency=args.query_ms / 1000,
+    ) as server:
+        for name, step in (("fan-out", fan_out), ("batched", batched)):
+            pool = WeaviateClientPool(
+                lambda: connect_async(server.address), max_idle=args.pool_size
+            )
+            semaphore = asyncio.Semaphore(args.concurrent_steps)
+
+            async def timed_step(i: int) -> float:
+                queries = [f"step {i} query {q}" for q in range(args.queries)]
+                vectors = embeddings.embed_documents(queries)
+                async with semaphore:
+                    start = time.perf_counter()
+                    await step(pool, queries, vectors)
+                    return time.perf_counter() - start
+
+            latencies = await asyncio.gather(
+                *(timed_step(i) for i in range(args.steps))
+            )
+            report(name, latencies)
+            await pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=5)
+    parser.add_argument("--concurrent-steps", type=int, default=8)
+    parser.add_argument("--pool-size", type=int, default=8)
+    parser.add_argument("--handshake-ms", type=float, default=50.0)
+    parser.add_argument("--query-ms", type=float, default=10.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,104 @@
+"""Benchmark the per-node overhead of resolving the configuration and chat model.
+
+Every node of the retrieval graph resolves `AgentConfiguration` from its
+RunnableConfig and most of them load a chat model. The "cold" numbers clear
+the caches before every call, which is what each node paid before they were
+cached; the "warm" numbers are what every node but the first pays in a run.
+Models are only constructed, never called, so dummy API keys are enough.
+
+The prompts are replaced by placeholders, so the benchmark needs no access
+to the LangSmith hub.
+
+Usage:
+    PYTHONPATH=$(pwd) python _scripts/benchmarks/node_overhead.py
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import types
+from typing import Callable
+
+# placeholder prompts, instead of pulling them from the LangSmith hub
+prompts = types.ModuleType("backend.retrieval_graph.prompts")
+for name in (
+    "ROUTER_SYSTEM_PROMPT",
+    "GENERATE_QUERIES_SYSTEM_PROMPT",
+    "MORE_INFO_SYSTEM_PROMPT",
+    "RESEARCH_PLAN_SYSTEM_PROMPT",
+    "GENERAL_SYSTEM_PROMPT",
+    "FUSED_PLAN_INSTRUCTIONS",
+    "RESPONSE_SYSTEM_PROMPT",
+):
+    setattr(prompts, name, "{logic}")
+prompts.SUMMARY_SYSTEM_PROMPT = "{summary}"
+prompts.COVERAGE_SYSTEM_PROMPT = "{context}"
+sys.modules["backend.retrieval_graph.prompts"] = prompts
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("ANTHROPIC_API_KEY", "sk-benchmark")
+
+from backend import configuration as base_configuration  # noqa: E402
+from backend import utils  # noqa: E402
+from backend.retrieval_graph.configuration import AgentConfiguration  # noqa: E402
+
+CONFIG = {
+    "configurable": {
+        "thread_id": "benchmark",
+        "query_model": "openai/gpt-4o-mini",
+        "response_model": "anthropic/claude-3-5-haiku-20241022",
+        "search_kwargs": {"k": 6},
+        "research_mode": "parallel",
+    }
+}
+
+
+def measure(fn: Callable[[], object], runs: int) -> float:
+    """Return the median duration of `fn` in microseconds."""
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations) * 1e6
+
+
+def main(args: argparse.Namespace) -> None:
+    def resolve_cold() -> None:
+        base_configuration._configurations.clear()
+        base_configuration._init_fields.clear()
+        AgentConfiguration.from_runnable_config(CONFIG)
+
+    def resolve_warm() -> None:
+        AgentConfiguration.from_runnable_config(CONFIG)
+
+    results = {}
+    for model_name in ("openai/gpt-4o-mini", "anthropic/claude-3-5-haiku-20241022"):
+
+        def load_cold() -> None:
+            utils._chat_models.clear()
+            utils.load_chat_model(model_name)
+
+        def load_warm() -> None:
+            utils.load_chat_model(model_name)
+
+        results[f"load_chat_model({model_name})"] = (
+            measure(load_cold, args.runs),
+            measure(load_warm, args.runs),
+        )
+    results["from_runnable_config"] = (
+        measure(resolve_cold, args.runs),
+        measure(resolve_warm, args.runs),
+    )
+
+    width = max(len(name) for name in results)
+    print(f"{'':<{width}} {'cold':>10} {'warm':>10}")
+    for name, (cold, warm) in results.items():
+        print(f"{name:<{width}} {cold:>8.1f}us {warm:>8.1f}us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=200)
+    main(parser.parse_args())
@@ -0,0 +1,146 @@
+"""Report the vector searches saved by collapsing paraphrased queries, and the recall kept.
+
+The corpus is this repository, split into chunks like `ingest_docs` does
+(see context_packing.py). Every fixture step lists the queries a query
+model might generate for it, paraphrases included. For each step, the
+union of the top `--k` chunks of all queries is the baseline; the
+collapsed queries are those kept by `select_distinct`, as in the
+researcher's `embed_queries`, and recall is the share of the baseline
+union they still retrieve.
+
+No embedding model is available offline, so chunks and queries are
+embedded with hashed TF-IDF vectors of their terms. Paraphrases score
+lower against each other than with a neural embedding model, so the
+thresholds that matter here are lower than with one; a sweep is reported.
+Deduplication is off by default (`query_duplicate_threshold` above 1)
+until it is measured with the deployed embedding model.
+
+Usage:
+    PYTHONPATH=$(pwd) python _scripts/benchmarks/query_dedup.py
+"""
+
+import argparse
+import hashlib
+from collections import Counter
+
+import numpy as np
+from context_packing import load_chunks
+
+from backend.bm25 import tokenize
+from backend.rerank import select_distinct
+
+STEPS = [
+    [
+        "how are documents ingested into weaviate",
+        "ingest documents into the weaviate index",
+        "document ingestion pipeline weaviate",
+        "record manager for indexing",
+    ],
+    [
+        "how does the retrieval cache work",
+        "retrieval cache implementation",
+        "how are retrieval results cached",
+    ],
+    [
+        "configure the embedding model",
+        "embedding model configuration",
+        "embedding cache sqlite",
+    ],
+    [
+        "how is the research plan created",
+        "create research plan node",
+        "research plan generation",
+        "parallel research steps",
+    ],
+    [
+        "semantic answer cache threshold",
+        "answer cache similarity threshold",
+        "answer cache index generation",
+    ],
+    [
+        "pack documents into the context token budget",
+        "context packing token budget",
+        "token counter for context packing",
+    ],
+    [
+        "rerank documents with reciprocal rank fusion",
+        "reciprocal rank fusion reranking",
+        "maximal marginal relevance diversity",
+    ],
+    [
+        "compress retrieved chunks to relevant passages",
+        "passage compression of chunks",
+        "code fences in compressed passages",
+    ],
+    [
+        "conversation history compaction summary",
+        "summarize the conversation history",
+        "history token budget per node",
+    ],
+    [
+        "local index hybrid lexical search",
+        "bm25 lexical weight in local index",
+        "hybrid search lexical weight",
+    ],
+]
+
+
+class HashedTfidf:
+    """Offline stand-in for an embedding model: hashed TF-IDF vectors of the terms."""
+
+    def __init__(self, corpus: list[str], dim: int) -> None:
+        self.dim = dim
+        df = Counter(term for text in corpus for term in set(tokenize(text)))
+        self.idf = {
+            term: float(np.log((1 + len(corpus)) / (1 + count)) + 1)
+            for term, count in df.items()
+        }
+        self.default_idf = float(np.log(1 + len(corpus)) + 1)
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for term, count in Counter(tokenize(text)).items():
+                column = int(hashlib.md5(term.encode()).hexdigest(), 16) % self.dim
+                matrix[row, column] += count * self.idf.get(term, self.default_idf)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+
+def main(args: argparse.Namespace) -> None:
+    chunks = [chunk.page_content for chunk in load_chunks()]
+    embedder = HashedTfidf(chunks, args.dim)
+    corpus = embedder.embed(chunks)
+    step_vectors = [embedder.embed(queries) for queries in STEPS]
+    step_results = [
+        [set(np.argsort(-(corpus @ v))[: args.k].tolist()) for v in vectors]
+        for vectors in step_vectors
+    ]
+    searches = sum(len(queries) for queries in STEPS)
+    print(f"{len(chunks)} chunks, {len(STEPS)} steps, {searches} queries")
+    print(f"{'threshold':>9} {'searches':>8} {'saved':>6} {'recall':>7}")
+    for threshold in args.thresholds:
+        kept_searches, recalls = 0, []
+        for vectors, results in zip(step_vectors, step_results):
+            kept = select_distinct(vectors.tolist(), threshold)
+            kept_searches += len(kept)
+            baseline = set().union(*results)
+            collapsed = set().union(*(results[i] for i in kept))
+            recalls.append(len(collapsed & baseline) / len(baseline))
+        print(
+            f"{threshold:>9.2f} {kept_searches:>8} "
+            f"{1 - kept_searches / searches:>6.0%} {np.mean(recalls):>7.1%}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--k", type=int, default=6)
+    parser.add_argument("--dim", type=int, default=4096)
+    parser.add_argument(
+        "--thresholds",
+        type=float,
+        nargs="+",
+        default=[1.01, 0.9, 0.8, 0.7, 0.6, 0.5],
+    )
+    main(parser.parse_args())
@@ -0,0 +1,130 @@
+"""Benchmark merging many researchers' documents into the state with `reduce_docs`.
+
+A fan-out of many queries merges one update of `--batch` documents per
+query into the `documents` channel. A share of the documents
+(`--duplicates`) were already retrieved by an earlier query. `reduce_docs`
+is compared with the previous implementation, which copied the state and
+rebuilt the set of known uuids on every merge, with every update merged
+in a step of its own. `DocumentChannel` is measured with all updates in
+one step, as LangGraph applies the updates of a fan-out. Peak allocations
+are measured with tracemalloc, in a separate pass from the timings.
+
+Usage:
+    PYTHONPATH=$(pwd) python _scripts/benchmarks/reduce_docs.py
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+import uuid
+from typing import Any, Callable, Optional
+
+from langchain_core.documents import Document
+
+from backend.utils import DocumentChannel, reduce_docs, with_provenance
+
+
+def previous_reduce_docs(
+    existing: Optional[list[Document]], new: list[Document]
+) -> list[Document]:
+    """The previous `reduce_docs`, for Document inputs, for comparison."""
+    existing_list = list(existing) if existing else []
+    new_list = []
+    existing_ids = set(doc.metadata.get("uuid") for doc in existing_list)
+    for item in new:
+        item_id = item.metadata.get("uuid")
+        if item_id is None:
+            item_id = str(uuid.uuid4())
+            new_item = item.copy(deep=True)
+            new_item.metadata["uuid"] = item_id
+        else:
+            new_item = item
+        if item_id not in existing_ids:
+            new_list.append(new_item)
+            existing_ids.add(item_id)
+    return existing_list + new_list
+
+
+def make_batches(
+    total: int, batch: int, duplicates: float, rng: random.Random
+) -> list[list[Document]]:
+    batches: list[list[Document]] = []
+    seen: list[Document] = []
+    created = 0
+    while created < total:
+        docs = []
+        for _ in range(batch):
+            if seen and rng.random() < duplicates:
+                docs.append(rng.choice(seen))
+            else:
+                doc = Document(
+                    page_content=f"Chunk {created}",
+                    metadata={"uuid": str(uuid.uuid4()), "source": "fixture"},
+                )
+                seen.append(doc)
+                docs.append(doc)
+                created += 1
+        batches.append(with_provenance(docs, f"query {len(batches)}"))
+    return batches
+
+
+def merge(reducer: Callable[[Any, Any], list[Document]], batches) -> list[Document]:
+    docs: list[Document] = []
+    for batch in batches:
+        docs = reducer(docs, batch)
+    return docs
+
+
+def merge_in_one_step(batches) -> list[Document]:
+    channel = DocumentChannel(list)
+    channel.update(batches)
+    return channel.get()
+
+
+def measure(merge_all: Callable[[], Any]) -> tuple[float, float]:
+    """Return the time in ms and the peak allocated MB of merging all batches."""
+    start = time.perf_counter()
+    merge_all()
+    duration = time.perf_counter() - start
+    tracemalloc.start()
+    merge_all()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duration * 1000, peak / 1e6
+
+
+def main(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    print(
+        f"{'documents':>9} {'merges':>6} {'':>8}"
+        f"{'previous':>10} {'reduce':>10} {'channel':>10}"
+    )
+    for total in args.documents:
+        batches = make_batches(total, args.batch, args.duplicates, rng)
+        previous = merge(previous_reduce_docs, batches)
+        for docs in (merge(reduce_docs, batches), merge_in_one_step(batches)):
+            assert [d.metadata["uuid"] for d in docs] == [
+                d.metadata["uuid"] for d in previous
+            ]
+        results = [
+            measure(lambda: merge(previous_reduce_docs, batches)),
+            measure(lambda: merge(reduce_docs, batches)),
+            measure(lambda: merge_in_one_step(batches)),
+        ]
+        print(
+            f"{total:>9} {len(batches):>6} {'time':>8}"
+            + "".join(f"{ms:>8.1f}ms" for ms, _ in results)
+        )
+        print(f"{'':>16} {'peak':>8}" + "".join(f"{mb:>8.2f}MB" for _, mb in results))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--documents", type=int, nargs="+", default=[1000, 2000, 5000, 10000]
+    )
+    parser.add_argument("--batch", type=int, default=10)
+    parser.add_argument("--duplicates", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
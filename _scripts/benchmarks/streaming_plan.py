@@ -0,0 +1,198 @@
+"""Benchmark end-to-end latency of the research modes with a scripted chat model.
+
+Every chat model call is served by `ScriptedChatModel`, which streams a fixed
+response at a fixed token rate after a fixed time to first token, so the runs differ only in how research is
+scheduled: "sequential" researches one plan step after the other, "parallel"
+fans out all steps once the plan is complete, and "streaming" starts
+researching each step while the rest of the plan is still being generated.
+With `--fused-planner`, the plan carries the search queries of every step
+and the researchers make no LLM calls.
+
+Retrieval runs against a small local index of random vectors with fake
+embeddings, and the prompts are replaced by placeholders, so the benchmark
+needs no API keys.
+
+Usage:
+    PYTHONPATH=$(pwd) python _scripts/benchmarks/streaming_plan.py --tokens-per-second 100
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import tempfile
+import time
+import types
+from collections import Counter
+from typing import Any, AsyncIterator, Optional
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# placeholder prompts, instead of pulling them from the LangSmith hub
+prompts = types.ModuleType("backend.retrieval_graph.prompts")
+for name in (
+    "ROUTER_SYSTEM_PROMPT",
+    "GENERATE_QUERIES_SYSTEM_PROMPT",
+    "MORE_INFO_SYSTEM_PROMPT",
+    "RESEARCH_PLAN_SYSTEM_PROMPT",
+    "GENERAL_SYSTEM_PROMPT",
+    "FUSED_PLAN_INSTRUCTIONS",
+):
+    setattr(prompts, name, "{logic}")
+prompts.SUMMARY_SYSTEM_PROMPT = "{summary}"
+prompts.COVERAGE_SYSTEM_PROMPT = "{context}"
+prompts.RESPONSE_SYSTEM_PROMPT = "{context}"
+sys.modules["backend.retrieval_graph.prompts"] = prompts
+
+from backend import retrieval  # noqa: E402
+from backend.local_index import write_local_index  # noqa: E402
+from backend.retrieval_graph import graph as retrieval_graph  # noqa: E402
+from backend.retrieval_graph.researcher_graph import (  # noqa: E402
+    graph as researcher_graph,
+)
+
+PLAN = {
+    "steps": [
+        "Find the LCEL documentation that explains how runnables are composed.",
+        "Look up how RunnableParallel runs several runnables on the same input.",
+        "Find examples of streaming the output of an LCEL chain.",
+    ]
+}
+QUERIES = {
+    "queries": [
+        "LCEL runnable composition pipe operator",
+        "RunnableParallel map several runnables",
+        "stream output of LCEL chain astream",
+    ]
+}
+FUSED_PLAN = {**PLAN, "queries": [QUERIES["queries"] for _ in PLAN["steps"]]}
+ANSWER = "LCEL composes runnables with the pipe operator. " * 10
+
+llm_calls: Counter[str] = Counter()
+
+
+class ScriptedChatModel(BaseChatModel):
+    """A chat model that streams a fixed response at a fixed token rate.
+
+    Every call waits `first_token_latency` seconds before the first token, like
+    the round trip to a hosted model, and is counted in `llm_calls`.
+
+    With structured output, the response is the JSON of the schema's scripted
+    value, parsed incrementally like a streamed tool call.
+    """
+
+    responses: dict[str, str]
+    """Scripted response text by schema name, and "text" for plain responses."""
+    tokens_per_second: float
+    first_token_latency: float = 0.0
+    chars_per_token: int = 4
+    schema_name: str = "text"
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> Any:
+        scripted = self.model_copy(update={"schema_name": schema.__name__})
+        return scripted | JsonOutputParser()
+
+    def _generate(self, *args: Any, **kwargs: Any) -> ChatResult:
+        raise NotImplementedError("ScriptedChatModel only supports async calls.")
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        text = self.responses[self.schema_name]
+        llm_calls[self.schema_name] += 1
+        await asyncio.sleep(self.first_token_latency)
+        for start in range(0, len(text), self.chars_per_token):
+            await asyncio.sleep(1 / self.tokens_per_second)
+            token = text[start : start + self.chars_per_token]
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        text = "".join(
+            [chunk.message.content async for chunk in self._astream(messages)]
+        )
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+
+async def main(args: argparse.Namespace) -> None:
+    model = ScriptedChatModel(
+        responses={
+            "Plan": json.dumps(PLAN),
+            "PlanWithQueries": json.dumps(FUSED_PLAN),
+            "Response": json.dumps(QUERIES),
+            "text": ANSWER,
+        },
+        tokens_per_second=args.tokens_per_second,
+        first_token_latency=args.first_token_ms / 1000,
+    )
+    for module in (retrieval_graph, researcher_graph):
+        module.load_chat_model = lambda name: model
+    retrieval.make_text_encoder = lambda name: DeterministicFakeEmbedding(size=64)
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as index_path:
+        write_local_index(
+            index_path,
+            (
+                (f"{i}", f"Chunk {i} of the fake corpus.", {}, rng.normal(size=64))
+                for i in range(args.corpus_size)
+            ),
+        )
+        for mode in ("sequential", "parallel", "streaming"):
+            config = {
+                "configurable": {
+                    "query_router": "none",
+                    "research_mode": mode,
+                    "max_parallel_research_steps": args.max_parallel_steps,
+                    "fused_planner": args.fused_planner,
+                    "retriever_provider": "local",
+                    "local_index_path": index_path,
+                    "answer_cache": False,
+                    "retrieval_cache": "none",
+                }
+            }
+            latencies = []
+            llm_calls.clear()
+            for run in range(args.runs):
+                start = time.perf_counter()
+                await retrieval_graph.graph.ainvoke(
+                    {"messages": [("human", f"How do I use LCEL? ({run})")]}, config
+                )
+                latencies.append(time.perf_counter() - start)
+            ms = [t * 1000 for t in latencies]
+            print(
+                f"{mode:<10} mean={statistics.mean(ms):7.1f}ms "
+                f"min={min(ms):7.1f}ms max={max(ms):7.1f}ms "
+                f"llm_calls/run={sum(llm_calls.values()) / args.runs:.0f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--first-token-ms", type=float, default=400.0)
+    parser.add_argument("--corpus-size", type=int, default=2000)
+    parser.add_argument("--max-parallel-steps", type=int, default=4)
+    parser.add_argument("--fused-planner", action="store_true")
+    asyncio.run(main(parser.parse_args()))
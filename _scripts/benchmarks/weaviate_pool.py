@@ -0,0 +1,76 @@
+"""Benchmark per-retrieval latency with and without the Weaviate client pool.
+
+Runs `make_weaviate_retriever` against a local stand-in server, once with a
+pool that keeps clients open and once with pooling disabled (every retrieval
+opens and closes its own connection, as before the pool existed).
+
+Usage:
+    PYTHONPATH=$(pwd) python _scripts/benchmarks/weaviate_pool.py
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from fake_weaviate import FakeWeaviateServer, connect_async
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from backend.configuration import BaseConfiguration
+from backend.retrieval import make_weaviate_retriever
+from backend.weaviate_pool import WeaviateClientPool
+
+
+async def run(
+    pool: WeaviateClientPool, queries: list[str], concurrency: int
+) -> list[float]:
+    configuration = BaseConfiguration(search_kwargs={"k": 6})
+    embeddings = DeterministicFakeEmbedding(size=64)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def retrieve(query: str) -> float:
+        async with semaphore:
+            start = time.perf_counter()
+            async with make_weaviate_retriever(
+                configuration, embeddings, pool
+            ) as retriever:
+                await retriever.ainvoke(query)
+            return time.perf_counter() - start
+
+    return await asyncio.gather(*(retrieve(query) for query in queries))
+
+
+def report(name: str, latencies: list[float]) -> None:
+    ms = sorted(t * 1000 for t in latencies)
+    p95 = ms[int(0.95 * (len(ms) - 1))]
+    print(
+        f"{name:<10} mean={statistics.mean(ms):7.2f}ms "
+        f"p50={statistics.median(ms):7.2f}ms p95={p95:7.2f}ms"
+    )
+
+
+async def main(args: argparse.Namespace) -> None:
+    queries = [f"query {i}" for i in range(args.retrievals)]
+    with FakeWeaviateServer(
+        handshake_latency=args.handshake_ms / 1000,
+        query_latency=args.query_ms / 1000,
+    ) as server:
+
+        def connect():
+            return connect_async(server.address)
+
+        unpooled = WeaviateClientPool(connect, max_idle=0)
+        report("unpooled", await run(unpooled, queries, args.concurrency))
+
+        pooled = WeaviateClientPool(connect, max_idle=args.concurrency)
+        report("pooled", await run(pooled, queries, args.concurrency))
+        await pooled.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--retrievals", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--handshake-ms", type=float, default=50.0)
+    parser.add_argument("--query-ms", type=float, default=5.0)
+    asyncio.run(main(parser.parse_args()))
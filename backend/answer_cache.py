@@ -0,0 +1,148 @@
+"""Semantic cache of final answers, looked up by question embedding.
+
+Questions that are worded differently but mean the same thing have nearly
+identical embeddings, so an answer generated for one can be served for the
+others without planning, research or a response model call.
+"""
+
+import math
+import threading
+import time
+from typing import NamedTuple, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from backend.cache import CacheStats
+
+
+class CachedAnswer(NamedTuple):
+    """An answer served from the cache."""
+
+    answer: str
+    documents: list[Document]
+    similarity: float
+
+
+class SemanticAnswerCache:
+    """A bounded, thread-safe cache of answers keyed by question embedding.
+
+    A lookup returns the answer of the most similar cached question if its
+    cosine similarity reaches the threshold. Entries belong to an index
+    generation: the first lookup or insert with a new generation empties the
+    cache, so answers are never served from before an ingestion run. When the
+    cache is full, the least recently used entry is evicted, and entries
+    older than `ttl` seconds are never served.
+
+    Args:
+        maxsize (int): Maximum number of cached answers.
+        ttl (Optional[float]): Seconds an answer is served for, or None to keep it
+            until it is evicted.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None) -> None:
+        self._maxsize = maxsize
+        self._ttl = math.inf if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._generation: Optional[str] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._entries: list[Optional[tuple[str, list[Document]]]] = [None] * maxsize
+        self._created_at = np.full(maxsize, -np.inf)
+        self._last_used = np.full(maxsize, -np.inf)
+        self.stats = CacheStats()
+
+    def _reset_if_stale(self, generation: str) -> None:
+        if generation != self._generation:
+            self._generation = generation
+            self._vectors = None
+            self._entries = [None] * self._maxsize
+            self._created_at[:] = -np.inf
+            self._last_used[:] = -np.inf
+
+    def _nearest(self, vector: np.ndarray) -> tuple[int, float]:
+        """Return the slot of the most similar live entry and its similarity."""
+        if self._vectors is None:
+            return -1, -math.inf
+        similarities = self._vectors @ vector
+        expired = self._created_at <= time.monotonic() - self._ttl
+        similarities[expired] = -np.inf
+        slot = int(np.argmax(similarities))
+        return slot, float(similarities[slot])
+
+    def lookup(
+        self, vector: list[float], generation: str, threshold: float
+    ) -> Optional[CachedAnswer]:
+        """Find the cached answer to the most similar question.
+
+        Args:
+            vector (list[float]): The embedding of the question.
+            generation (str): The current index generation.
+            threshold (float): Minimum cosine similarity for a hit.
+
+        Returns:
+            Optional[CachedAnswer]: The cached answer, or None on a miss.
+        """
+        query = _normalize(vector)
+        with self._lock:
+            self._reset_if_stale(generation)
+            slot, similarity = self._nearest(query)
+            if similarity < threshold:
+                self.stats.misses += 1
+                return None
+            self._last_used[slot] = time.monotonic()
+            answer, documents = self._entries[slot]
+            self.stats.hits += 1
+        return CachedAnswer(answer, list(documents), similarity)
+
+    def insert(
+        self,
+        vector: list[float],
+        answer: str,
+        documents: list[Document],
+        generation: str,
+        threshold: float,
+    ) -> None:
+        """Cache the answer to a question.
+
+        An entry whose question is at least `threshold` similar is replaced,
+        so that near-duplicate questions do not crowd out other entries.
+        """
+        query = _normalize(vector)
+        with self._lock:
+            self._reset_if_stale(generation)
+            if self._vectors is None:
+                self._vectors = np.zeros((self._maxsize, len(query)), np.float32)
+            slot, similarity = self._nearest(query)
+            now = time.monotonic()
+            if similarity < threshold:
+                # evict the least recently used entry, preferring free and expired slots
+                expired = self._created_at <= now - self._ttl
+                slot = int(np.argmin(np.where(expired, -np.inf, self._last_used)))
+            self._vectors[slot] = query
+            self._entries[slot] = (answer, list(documents))
+            self._created_at[slot] = now
+            self._last_used[slot] = now
+
+
+def _normalize(vector: list[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    return array / max(float(np.linalg.norm(array)), 1e-12)
+
+
+_caches: dict[str, SemanticAnswerCache] = {}
+
+
+def get_answer_cache(
+    namespace: str, maxsize: int, ttl: Optional[float] = None
+) -> SemanticAnswerCache:
+    """Return the process-wide answer cache for `namespace`, creating it on first use.
+
+    Args:
+        namespace (str): Identifies the settings the answers depend on, such as the
+            embedding and response models. Each namespace has its own cache.
+        maxsize (int): Maximum number of cached answers, used when the cache is created.
+        ttl (Optional[float]): Seconds an answer is served for, used when the cache is created.
+    """
+    if namespace not in _caches:
+        _caches[namespace] = SemanticAnswerCache(maxsize, ttl)
+    return _caches[namespace]
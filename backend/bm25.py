@@ -0,0 +1,140 @@
+"""BM25 inverted index stored next to the local vector index.
+
+The index is built by `BM25Builder` while `write_local_index` exports the
+chunks, so its document ids are the row indices of the local index. It is
+stored as memory-mapped NumPy arrays in compressed sparse row layout:
+
+- `bm25_vocab.json`: the list of terms; a term's id is its position.
+- `bm25_offsets.npy`: start of each term's postings in the arrays below.
+- `bm25_docs.npy`, `bm25_tfs.npy`: document ids and term frequencies of the postings.
+- `bm25_doc_lengths.npy`: number of tokens in each document.
+
+Tokens keep identifiers searchable: `RunnableParallel` is indexed as
+`runnableparallel`, `runnable` and `parallel`, and `with_structured_output`
+as the whole identifier and each of its parts.
+"""
+
+import json
+import os
+import re
+from collections import Counter
+from typing import Optional
+
+import numpy as np
+
+_IDENTIFIER_RE = re.compile(r"[A-Za-z0-9_]+")
+_CAMEL_CASE_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into lowercase terms, expanding identifiers into their parts."""
+    tokens = []
+    for identifier in _IDENTIFIER_RE.findall(text):
+        tokens.append(identifier.lower())
+        parts = [
+            part.lower()
+            for word in identifier.split("_")
+            for part in _CAMEL_CASE_RE.findall(word)
+        ]
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+class BM25Builder:
+    """Accumulate documents and write a `BM25Index` to disk."""
+
+    def __init__(self) -> None:
+        self._vocab: dict[str, int] = {}
+        self._term_ids: list[np.ndarray] = []
+        self._tfs: list[np.ndarray] = []
+        self._doc_lengths: list[int] = []
+
+    def add(self, text: str) -> None:
+        """Add the next document; documents are numbered in the order they are added."""
+        tokens = tokenize(text)
+        counts = Counter(tokens)
+        self._term_ids.append(
+            np.fromiter(
+                (self._vocab.setdefault(term, len(self._vocab)) for term in counts),
+                dtype=np.int32,
+                count=len(counts),
+            )
+        )
+        self._tfs.append(np.fromiter(counts.values(), np.float32, len(counts)))
+        self._doc_lengths.append(len(tokens))
+
+    def write(self, path: str) -> None:
+        """Write the index files into the directory `path`."""
+        term_ids = np.concatenate(self._term_ids) if self._term_ids else np.zeros(0)
+        docs = np.repeat(
+            np.arange(len(self._term_ids), dtype=np.int32),
+            [len(ids) for ids in self._term_ids],
+        )
+        tfs = np.concatenate(self._tfs) if self._tfs else np.zeros(0, np.float32)
+        order = np.argsort(term_ids, kind="stable")
+        offsets = np.searchsorted(term_ids[order], np.arange(len(self._vocab) + 1))
+
+        np.save(os.path.join(path, "bm25_offsets.npy"), offsets.astype(np.int64))
+        np.save(os.path.join(path, "bm25_docs.npy"), docs[order])
+        np.save(os.path.join(path, "bm25_tfs.npy"), tfs[order])
+        np.save(
+            os.path.join(path, "bm25_doc_lengths.npy"),
+            np.asarray(self._doc_lengths, dtype=np.float32),
+        )
+        with open(os.path.join(path, "bm25_vocab.json"), "w") as f:
+            json.dump(list(self._vocab), f)
+
+
+class BM25Index:
+    """A memory-mapped BM25 index written by `BM25Builder`.
+
+    Args:
+        path (str): The index directory.
+        k1 (float): Term frequency saturation.
+        b (float): Document length normalization.
+    """
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75) -> None:
+        with open(os.path.join(path, "bm25_vocab.json")) as f:
+            self._vocab = {term: i for i, term in enumerate(json.load(f))}
+        self._offsets = np.load(os.path.join(path, "bm25_offsets.npy"), mmap_mode="r")
+        self._docs = np.load(os.path.join(path, "bm25_docs.npy"), mmap_mode="r")
+        self._tfs = np.load(os.path.join(path, "bm25_tfs.npy"), mmap_mode="r")
+        doc_lengths = np.load(os.path.join(path, "bm25_doc_lengths.npy"))
+        self._length_norm = k1 * (1 - b + b * doc_lengths / max(doc_lengths.mean(), 1))
+        self._k1 = k1
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        """Whether a BM25 index was written into the directory `path`."""
+        return os.path.exists(os.path.join(path, "bm25_vocab.json"))
+
+    def scores(self, query: str) -> np.ndarray:
+        """Compute the BM25 score of every document for the query."""
+        num_docs = len(self._length_norm)
+        scores = np.zeros(num_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id: Optional[int] = self._vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = self._offsets[term_id], self._offsets[term_id + 1]
+            docs, tfs = self._docs[start:end], self._tfs[start:end]
+            idf = np.log(1 + (num_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += idf * tfs * (self._k1 + 1) / (tfs + self._length_norm[docs])
+        return scores
+
+    def search(self, query: str, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Find the top-k documents for the query.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Document ids and BM25 scores of the best
+                matches, best first. Documents without any query term are left out.
+        """
+        scores = self.scores(query)
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return np.zeros(0, np.int64), np.zeros(0, np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return top, scores[top]
@@ -0,0 +1,173 @@
+"""Caching primitives shared by the embedding and retrieval caches.
+
+Functions:
+    normalize_text: Normalize text before it is hashed into a cache key.
+
+Classes:
+    CacheStats: Hit and miss counters for a cache.
+    LRUCache: A bounded, thread-safe, in-memory LRU cache with optional expiry.
+    SQLiteStore: A key/value store in a SQLite file shared by worker processes.
+"""
+
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Generic, Hashable, Optional, TypeVar
+
+V = TypeVar("V")
+
+
+def normalize_text(text: str) -> str:
+    """Apply NFKC normalization and collapse whitespace."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
+
+@dataclass
+class CacheStats:
+    """Hit and miss counters for a cache."""
+
+    hits: int = 0
+    misses: int = 0
+    saved_seconds: float = 0.0
+    """Time the hits would have taken as misses, for caches that measure it."""
+
+    @property
+    def hit_rate(self) -> float:
+        """The fraction of lookups that were hits, or 0.0 before any lookup."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class LRUCache(Generic[V]):
+    """A bounded, thread-safe, in-memory least-recently-used cache.
+
+    Entries can be given a time to live, after which they are treated as
+    missing and dropped on their next lookup.
+
+    Args:
+        maxsize (int): Maximum number of entries kept before the least recently
+            used ones are evicted.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self._maxsize = maxsize
+        self._data: OrderedDict[Hashable, tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: V, ttl: Optional[float] = None) -> None:
+        """Set the value for a key, expiring after `ttl` seconds if given."""
+        expires_at = math.inf if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self._maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteStore:
+    """A key/value store of bytes in a SQLite file.
+
+    The database runs in WAL mode, so several server worker processes on the
+    same host can read and write the same file concurrently. Entries can be
+    given an expiry time, and `purge_expired` deletes the expired ones.
+
+    Args:
+        path (str): Path to the database file. Parent directories are created as needed.
+        table (str): Name of the table holding this store's entries.
+    """
+
+    def __init__(self, path: str, table: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, value BLOB, expires_at REAL)"
+            )
+            columns = [
+                row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")
+            ]
+            if "expires_at" not in columns:
+                # tables created before entries could expire
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN expires_at REAL")
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_expires_at ON {table} (expires_at)"
+            )
+
+    def mget(self, keys: list[str]) -> list[Optional[bytes]]:
+        """Get the values for the given keys, with None for missing keys."""
+        if not keys:
+            return []
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key, value FROM {self._table} WHERE key IN ({placeholders})",
+                keys,
+            ).fetchall()
+        found = dict(rows)
+        return [found.get(key) for key in keys]
+
+    def mset(
+        self, items: list[tuple[str, bytes]], expires_at: Optional[float] = None
+    ) -> None:
+        """Set the values for the given keys, replacing existing values.
+
+        Args:
+            items (list[tuple[str, bytes]]): The keys and their values.
+            expires_at (Optional[float]): Unix time after which `purge_expired` deletes
+                the entries. Entries without it are kept.
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self._table} (key, value, expires_at) "
+                "VALUES (?, ?, ?)",
+                [(key, value, expires_at) for key, value in items],
+            )
+
+    def purge_expired(self) -> int:
+        """Delete the entries whose expiry time has passed.
+
+        Returns:
+            int: The number of deleted entries.
+        """
+        with self._lock, self._conn:
+            return self._conn.execute(
+                f"DELETE FROM {self._table} WHERE expires_at <= ?", (time.time(),)
+            ).rowcount
+
+    def retain_prefix(self, prefix: str) -> None:
+        """Delete every entry whose key does not start with `prefix`."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"DELETE FROM {self._table} WHERE substr(key, 1, ?) != ?",
+                (len(prefix), prefix),
+            )
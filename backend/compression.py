@@ -0,0 +1,218 @@
+"""Compress retrieved chunks down to the passages relevant to the research.
+
+Chunks are up to 4000 characters, of which usually only a few sentences
+answer the question. `compress_documents` splits every chunk into passages
+(sentences of prose, and whole code blocks), scores all passages against
+the research queries at once with BM25 over a passages-by-terms matrix, and
+keeps the best passages of each chunk, in their original order.
+
+Code blocks are never split, and a code block cut off at a chunk boundary
+gets its missing fence back, so the compressed text always has balanced
+code fences. Elided text is marked with "...". Document metadata is kept,
+so the response can still cite every source.
+"""
+
+import re
+from collections import Counter
+from typing import NamedTuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from backend.bm25 import tokenize
+
+_FENCE_RE = re.compile(r"^[ \t]*```[^\n]*$", re.MULTILINE)
+_SENTENCE_BREAK_RE = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+_CODE_LINE_RE = re.compile(
+    r"^(?:\s{4}|\t)"
+    r"|^\s*(?:from|import|def|class|return|async|await|const|let|var|print)\b"
+    r"|^\s*(?:#|//|@|>>>|\$ )"
+    r"|[(){}\[\]:;,]\s*$"
+    r"|\w\s*=\s*\S"
+)
+MIN_PASSAGES = 3
+
+
+class Passage(NamedTuple):
+    """A sentence or code block of a chunk."""
+
+    start: int
+    end: int
+    text: str
+    """The passage text, with its fences completed if it is a cut-off code block."""
+
+
+def _has_language(fence: re.Match) -> bool:
+    return bool(fence.group().strip()[3:].strip())
+
+
+def _looks_like_code(text: str) -> bool:
+    """Whether most non-empty lines of `text` look like code rather than prose."""
+    lines = [line for line in text.splitlines() if line.strip()]
+    if not lines:
+        return False
+    code_lines = sum(bool(_CODE_LINE_RE.search(line)) for line in lines)
+    return code_lines * 2 >= len(lines)
+
+
+def _starts_in_code(text: str, fences: list[re.Match]) -> bool:
+    """Whether a chunk starts inside a code block that began in an earlier chunk.
+
+    A fence with a language, such as "```python", always opens a block, so
+    an odd number of bare fences before it means the first one closes a
+    block. Without such a fence, the text before the first fence decides.
+    """
+    for i, fence in enumerate(fences):
+        if _has_language(fence):
+            return i % 2 == 1
+    return bool(fences) and _looks_like_code(text[: fences[0].start()])
+
+
+def split_passages(text: str) -> list[Passage]:
+    """Split a chunk into sentences of prose and whole code blocks.
+
+    A chunk cut inside a code block can start inside one, end inside one,
+    or both. Whether each fence opens or closes a block is worked out by
+    `_starts_in_code`, and a fence with a language always opens one.
+    """
+    fences = list(_FENCE_RE.finditer(text))
+    in_code = _starts_in_code(text, fences)
+    segments: list[tuple[int, int, bool]] = []
+    pos = 0
+    for fence in fences:
+        if in_code and _has_language(fence):
+            # the block before it was never closed
+            segments.append((pos, fence.start(), True))
+            pos = fence.start()
+            continue
+        if in_code:
+            segments.append((pos, fence.end(), True))
+            pos = fence.end()
+        else:
+            segments.append((pos, fence.start(), False))
+            pos = fence.start()
+        in_code = not in_code
+    segments.append((pos, len(text), in_code))
+
+    passages = []
+    for start, end, code in segments:
+        if code:
+            block = text[start:end].strip("\n")
+            if not block.strip():
+                continue
+            if not _FENCE_RE.match(block):
+                block = "```\n" + block
+            if len(_FENCE_RE.findall(block)) % 2:
+                block += "\n```"
+            passages.append(Passage(start, end, block))
+            continue
+        passages.extend(_sentences(text, start, end))
+    return passages
+
+
+def _sentences(text: str, start: int, end: int) -> list[Passage]:
+    breaks = [
+        (m.start(), m.end()) for m in _SENTENCE_BREAK_RE.finditer(text, start, end)
+    ]
+    sentences = []
+    for break_start, break_end in breaks + [(end, end)]:
+        sentence = text[start:break_start]
+        if sentence.strip():
+            offset = len(sentence) - len(sentence.lstrip())
+            sentences.append(Passage(start + offset, break_start, sentence.strip()))
+        start = break_end
+    return sentences
+
+
+def score_passages(passages: list[str], queries: list[str]) -> np.ndarray:
+    """Score passages by their best BM25 score over the queries.
+
+    Document frequencies are computed over the given passages, so terms
+    that appear everywhere in the retrieved context count for little.
+
+    Returns:
+        np.ndarray: The score of each passage.
+    """
+    vocab: dict[str, int] = {}
+    query_terms = [
+        [vocab.setdefault(term, len(vocab)) for term in set(tokenize(query))]
+        for query in queries
+    ]
+    if not vocab or not passages:
+        return np.zeros(len(passages), dtype=np.float32)
+
+    tfs = np.zeros((len(passages), len(vocab)), dtype=np.float32)
+    lengths = np.empty(len(passages), dtype=np.float32)
+    for row, passage in enumerate(passages):
+        tokens = tokenize(passage)
+        lengths[row] = len(tokens)
+        for term, count in Counter(tokens).items():
+            if (column := vocab.get(term)) is not None:
+                tfs[row, column] = count
+
+    df = (tfs > 0).sum(axis=0)
+    idf = np.log1p((len(passages) - df + 0.5) / (df + 0.5))
+    k1, b = 1.2, 0.75
+    length_norm = k1 * (1 - b + b * lengths / max(lengths.mean(), 1.0))
+    saturated = tfs * (k1 + 1) / (tfs + length_norm[:, None])
+
+    weights = np.zeros((len(vocab), len(queries)), dtype=np.float32)
+    for column, terms in enumerate(query_terms):
+        weights[terms, column] = idf[terms]
+    return (saturated @ weights).max(axis=1)
+
+
+def _join(text: str, passages: list[Passage]) -> str:
+    pieces = []
+    previous_end = 0
+    for passage in passages:
+        gap = text[previous_end : passage.start]
+        if gap.strip():
+            pieces.append("\n...\n" if pieces else "...\n")
+        elif pieces:
+            pieces.append(gap)
+        pieces.append(passage.text)
+        previous_end = passage.end
+    if text[previous_end:].strip():
+        pieces.append("\n...")
+    return "".join(pieces)
+
+
+def compress_documents(
+    documents: list[Document], queries: list[str], keep_ratio: float = 0.5
+) -> list[Document]:
+    """Keep the passages of each document that best match the queries.
+
+    Passages are kept best first until they make up `keep_ratio` of the
+    document's characters. Documents with fewer than three passages, or
+    without any passage that matches a query, are kept whole.
+
+    Args:
+        documents (list[Document]): The documents to compress.
+        queries (list[str]): The user's question and the research queries.
+        keep_ratio (float): Share of each document's characters to keep, between 0 and 1.
+
+    Returns:
+        list[Document]: The compressed documents, in the same order and with the same metadata.
+    """
+    split = [split_passages(doc.page_content) for doc in documents]
+    scores = score_passages([p.text for passages in split for p in passages], queries)
+
+    compressed = []
+    offset = 0
+    for doc, passages in zip(documents, split):
+        doc_scores = scores[offset : offset + len(passages)]
+        offset += len(passages)
+        if len(passages) < MIN_PASSAGES or not doc_scores.any():
+            compressed.append(doc)
+            continue
+        budget = keep_ratio * len(doc.page_content)
+        kept, size = [], 0
+        for i in np.argsort(-doc_scores, kind="stable"):
+            if kept and (size >= budget or doc_scores[i] <= 0):
+                break
+            kept.append(passages[i])
+            size += len(passages[i].text)
+        text = _join(doc.page_content, sorted(kept))
+        compressed.append(Document(page_content=text, metadata=doc.metadata))
+    return compressed
@@ -7,6 +7,10 @@ from typing import Annotated, Any, Literal, Optional, Type, TypeVar
 
 from langchain_core.runnables import RunnableConfig, ensure_config
 
+from backend.cache import LRUCache
+
+CONFIGURATION_CACHE_SIZE = 256
+
 MODEL_NAME_TO_RESPONSE_MODEL = {
     "anthropic_claude_3_5_sonnet": "anthropic/claude-3-5-sonnet-20240620",
 }
@@ -30,7 +34,25 @@ def _update_configurable_for_backwards_compatibility(
     return configurable
 
 
-@dataclass(kw_only=True)
+def _freeze(value: Any) -> Any:
+    """Return a hashable equivalent of a configurable value.
+
+    Raises:
+        TypeError: If the value contains something unhashable other than dicts and lists.
+    """
+    if isinstance(value, dict):
+        return (dict, tuple(sorted((k, _freeze(v)) for k, v in value.items())))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    hash(value)
+    return value
+
+
+_init_fields: dict[type, frozenset[str]] = {}
+_configurations: LRUCache[Any] = LRUCache(CONFIGURATION_CACHE_SIZE)
+
+
+@dataclass(kw_only=True, frozen=True)
 class BaseConfiguration:
     """Configuration class for indexing and retrieval operations.
 
@@ -48,12 +70,49 @@ class BaseConfiguration:
         },
     )
 
+    embedding_cache: Literal["none", "memory", "disk"] = field(
+        default="memory",
+        metadata={
+            "description": "Where to cache query embeddings. 'memory' keeps a bounded LRU in each process; 'disk' also persists them to embedding_cache_path so that several workers can share them."
+        },
+    )
+
+    embedding_cache_path: str = field(
+        default=".cache/embeddings.sqlite",
+        metadata={
+            "description": "Path of the SQLite file used when embedding_cache is 'disk'."
+        },
+    )
+
     retriever_provider: Annotated[
-        Literal["weaviate"],
+        Literal["weaviate", "local"],
         {"__template_metadata__": {"kind": "retriever"}},
     ] = field(
         default="weaviate",
-        metadata={"description": "The vector store provider to use for retrieval."},
+        metadata={
+            "description": "The vector store provider to use for retrieval. 'local' searches an in-process, memory-mapped index exported by ingest_docs."
+        },
+    )
+
+    local_index_path: str = field(
+        default=".cache/local_index",
+        metadata={
+            "description": "Directory of the local index used when retriever_provider is 'local'."
+        },
+    )
+
+    local_index_nprobe: int = field(
+        default=16,
+        metadata={
+            "description": "Number of IVF lists the local index scans per query, if it was built with an IVF index. Use 0 for an exact search."
+        },
+    )
+
+    lexical_weight: float = field(
+        default=0.3,
+        metadata={
+            "description": "Weight of lexical (BM25) relevance in hybrid search, between 0 (dense vectors only) and 1 (keywords only). Sets alpha = 1 - lexical_weight for Weaviate, unless search_kwargs sets alpha."
+        },
     )
 
     search_kwargs: dict[str, Any] = field(
@@ -63,6 +122,76 @@ class BaseConfiguration:
         },
     )
 
+    adaptive_k: bool = field(
+        default=False,
+        metadata={
+            "description": "Whether to choose the number of results of each search from their scores, instead of always returning search_kwargs['k']. Searches fetch adaptive_k_max results and cut them at the first one below adaptive_k_score_threshold or after a score drop of adaptive_k_score_gap, keeping at least adaptive_k_min."
+        },
+    )
+
+    adaptive_k_min: int = field(
+        default=2,
+        metadata={
+            "description": "Minimum number of results per search with adaptive_k."
+        },
+    )
+
+    adaptive_k_max: int = field(
+        default=10,
+        metadata={
+            "description": "Maximum number of results per search with adaptive_k."
+        },
+    )
+
+    adaptive_k_score_threshold: float = field(
+        default=0.0,
+        metadata={
+            "description": "Score below which results are cut with adaptive_k. Scores are Weaviate's hybrid scores, or, with the local index, cosine similarities, or fused scores between 0 and 1 if lexical_weight is positive."
+        },
+    )
+
+    adaptive_k_score_gap: float = field(
+        default=0.15,
+        metadata={
+            "description": "Drop between the scores of consecutive results at which the later results are cut with adaptive_k; 0 disables the gap cutoff."
+        },
+    )
+
+    retrieval_cache: Literal["none", "memory", "disk"] = field(
+        default="memory",
+        metadata={
+            "description": "Where to cache search results, keyed by normalized query, search settings and index generation. 'memory' keeps a bounded LRU in each process; 'disk' also persists them to retrieval_cache_path so that several workers can share them."
+        },
+    )
+
+    retrieval_cache_ttl: float = field(
+        default=600.0,
+        metadata={
+            "description": "Seconds a cached search result is served for. Ingestion invalidates cached results immediately by bumping the index generation."
+        },
+    )
+
+    retrieval_cache_path: str = field(
+        default=".cache/retrieval.sqlite",
+        metadata={
+            "description": "Path of the SQLite file used when retrieval_cache is 'disk'."
+        },
+    )
+
+    document_store: Literal["none", "memory", "disk"] = field(
+        default="disk",
+        metadata={
+            "description": "Where retrieved documents are stored so that the graph state only carries references with a short preview. 'memory' keeps them in each process; 'disk' also persists them to document_store_path so that several workers can share them; 'none' keeps full documents in the state. Documents that are no longer stored are retrieved again."
+        },
+    )
+
+    document_store_path: str = field(
+        default=".cache/documents.sqlite",
+        metadata={
+            "description": "Path of the SQLite file used when document_store is 'disk'."
+        },
+    )
+
     # for backwards compatibility
     k: int = field(
         default=6,
@@ -77,6 +206,10 @@ class BaseConfiguration:
     ) -> T:
         """Create an IndexConfiguration instance from a RunnableConfig object.
 
+        Every node of a run resolves the same configurable values, so
+        instances are cached by their values and shared between nodes and
+        runs. Instances are frozen, so sharing them is safe.
+
         Args:
             cls (Type[T]): The class itself.
             config (Optional[RunnableConfig]): The configuration object to use.
@@ -87,8 +220,19 @@ class BaseConfiguration:
         config = ensure_config(config)
         configurable = config.get("configurable") or {}
         configurable = _update_configurable_for_backwards_compatibility(configurable)
-        _fields = {f.name for f in fields(cls) if f.init}
-        return cls(**{k: v for k, v in configurable.items() if k in _fields})
+        if cls not in _init_fields:
+            _init_fields[cls] = frozenset(f.name for f in fields(cls) if f.init)
+        _fields = _init_fields[cls]
+        values = {k: v for k, v in configurable.items() if k in _fields}
+        try:
+            key = (cls, _freeze(values))
+        except TypeError:
+            return cls(**values)
+        configuration = _configurations.get(key)
+        if configuration is None:
+            configuration = cls(**values)
+            _configurations.set(key, configuration)
+        return configuration
 
 
 T = TypeVar("T", bound=BaseConfiguration)
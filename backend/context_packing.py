@@ -0,0 +1,186 @@
+"""Pack the response context into a token budget.
+
+The response prompt holds the documents gathered by the researchers, and
+with 4000-character chunks their size dominates the latency and cost of the
+response. `pack_context` takes the documents best first and keeps each one
+that still fits the budget, measured with the response model's tokenizer.
+Documents are skipped when most of their text is already in the context
+through an overlapping chunk of the same source.
+
+Token counts are cached by text, so documents that are retrieved again in
+later turns or runs, and the messages of a conversation, are not tokenized
+twice.
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import re
+from typing import NamedTuple, Optional
+
+import tiktoken
+from langchain_core.documents import Document
+
+from backend.cache import LRUCache
+from backend.utils import format_doc
+
+logger = logging.getLogger(__name__)
+
+TOKEN_COUNT_CACHE_SIZE = 20_000
+SHINGLE_SIZE = 8
+CHARS_PER_TOKEN = 4
+
+
+class TokenCounter:
+    """Count the tokens of texts and formatted documents.
+
+    Args:
+        encoding (Optional[tiktoken.Encoding]): The tokenizer, or None to estimate
+            counts from the text length.
+    """
+
+    def __init__(self, encoding: Optional[tiktoken.Encoding]) -> None:
+        self._encoding = encoding
+        self.name = encoding.name if encoding else f"{CHARS_PER_TOKEN}-chars"
+
+    def count(self, text: str) -> int:
+        """Return the number of tokens in `text`."""
+        if self._encoding is None:
+            return math.ceil(len(text) / CHARS_PER_TOKEN)
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def count_cached(self, text: str) -> int:
+        """Return the number of tokens in `text`, from the cache if it was counted before."""
+        key = (self.name, hashlib.sha1(text.encode()).digest())
+        tokens = _token_counts.get(key)
+        if tokens is None:
+            tokens = self.count(text)
+            _token_counts.set(key, tokens)
+        return tokens
+
+    def count_document(self, doc: Document) -> int:
+        """Return the number of tokens of `doc` as formatted in the context."""
+        return self.count_cached(format_doc(doc))
+
+
+_token_counts: LRUCache[int] = LRUCache(TOKEN_COUNT_CACHE_SIZE)
+_token_counters: dict[str, TokenCounter] = {}
+
+
+def get_token_counter(fully_specified_name: str) -> TokenCounter:
+    """Return the token counter for a chat model, loading its tokenizer on first use.
+
+    OpenAI models are counted with their own tiktoken encoding. Other
+    providers do not publish their tokenizers, so their counts are
+    approximated with cl100k_base. If the encoding cannot be loaded, e.g.
+    because it has not been downloaded yet and there is no network, counts
+    are estimated from the text length.
+
+    Args:
+        fully_specified_name (str): String in the format 'provider/model'.
+    """
+    if fully_specified_name not in _token_counters:
+        provider, _, model = fully_specified_name.rpartition("/")
+        try:
+            if provider == "openai":
+                try:
+                    encoding = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    encoding = tiktoken.get_encoding("o200k_base")
+            else:
+                encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            logger.warning(
+                f"Could not load a tokenizer for {fully_specified_name}; "
+                "estimating token counts from text length"
+            )
+            encoding = None
+        _token_counters[fully_specified_name] = TokenCounter(encoding)
+    return _token_counters[fully_specified_name]
+
+
+async def aget_token_counter(fully_specified_name: str) -> TokenCounter:
+    """Return the token counter for a chat model without blocking the event loop.
+
+    Loading a tokenizer reads, or downloads, its files, so the first load for
+    each model runs in a worker thread.
+    """
+    if fully_specified_name in _token_counters:
+        return _token_counters[fully_specified_name]
+    return await asyncio.to_thread(get_token_counter, fully_specified_name)
+
+
+class PackedContext(NamedTuple):
+    """The documents picked for the response context."""
+
+    documents: list[Document]
+    tokens: int
+    """Tokens of the picked documents, as formatted in the context."""
+    overlapping: int
+    """Documents skipped because their text overlaps a picked chunk of the same source."""
+    over_budget: int
+    """Documents skipped because they did not fit the remaining budget."""
+
+
+def _shingles(text: str) -> set[int]:
+    words = re.findall(r"\w+", text.lower())
+    return {
+        hash(tuple(words[i : i + SHINGLE_SIZE]))
+        for i in range(max(len(words) - SHINGLE_SIZE + 1, 1))
+    }
+
+
+def pack_context(
+    documents: list[Document],
+    counter: TokenCounter,
+    token_budget: int,
+    overlap_threshold: float = 0.5,
+) -> PackedContext:
+    """Pick documents, best first, until the token budget is spent.
+
+    A document that does not fit the remaining budget is skipped, and
+    smaller documents after it may still be picked.
+
+    Args:
+        documents (list[Document]): The candidate documents, best first.
+        counter (TokenCounter): Counts the tokens of each formatted document.
+        token_budget (int): Maximum number of tokens of the picked documents.
+        overlap_threshold (float): Share of a document's word 8-grams that must already
+            appear in a picked document of the same `source` for it to be skipped.
+
+    Returns:
+        PackedContext: The picked documents, in their original order.
+    """
+    picked: list[Document] = []
+    picked_by_source: dict[str, list[Document]] = {}
+    shingles: dict[int, set[int]] = {}
+
+    def shingles_of(doc: Document) -> set[int]:
+        # only computed for documents that share a source with a picked one
+        if id(doc) not in shingles:
+            shingles[id(doc)] = _shingles(doc.page_content)
+        return shingles[id(doc)]
+
+    tokens = overlapping = over_budget = 0
+    for doc in documents:
+        source = doc.metadata.get("source")
+        same_source = picked_by_source.get(source, []) if source else []
+        if same_source:
+            doc_shingles = shingles_of(doc)
+            if any(
+                len(doc_shingles & shingles_of(other))
+                >= overlap_threshold * len(doc_shingles)
+                for other in same_source
+            ):
+                overlapping += 1
+                continue
+        doc_tokens = counter.count_document(doc)
+        if tokens + doc_tokens > token_budget:
+            over_budget += 1
+            continue
+        picked.append(doc)
+        tokens += doc_tokens
+        if source:
+            picked_by_source.setdefault(source, []).append(doc)
+    return PackedContext(picked, tokens, overlapping, over_budget)
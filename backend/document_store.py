@@ -0,0 +1,183 @@
+"""Store retrieved documents once, so graph state can carry references to them.
+
+The researchers' documents end up in the graph state, which the
+checkpointer serializes into every checkpoint of every thread, although
+the same popular chunks are retrieved over and over. `store_documents`
+puts each retrieved chunk into a process-wide store keyed by its index
+uuid and returns references in its place: documents with the same
+metadata but only a short preview of the text, enough for the frontend's
+document cards. `hydrate_documents` swaps the references for the stored
+documents where the full text is needed, in `respond`.
+
+Entries belong to an index generation, like the retrieval cache, so a
+chunk that changes in an ingestion run is never served in its old form.
+With the 'disk' store, documents are also written to a SQLite file that
+several worker processes on the same host share. A reference whose
+document is in neither store, e.g. because it was evicted or stored by
+another host, is left as it is by `hydrate_documents`; callers check for it
+with `is_reference` and retrieve the document again. Graph nodes use
+`astore_documents` and `ahydrate_documents`, which run the SQLite reads
+and writes of the 'disk' store in a worker thread.
+"""
+
+import asyncio
+import json
+from typing import Optional
+
+from langchain_core.documents import Document
+
+from backend.cache import LRUCache, SQLiteStore
+from backend.configuration import BaseConfiguration
+from backend.index_generation import get_index_generation
+
+DOCUMENT_STORE_SIZE = 5_000
+PREVIEW_CHARS = 250
+REFERENCE_KEY = "content_ref"
+"""Metadata key marking a document as a reference to a stored document."""
+
+_memory_store: LRUCache[Document] = LRUCache(DOCUMENT_STORE_SIZE)
+_disk_stores: dict[str, tuple[str, SQLiteStore]] = {}
+
+
+def get_disk_document_store(path: str, generation: str) -> SQLiteStore:
+    """Return the on-disk document store at `path`, opening it on first use.
+
+    Documents of older index generations are deleted the first time a new
+    generation is seen.
+    """
+    store_generation, store = _disk_stores.get(path, (None, None))
+    if store is None:
+        store = SQLiteStore(path, table="documents")
+    if store_generation != generation:
+        store.retain_prefix(f"{generation}:")
+        _disk_stores[path] = (generation, store)
+    return store
+
+
+def _disk_store(configuration: BaseConfiguration) -> Optional[SQLiteStore]:
+    match configuration.document_store:
+        case "none" | "memory":
+            return None
+        case "disk":
+            return get_disk_document_store(
+                configuration.document_store_path, get_index_generation()
+            )
+        case _:
+            raise ValueError(
+                f"Unsupported document store: {configuration.document_store}"
+            )
+
+
+def is_reference(doc: Document) -> bool:
+    """Whether `doc` is a reference to a stored document."""
+    return bool(doc.metadata.get(REFERENCE_KEY))
+
+
+def store_documents(
+    configuration: BaseConfiguration, documents: list[Document]
+) -> list[Document]:
+    """Store retrieved documents and return references to them.
+
+    Documents without a `uuid` are returned as they are, as are all
+    documents if `document_store` is 'none'.
+
+    Args:
+        configuration (BaseConfiguration): Configuration selecting the document store.
+        documents (list[Document]): The retrieved documents.
+
+    Returns:
+        list[Document]: A reference, or the document itself, for each document.
+    """
+    if configuration.document_store == "none":
+        return documents
+    store = _disk_store(configuration)
+    generation = get_index_generation()
+    references, entries = [], []
+    for doc in documents:
+        uuid = doc.metadata.get("uuid")
+        if uuid is None or is_reference(doc):
+            references.append(doc)
+            continue
+        key = f"{generation}:{uuid}"
+        if _memory_store.get(key) is None:
+            _memory_store.set(key, doc)
+            entries.append(
+                (
+                    key,
+                    json.dumps(
+                        {"page_content": doc.page_content, "metadata": doc.metadata},
+                        default=str,
+                    ).encode(),
+                )
+            )
+        references.append(
+            Document(
+                page_content=doc.page_content[:PREVIEW_CHARS],
+                metadata={**doc.metadata, REFERENCE_KEY: True},
+            )
+        )
+    if store is not None and entries:
+        store.mset(entries)
+    return references
+
+
+def hydrate_documents(
+    configuration: BaseConfiguration, documents: list[Document]
+) -> list[Document]:
+    """Replace references with the documents they refer to.
+
+    References whose documents are not stored are returned unchanged, so
+    `is_reference` is true for them.
+
+    Args:
+        configuration (BaseConfiguration): Configuration selecting the document store.
+        documents (list[Document]): Documents and references, e.g. from the graph state.
+
+    Returns:
+        list[Document]: The full documents, or the unchanged references of missing ones, in the same order.
+    """
+    generation = get_index_generation()
+    keys = [
+        f"{generation}:{doc.metadata.get('uuid')}" if is_reference(doc) else None
+        for doc in documents
+    ]
+    hydrated = [
+        _memory_store.get(key) if key is not None else doc
+        for key, doc in zip(keys, documents)
+    ]
+    missing = [key for key, doc in zip(keys, hydrated) if doc is None]
+    store = _disk_store(configuration) if missing else None
+    if store is not None:
+        stored = dict(zip(missing, store.mget(missing)))
+        for i, key in enumerate(keys):
+            if hydrated[i] is None and stored.get(key) is not None:
+                hydrated[i] = Document(**json.loads(stored[key]))
+                _memory_store.set(key, hydrated[i])
+    return [
+        hydrated_doc if hydrated_doc is not None else doc
+        for hydrated_doc, doc in zip(hydrated, documents)
+    ]
+
+
+async def astore_documents(
+    configuration: BaseConfiguration, documents: list[Document]
+) -> list[Document]:
+    """Store retrieved documents and return references to them, without blocking the event loop.
+
+    See `store_documents`. With the 'disk' store, it runs in a worker thread.
+    """
+    if configuration.document_store != "disk":
+        return store_documents(configuration, documents)
+    return await asyncio.to_thread(store_documents, configuration, documents)
+
+
+async def ahydrate_documents(
+    configuration: BaseConfiguration, documents: list[Document]
+) -> list[Document]:
+    """Replace references with the documents they refer to, without blocking the event loop.
+
+    See `hydrate_documents`. With the 'disk' store, it runs in a worker thread.
+    """
+    if configuration.document_store != "disk":
+        return hydrate_documents(configuration, documents)
+    return await asyncio.to_thread(hydrate_documents, configuration, documents)
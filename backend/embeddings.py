@@ -1,6 +1,166 @@
+import asyncio
+import hashlib
+from array import array
+from typing import Optional
+
 from langchain_core.embeddings import Embeddings
 from langchain_openai import OpenAIEmbeddings
 
+from backend.cache import CacheStats, LRUCache, SQLiteStore, normalize_text
+
+EMBEDDING_CACHE_SIZE = 10_000
+
+_memory_cache: LRUCache[list[float]] = LRUCache(EMBEDDING_CACHE_SIZE)
+_disk_stores: dict[str, SQLiteStore] = {}
+_stats = CacheStats()
+
 
 def get_embeddings_model() -> Embeddings:
     return OpenAIEmbeddings(model="text-embedding-3-small", chunk_size=200)
+
+
+def get_embedding_cache_stats() -> CacheStats:
+    """Return the process-wide hit/miss counters of the embedding cache."""
+    return _stats
+
+
+def get_disk_embedding_store(path: str) -> SQLiteStore:
+    """Return the on-disk embedding store at `path`, opening it on first use."""
+    if path not in _disk_stores:
+        _disk_stores[path] = SQLiteStore(path, table="embeddings")
+    return _disk_stores[path]
+
+
+async def aembed_queries(embeddings: Embeddings, texts: list[str]) -> list[list[float]]:
+    """Embed several search queries, in a single call where the model allows it.
+
+    Queries are embedded like `aembed_query` would, so their vectors match
+    those of single queries and share their cache entries. OpenAI models
+    embed queries and documents alike, so the queries are sent in one
+    batched request; other models embed each query concurrently.
+
+    Args:
+        embeddings (Embeddings): The embeddings model.
+        texts (list[str]): The queries to embed.
+
+    Returns:
+        list[list[float]]: The embedding of each query, in the order of `texts`.
+    """
+    if isinstance(embeddings, CachedEmbeddings):
+        return await embeddings.aembed_queries(texts)
+    if isinstance(embeddings, OpenAIEmbeddings):
+        return await embeddings.aembed_documents(texts)
+    return list(await asyncio.gather(*(embeddings.aembed_query(t) for t in texts)))
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that caches vectors by model name and normalized text.
+
+    Lookups go to a bounded in-memory LRU shared by the whole process first,
+    then to the optional on-disk store, which can be shared by several worker
+    processes. Only the texts missing from both are sent to the underlying
+    model, in a single batch.
+
+    Args:
+        underlying (Embeddings): The embeddings model to cache.
+        model (str): The fully specified model name, e.g. 'openai/text-embedding-3-small'.
+        store (Optional[SQLiteStore]): On-disk store shared across workers, if any.
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        model: str,
+        store: Optional[SQLiteStore] = None,
+    ) -> None:
+        self.underlying = underlying
+        self.model = model
+        self.store = store
+
+    def _key(self, text: str, kind: str) -> str:
+        digest = hashlib.sha256(normalize_text(text).encode()).hexdigest()
+        return f"{self.model}:{kind}:{digest}"
+
+    def _lookup(self, keys: list[str]) -> list[Optional[list[float]]]:
+        vectors = [_memory_cache.get(key) for key in keys]
+        missing = [key for key, vector in zip(keys, vectors) if vector is None]
+        if self.store is not None and missing:
+            stored = dict(zip(missing, self.store.mget(missing)))
+            for i, key in enumerate(keys):
+                if vectors[i] is None and stored.get(key) is not None:
+                    vectors[i] = array("d", stored[key]).tolist()
+                    _memory_cache.set(key, vectors[i])
+
+        hits = sum(vector is not None for vector in vectors)
+        _stats.hits += hits
+        _stats.misses += len(keys) - hits
+        return vectors
+
+    def _save(self, keys: list[str], vectors: list[list[float]]) -> None:
+        for key, vector in zip(keys, vectors):
+            _memory_cache.set(key, vector)
+        if self.store is not None:
+            self.store.mset(
+                [
+                    (key, array("d", vector).tobytes())
+                    for key, vector in zip(keys, vectors)
+                ]
+            )
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self._key(text, "document") for text in texts]
+        vectors = self._lookup(keys)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            computed = self.underlying.embed_documents([texts[i] for i in missing])
+            self._save([keys[i] for i in missing], computed)
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+        return vectors
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self._key(text, "document") for text in texts]
+        vectors = self._lookup(keys)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            computed = await self.underlying.aembed_documents(
+                [texts[i] for i in missing]
+            )
+            self._save([keys[i] for i in missing], computed)
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        key = self._key(text, "query")
+        (vector,) = self._lookup([key])
+        if vector is None:
+            vector = self.underlying.embed_query(text)
+            self._save([key], [vector])
+        return vector
+
+    async def aembed_query(self, text: str) -> list[float]:
+        key = self._key(text, "query")
+        (vector,) = self._lookup([key])
+        if vector is None:
+            vector = await self.underlying.aembed_query(text)
+            self._save([key], [vector])
+        return vector
+
+    async def aembed_queries(self, texts: list[str]) -> list[list[float]]:
+        """Embed several search queries, looking each up like `aembed_query`.
+
+        The queries missing from the cache are embedded together with
+        `aembed_queries`.
+        """
+        keys = [self._key(text, "query") for text in texts]
+        vectors = self._lookup(keys)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            computed = await aembed_queries(
+                self.underlying, [texts[i] for i in missing]
+            )
+            self._save([keys[i] for i in missing], computed)
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+        return vectors
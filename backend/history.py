@@ -0,0 +1,99 @@
+"""Compact the conversation history sent to the chat models.
+
+The nodes of the graph send the conversation along with their system
+prompt, so without compaction, prompts grow with every turn of a thread.
+`compact_messages` replaces the messages that a rolling summary already
+covers by that summary, keeping as many of them as fit a node's token
+budget; messages the summary does not cover yet are always sent.
+`messages_to_summarize` picks the messages that the summary should absorb
+next, so each message is summarized once.
+"""
+
+from typing import Any, Optional
+
+from langchain_core.messages import AnyMessage, HumanMessage, get_buffer_string
+
+from backend.context_packing import TokenCounter
+
+
+def count_message_tokens(message: AnyMessage, counter: TokenCounter) -> int:
+    """Return the number of tokens of a message, from the cache if it was counted before."""
+    return counter.count_cached(get_buffer_string([message]))
+
+
+def compact_messages(
+    system_prompt: str,
+    messages: list[AnyMessage],
+    summary: str,
+    summarized: int,
+    counter: TokenCounter,
+    max_tokens: Optional[int],
+) -> list[Any]:
+    """Build the messages of a prompt from a system prompt and the conversation.
+
+    Only messages that the summary covers are ever left out, so nothing
+    said in the conversation is lost: the messages from `summarized` on are
+    always kept, even if they exceed `max_tokens`. Summarized messages are
+    kept too, newest first, while they fit `max_tokens`, and the kept
+    messages always start with a user message. If any message is left out,
+    the summary is appended to the system prompt.
+
+    Args:
+        system_prompt (str): The node's system prompt.
+        messages (list[AnyMessage]): The conversation, oldest first.
+        summary (str): The rolling summary of the earlier conversation, if any.
+        summarized (int): Number of messages, from the start, that the summary covers.
+        counter (TokenCounter): Counts the tokens of each message.
+        max_tokens (Optional[int]): Maximum tokens of the kept messages, or None to keep all of them.
+
+    Returns:
+        list[Any]: The system message followed by the kept messages.
+    """
+    kept = list(messages)
+    summarized = min(summarized, len(messages)) if summary else 0
+    if max_tokens is not None and summarized > 0:
+        start = summarized
+        tokens = sum(count_message_tokens(m, counter) for m in messages[start:])
+        while start > 0:
+            message_tokens = count_message_tokens(messages[start - 1], counter)
+            if start < len(messages) and tokens + message_tokens > max_tokens:
+                break
+            start -= 1
+            tokens += message_tokens
+        while start < min(summarized, len(messages) - 1) and not isinstance(
+            messages[start], HumanMessage
+        ):
+            start += 1
+        kept = messages[start:]
+    if summary and len(kept) < len(messages):
+        system_prompt += (
+            "\n\n<conversation_summary>\n" f"{summary}\n" "</conversation_summary>"
+        )
+    return [{"role": "system", "content": system_prompt}] + kept
+
+
+def messages_to_summarize(
+    messages: list[AnyMessage],
+    summarized: int,
+    keep_messages: int,
+    counter: TokenCounter,
+    trigger_tokens: int,
+) -> Optional[int]:
+    """Decide how far the summary should be extended.
+
+    The summary covers the first `summarized` messages. It is extended up
+    to the start of the latest `keep_messages` messages, moved back to a
+    user message so that no turn is split, once the messages in between
+    reach `trigger_tokens`.
+
+    Returns:
+        Optional[int]: The number of messages the extended summary should cover, or None if
+            it is not due yet.
+    """
+    end = len(messages) - max(keep_messages, 1)
+    while end > summarized and not isinstance(messages[end], HumanMessage):
+        end -= 1
+    if end <= summarized:
+        return None
+    tokens = sum(count_message_tokens(m, counter) for m in messages[summarized:end])
+    return end if tokens >= trigger_tokens else None
@@ -0,0 +1,135 @@
+"""Track the generation of the search index.
+
+Every ingestion run bumps the generation, and caches of search results
+include it in their keys, so results from before the run are never served
+after it.
+
+Ingestion runs on a different machine than the server, so the generation is
+stored in Weaviate, which both of them already use: a single object in the
+`INDEX_GENERATION_COLLECTION` collection. The server reads it with
+`aget_index_generation` at most every `INDEX_GENERATION_TTL` seconds (30 by
+default), and `get_index_generation` returns the value read last, for code
+that cannot await. Without `WEAVIATE_URL`, e.g. with the local index, the
+generation is stored in a small file at `INDEX_GENERATION_PATH`, which
+works when ingestion and the server share a host. The `INDEX_GENERATION`
+environment variable pins the generation and overrides both.
+"""
+
+import logging
+import os
+import time
+import uuid
+from typing import Any, Optional
+
+from weaviate.classes.config import Configure, DataType, Property
+
+from backend.weaviate_pool import WeaviateClientPool, get_client_pool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_GENERATION_PATH = ".cache/index_generation"
+DEFAULT_INDEX_GENERATION_TTL = 30.0
+INDEX_GENERATION_COLLECTION = "IndexGeneration"
+# the single object holding the generation
+INDEX_GENERATION_UUID = str(uuid.uuid5(uuid.NAMESPACE_URL, INDEX_GENERATION_COLLECTION))
+
+# (generation, monotonic time it was read), or None before the first read
+_generation: Optional[tuple[str, float]] = None
+
+
+def _generation_path() -> str:
+    return os.environ.get("INDEX_GENERATION_PATH", DEFAULT_INDEX_GENERATION_PATH)
+
+
+def _generation_ttl() -> float:
+    return float(os.environ.get("INDEX_GENERATION_TTL", DEFAULT_INDEX_GENERATION_TTL))
+
+
+def _uses_weaviate() -> bool:
+    return bool(os.environ.get("WEAVIATE_URL"))
+
+
+def _read_file() -> str:
+    try:
+        with open(_generation_path()) as f:
+            return f.read().strip() or "0"
+    except FileNotFoundError:
+        return "0"
+
+
+async def _read_weaviate(pool: WeaviateClientPool) -> str:
+    async with pool.connection() as client:
+        if not await client.collections.exists(INDEX_GENERATION_COLLECTION):
+            return "0"
+        collection = client.collections.get(INDEX_GENERATION_COLLECTION)
+        obj = await collection.query.fetch_object_by_id(INDEX_GENERATION_UUID)
+    return (obj.properties.get("generation") if obj else None) or "0"
+
+
+def get_index_generation() -> str:
+    """Return the index generation read last, or "0" if it was never bumped.
+
+    With Weaviate, this is the value last read by `aget_index_generation`,
+    which every run awaits before its first cache lookup.
+    """
+    if generation := os.environ.get("INDEX_GENERATION"):
+        return generation
+    if not _uses_weaviate():
+        return _read_file()
+    return _generation[0] if _generation is not None else "0"
+
+
+async def aget_index_generation(pool: Optional[WeaviateClientPool] = None) -> str:
+    """Return the current index generation, reading it again if it is older than the TTL.
+
+    If the generation cannot be read, the value read last is kept.
+
+    Args:
+        pool (Optional[WeaviateClientPool]): Pool to borrow a Weaviate client from.
+            Defaults to the process-wide pool.
+    """
+    global _generation
+    if os.environ.get("INDEX_GENERATION") or not _uses_weaviate():
+        return get_index_generation()
+    now = time.monotonic()
+    if _generation is None or now - _generation[1] >= _generation_ttl():
+        try:
+            _generation = (await _read_weaviate(pool or get_client_pool()), now)
+        except Exception:
+            logger.warning("Failed to read the index generation", exc_info=True)
+            _generation = (get_index_generation(), now)
+    return _generation[0]
+
+
+def bump_index_generation(client: Optional[Any] = None) -> str:
+    """Start a new index generation, invalidating cached search results.
+
+    Args:
+        client (Optional[weaviate.WeaviateClient]): A connected, synchronous Weaviate
+            client. If given, the generation is stored in Weaviate, where the server
+            reads it. It is always written to the local generation file too.
+
+    Returns:
+        str: The new generation.
+    """
+    generation = uuid.uuid4().hex
+    if client is not None:
+        if not client.collections.exists(INDEX_GENERATION_COLLECTION):
+            client.collections.create(
+                INDEX_GENERATION_COLLECTION,
+                properties=[Property(name="generation", data_type=DataType.TEXT)],
+                vectorizer_config=Configure.Vectorizer.none(),
+            )
+        collection = client.collections.get(INDEX_GENERATION_COLLECTION)
+        properties = {"generation": generation}
+        if collection.data.exists(INDEX_GENERATION_UUID):
+            collection.data.replace(uuid=INDEX_GENERATION_UUID, properties=properties)
+        else:
+            collection.data.insert(properties, uuid=INDEX_GENERATION_UUID)
+
+    path = _generation_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(f"{path}.tmp", "w") as f:
+        f.write(generation)
+    os.replace(f"{path}.tmp", path)
+    return generation
@@ -14,6 +14,8 @@ from langchain_weaviate import WeaviateVectorStore
 
 from backend.constants import WEAVIATE_DOCS_INDEX_NAME
 from backend.embeddings import get_embeddings_model
+from backend.index_generation import bump_index_generation
+from backend.local_index import write_local_index
 from backend.parser import langchain_docs_extractor
 
 logging.basicConfig(level=logging.INFO)
@@ -118,6 +120,20 @@ def load_api_docs():
     ).load()
 
 
+def export_local_index(weaviate_client: weaviate.WeaviateClient, path: str) -> None:
+    """Export the indexed chunks and their vectors for the 'local' retriever provider."""
+    collection = weaviate_client.collections.get(WEAVIATE_DOCS_INDEX_NAME)
+
+    def records():
+        for obj in collection.iterator(include_vector=True):
+            properties = dict(obj.properties)
+            text = properties.pop("text")
+            yield str(obj.uuid), text, properties, obj.vector["default"]
+
+    num_chunks = write_local_index(path, records())
+    logger.info(f"Exported {num_chunks} chunks to the local index at {path}")
+
+
 def ingest_docs():
     WEAVIATE_URL = os.environ["WEAVIATE_URL"]
     WEAVIATE_API_KEY = os.environ["WEAVIATE_API_KEY"]
@@ -191,6 +207,13 @@ def ingest_docs():
             f"LangChain now has this many vectors: {num_vecs}",
         )
 
+        local_index_path = os.environ.get("LOCAL_INDEX_PATH")
+        if local_index_path:
+            export_local_index(weaviate_client, local_index_path)
+
+        generation = bump_index_generation(weaviate_client)
+        logger.info(f"Bumped the index generation to {generation}")
+
 
 if __name__ == "__main__":
     ingest_docs()
@@ -0,0 +1,247 @@
+"""In-process vector index backed by memory-mapped NumPy files.
+
+The index is a directory written by `write_local_index`:
+
+- `vectors.npy`: float32 matrix of L2-normalized chunk embeddings, one row per chunk.
+- `chunks.jsonl`: one JSON object per chunk with its `uuid`, `text` and `metadata`.
+- `offsets.npy`: byte offset of every line of `chunks.jsonl`, plus its total size.
+- `ivf_centroids.npy`, `ivf_order.npy`, `ivf_offsets.npy`: optional inverted-file
+  (IVF) index used for approximate search on larger corpora.
+- `bm25_*`: a BM25 index over the same chunks for lexical search (see `backend.bm25`).
+
+Every file is opened with `mmap`, so worker processes that load the same
+index share a single copy through the OS page cache.
+"""
+
+import json
+import logging
+import math
+import mmap
+import os
+from typing import Any, Iterable, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from backend.bm25 import BM25Builder, BM25Index
+
+logger = logging.getLogger(__name__)
+
+IVF_MIN_CORPUS_SIZE = 10_000
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _train_ivf(
+    vectors: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0
+) -> tuple[np.ndarray, np.ndarray]:
+    """Cluster the vectors with spherical k-means and assign each to its nearest centroid."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), nlist * 256)
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        for i in range(nlist):
+            members = sample[assignments == i]
+            if len(members):
+                centroids[i] = members.sum(axis=0)
+        centroids = _normalize(centroids)
+
+    assignments = np.concatenate(
+        [
+            np.argmax(vectors[start : start + 8192] @ centroids.T, axis=1)
+            for start in range(0, len(vectors), 8192)
+        ]
+    )
+    return centroids, assignments
+
+
+def write_local_index(
+    path: str,
+    records: Iterable[tuple[str, str, dict[str, Any], list[float]]],
+    nlist: Optional[int] = None,
+) -> int:
+    """Write a local index from `(uuid, text, metadata, vector)` records.
+
+    The files are written next to the index and then moved into place, so
+    processes that already mapped the previous index keep reading it until
+    they reload.
+
+    Args:
+        path (str): Directory to write the index to. An existing index is replaced.
+        records (Iterable[tuple[str, str, dict[str, Any], list[float]]]): The chunks to index.
+        nlist (Optional[int]): Number of IVF lists to build. Defaults to `sqrt(n)` for corpora
+            of at least `IVF_MIN_CORPUS_SIZE` chunks, and no IVF index for smaller ones.
+            Use 0 to never build one.
+
+    Returns:
+        int: The number of chunks written.
+    """
+    tmp_path = f"{path}.tmp"
+    os.makedirs(tmp_path, exist_ok=True)
+    os.makedirs(path, exist_ok=True)
+
+    vectors = []
+    offsets = [0]
+    bm25 = BM25Builder()
+    with open(os.path.join(tmp_path, "chunks.jsonl"), "wb") as f:
+        for uuid, text, metadata, vector in records:
+            line = json.dumps(
+                {"uuid": uuid, "text": text, "metadata": metadata}, default=str
+            )
+            offsets.append(offsets[-1] + f.write(line.encode() + b"\n"))
+            vectors.append(np.asarray(vector, dtype=np.float32))
+            bm25.add(text)
+    bm25.write(tmp_path)
+
+    matrix = _normalize(np.stack(vectors)) if vectors else np.zeros((0, 0), np.float32)
+    arrays = {
+        "vectors.npy": matrix,
+        "offsets.npy": np.asarray(offsets, dtype=np.int64),
+    }
+    if nlist is None:
+        nlist = int(math.sqrt(len(matrix))) if len(matrix) >= IVF_MIN_CORPUS_SIZE else 0
+    if nlist > 0:
+        centroids, assignments = _train_ivf(matrix, nlist)
+        order = np.argsort(assignments, kind="stable")
+        arrays["ivf_centroids.npy"] = centroids
+        arrays["ivf_order.npy"] = order
+        arrays["ivf_offsets.npy"] = np.searchsorted(
+            assignments[order], np.arange(nlist + 1)
+        )
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, name), array)
+
+    for name in ("ivf_centroids.npy", "ivf_order.npy", "ivf_offsets.npy"):
+        if name not in arrays and os.path.exists(os.path.join(path, name)):
+            os.remove(os.path.join(path, name))
+    # offsets.npy goes last: its mtime tells loaded indexes to reload
+    for name in sorted(os.listdir(tmp_path), key=lambda name: name == "offsets.npy"):
+        os.replace(os.path.join(tmp_path, name), os.path.join(path, name))
+    os.rmdir(tmp_path)
+
+    logger.info(f"Wrote local index with {len(matrix)} chunks and {nlist} IVF lists")
+    return len(matrix)
+
+
+class LocalIndex:
+    """A memory-mapped local index written by `write_local_index`.
+
+    Args:
+        path (str): The index directory.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self._offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        with open(os.path.join(path, "chunks.jsonl"), "rb") as f:
+            self._chunks = (
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                if self._offsets[-1]
+                else b""
+            )
+
+        self._centroids: Optional[np.ndarray] = None
+        if os.path.exists(os.path.join(path, "ivf_centroids.npy")):
+            self._centroids = np.load(os.path.join(path, "ivf_centroids.npy"))
+            self._order = np.load(os.path.join(path, "ivf_order.npy"), mmap_mode="r")
+            self._list_offsets = np.load(os.path.join(path, "ivf_offsets.npy"))
+
+        self.bm25 = BM25Index(path) if BM25Index.exists(path) else None
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    @property
+    def has_ivf(self) -> bool:
+        """Whether the index has an IVF index for approximate search."""
+        return self._centroids is not None
+
+    def search(
+        self, query_vectors: np.ndarray, k: int, nprobe: Optional[int] = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Find the nearest chunks to each query vector by cosine similarity.
+
+        Args:
+            query_vectors (np.ndarray): Matrix of query embeddings, one row per query.
+            k (int): Number of chunks to return per query.
+            nprobe (Optional[int]): Number of IVF lists to scan per query. If None, or if
+                the index has no IVF index, the search is exact.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Row indices and cosine distances of the
+                nearest chunks, each of shape `(len(query_vectors), k')` with
+                `k' = min(k, len(self))`, best match first.
+        """
+        queries = _normalize(np.atleast_2d(np.asarray(query_vectors, np.float32)))
+        k = min(k, len(self))
+        if k == 0:
+            empty = np.zeros((len(queries), 0))
+            return empty.astype(np.int64), empty
+
+        if nprobe is None or not self.has_ivf:
+            return self._top_k(queries @ self.vectors.T, np.arange(len(self)), k)
+
+        probes = np.argsort(-(queries @ self._centroids.T), axis=1)[:, :nprobe]
+        indices, distances = [], []
+        for query, lists in zip(queries, probes):
+            candidates = np.sort(
+                np.concatenate(
+                    [
+                        self._order[self._list_offsets[i] : self._list_offsets[i + 1]]
+                        for i in lists
+                    ]
+                )
+            )
+            if len(candidates) < k:
+                # the probed lists are too small; fall back to an exact search
+                candidates = np.arange(len(self))
+            scores = self.vectors[candidates] @ query
+            idx, dist = self._top_k(scores[None, :], candidates, k)
+            indices.append(idx[0])
+            distances.append(dist[0])
+        return np.stack(indices), np.stack(distances)
+
+    @staticmethod
+    def _top_k(
+        scores: np.ndarray, candidates: np.ndarray, k: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        return candidates[top], 1.0 - np.take_along_axis(top_scores, order, axis=1)
+
+    def get_documents(self, indices: Iterable[int]) -> list[Document]:
+        """Load the chunks at the given row indices as Documents."""
+        docs = []
+        for i in indices:
+            start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+            chunk = json.loads(self._chunks[start:end])
+            docs.append(
+                Document(
+                    page_content=chunk["text"],
+                    metadata={**chunk["metadata"], "uuid": chunk["uuid"]},
+                )
+            )
+        return docs
+
+
+_indexes: dict[str, tuple[float, LocalIndex]] = {}
+
+
+def get_local_index(path: str) -> LocalIndex:
+    """Return the local index at `path`, loading it on first use.
+
+    The index is reloaded when its files are rewritten by a new export.
+    """
+    mtime = os.path.getmtime(os.path.join(path, "offsets.npy"))
+    cached = _indexes.get(path)
+    if cached is None or cached[0] != mtime:
+        _indexes[path] = (mtime, LocalIndex(path))
+    return _indexes[path][1]
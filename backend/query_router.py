@@ -0,0 +1,249 @@
+"""Fast local classification of user queries by their nearest labelled examples.
+
+The router compares the embedding of a question with the embeddings of
+example questions and their `Router` decisions, and lets the most similar
+examples vote on the route. The examples are a small built-in seed set plus
+the decisions the LLM router logged with `log_router_decision`, if logging is
+enabled, so the local router learns from the LLM router as traffic comes in.
+
+Only first-turn questions are routed locally and logged: a follow-up such as
+"what about the other one?" is routed by the LLM router from the
+conversation, and its label would be wrong for the question on its own.
+Logged questions are deduplicated, the log is capped, and new lines are
+added to a built router as they are logged instead of rebuilding it.
+"""
+
+import json
+import logging
+import os
+from typing import Any, NamedTuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from backend.cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+MAX_ROUTER_EXAMPLES = 10_000
+
+_SEED_LOGIC = {
+    "langchain": "The question is about LangChain, LangGraph or LangSmith.",
+    "general": "The message is not a question about LangChain.",
+    "more-info": "The question does not include enough detail to answer it.",
+}
+_SEED_QUESTIONS = {
+    "langchain": [
+        "How do I use LCEL to chain a prompt and a model?",
+        "What's the difference between invoke and stream?",
+        "How do I add memory to my LangGraph chatbot?",
+        "How do I trace my app with LangSmith?",
+        "Which vector stores does LangChain support?",
+        "How do I get structured output from a chat model?",
+        "Why does my RetrievalQA chain return empty answers?",
+        "How do I split documents into chunks?",
+    ],
+    "general": [
+        "thanks!",
+        "hi",
+        "What's the weather like today?",
+        "Who won the world cup?",
+        "Tell me a joke",
+        "ok great, that worked",
+    ],
+    "more-info": [
+        "it doesn't work",
+        "I get an error",
+        "help",
+        "what about the other one?",
+    ],
+}
+SEED_EXAMPLES: list[dict[str, str]] = [
+    {"question": question, "type": route, "logic": _SEED_LOGIC[route]}
+    for route, questions in _SEED_QUESTIONS.items()
+    for question in questions
+]
+
+
+class RouteDecision(NamedTuple):
+    """A route picked by the local router."""
+
+    type: str
+    logic: str
+    confidence: float
+    """Share of the similarity-weighted votes of the nearest examples that went to `type`."""
+
+
+class LocalQueryRouter:
+    """Route questions by a similarity-weighted vote of their nearest examples.
+
+    Args:
+        examples (list[dict[str, str]]): Example questions with their `type` and `logic`.
+        vectors (np.ndarray): Embeddings of the example questions, one row per example.
+        k (int): Number of nearest examples that vote.
+    """
+
+    def __init__(
+        self, examples: list[dict[str, str]], vectors: np.ndarray, k: int = 5
+    ) -> None:
+        self._examples: list[dict[str, str]] = []
+        # rows beyond len(self._examples) are spare capacity for added examples
+        self._vectors = np.zeros((0, vectors.shape[1]), dtype=vectors.dtype)
+        self._k = k
+        self.add(examples, vectors)
+
+    def add(self, examples: list[dict[str, str]], vectors: np.ndarray) -> None:
+        """Add examples with the embeddings of their questions."""
+        size = len(self._examples)
+        if size + len(examples) > len(self._vectors):
+            capacity = max(2 * len(self._vectors), size + len(examples))
+            grown = np.zeros((capacity, vectors.shape[1]), dtype=self._vectors.dtype)
+            grown[:size] = self._vectors[:size]
+            self._vectors = grown
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self._vectors[size : size + len(examples)] = vectors / np.maximum(norms, 1e-12)
+        self._examples.extend(examples)
+
+    def classify(self, vector: list[float]) -> RouteDecision:
+        """Classify a question by its embedding."""
+        query = np.asarray(vector, dtype=self._vectors.dtype)
+        similarities = self._vectors[: len(self._examples)] @ (
+            query / max(float(np.linalg.norm(query)), 1e-12)
+        )
+        nearest = np.argsort(-similarities)[: self._k]
+        votes: dict[str, float] = {}
+        for i in nearest:
+            route = self._examples[i]["type"]
+            votes[route] = votes.get(route, 0.0) + max(float(similarities[i]), 0.0)
+        best = max(votes, key=votes.__getitem__)
+        total = sum(votes.values())
+        # `nearest` is sorted, so this is the closest example of the winning type
+        logic = next(
+            self._examples[i]["logic"]
+            for i in nearest
+            if self._examples[i]["type"] == best
+        )
+        return RouteDecision(best, logic, votes[best] / total if total else 0.0)
+
+
+def _read_logged_examples(path: str, offset: int = 0) -> tuple[list[dict], int]:
+    """Read the decisions logged to `path` from byte `offset` on.
+
+    Returns:
+        tuple[list[dict], int]: The complete lines read, and the offset after them.
+    """
+    if not os.path.exists(path):
+        return [], 0
+    examples = []
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            # a line that is still being written is read on the next call
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            if line.strip():
+                examples.append(json.loads(line))
+    return examples, offset
+
+
+def _distinct(
+    examples: list[dict[str, str]], new: list[dict[str, str]], seen: set[str]
+) -> list[dict[str, str]]:
+    """Append the examples of `new` whose questions are not in `seen` to `examples`."""
+    for example in new:
+        question = normalize_text(example["question"]).lower()
+        if question not in seen:
+            seen.add(question)
+            examples.append(example)
+    return examples
+
+
+_SEED_QUESTION_KEYS = {normalize_text(e["question"]).lower() for e in SEED_EXAMPLES}
+# normalized questions already logged to each path, loaded on first use
+_logged_questions: dict[str, set[str]] = {}
+
+
+def log_router_decision(
+    path: str,
+    question: str,
+    router: dict[str, Any],
+    max_examples: int = MAX_ROUTER_EXAMPLES,
+) -> bool:
+    """Append a decision of the LLM router to the examples at `path`.
+
+    Seed questions and questions that were logged before, by normalized text,
+    are skipped, and nothing is logged once `path` holds `max_examples`
+    decisions.
+
+    Returns:
+        bool: Whether the decision was logged.
+    """
+    if path not in _logged_questions:
+        examples, _ = _read_logged_examples(path)
+        _logged_questions[path] = set()
+        _distinct([], examples, _logged_questions[path])
+    logged = _logged_questions[path]
+    normalized = normalize_text(question).lower()
+    if (
+        normalized in logged
+        or normalized in _SEED_QUESTION_KEYS
+        or len(logged) >= max_examples
+    ):
+        return False
+    logged.add(normalized)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    line = json.dumps(
+        {"question": question, "type": router["type"], "logic": router["logic"]}
+    )
+    with open(path, "a") as f:
+        f.write(line + "\n")
+    return True
+
+
+class _RouterEntry(NamedTuple):
+    router: LocalQueryRouter
+    offset: int
+    """Bytes of the log already added to the router."""
+    questions: set[str]
+    """Normalized questions of the router's examples."""
+
+
+_routers: dict[tuple[str, str, int], _RouterEntry] = {}
+
+
+async def get_local_router(
+    path: str, embedding_model: str, encoder: Embeddings, k: int = 5
+) -> LocalQueryRouter:
+    """Return the local router for the examples at `path`, building it on first use.
+
+    Decisions logged to `path` since the router was built, by this or other
+    processes, are embedded and added to it. The examples are embedded in
+    batches, so a cached `encoder` only embeds new questions.
+
+    Args:
+        path (str): The file of logged router decisions.
+        embedding_model (str): Name of the embedding model, part of the router's cache key.
+        encoder (Embeddings): The embeddings used to encode the example questions.
+        k (int): Number of nearest examples that vote.
+    """
+    key = (path, embedding_model, k)
+    entry = _routers.get(key)
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    if entry is None or size < entry.offset:
+        # first use, or the log was replaced
+        logged, offset = _read_logged_examples(path)
+        questions: set[str] = set()
+        examples = _distinct([], SEED_EXAMPLES + logged, questions)
+        vectors = await encoder.aembed_documents([e["question"] for e in examples])
+        logger.info(f"Built local query router from {len(examples)} examples")
+        router = LocalQueryRouter(examples, np.asarray(vectors, dtype=np.float32), k)
+        _routers[key] = _RouterEntry(router, offset, questions)
+    elif size > entry.offset:
+        logged, offset = _read_logged_examples(path, entry.offset)
+        examples = _distinct([], logged, entry.questions)
+        if examples:
+            vectors = await encoder.aembed_documents([e["question"] for e in examples])
+            entry.router.add(examples, np.asarray(vectors, dtype=np.float32))
+        _routers[key] = entry._replace(offset=offset)
+    return _routers[key].router
@@ -0,0 +1,161 @@
+"""Rank the documents gathered by the researchers for the response context.
+
+Documents arrive grouped by query, in the order the retrievals finished.
+`rerank_documents` orders them by how well they match all queries of the
+research, drops near-duplicates and diversifies the top of the ranking:
+
+1. Reciprocal rank fusion (RRF) scores each document by its rank in every
+   query's result list, so documents found by several queries rise to the top.
+2. Maximal marginal relevance (MMR) then picks documents one at a time,
+   trading RRF relevance against similarity to the documents already picked,
+   computed from the document embeddings returned by the retrievers.
+   Candidates nearly identical to a picked document are dropped.
+"""
+
+from typing import Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from backend.cache import normalize_text
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> dict[str, float]:
+    """Score documents by their ranks in several result lists.
+
+    Args:
+        rankings (list[list[str]]): Document ids of each result list, best first.
+        k (int): Damping constant; larger values flatten the gap between ranks.
+
+    Returns:
+        dict[str, float]: The fused score of every ranked document, `sum(1 / (k + rank))`
+            over the lists it appears in, with ranks starting at 1.
+    """
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return scores
+
+
+def maximal_marginal_relevance(
+    relevance: np.ndarray,
+    vectors: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.7,
+    duplicate_threshold: float = 1.0,
+) -> list[int]:
+    """Select a relevant and diverse subset of candidates.
+
+    Args:
+        relevance (np.ndarray): Relevance of each candidate, between 0 and 1.
+        vectors (np.ndarray): L2-normalized embedding of each candidate, one row per
+            candidate. All-zero rows are never considered similar to anything.
+        k (int): Maximum number of candidates to select.
+        lambda_mult (float): Weight of relevance against diversity, between 0 and 1.
+        duplicate_threshold (float): Candidates whose cosine similarity to a selected
+            candidate reaches this value are dropped.
+
+    Returns:
+        list[int]: Indices of the selected candidates, in order of selection.
+    """
+    similarity = vectors @ vectors.T
+    # highest similarity of each candidate to the selected ones
+    redundancy = np.zeros(len(relevance))
+    available = np.ones(len(relevance), dtype=bool)
+    selected: list[int] = []
+    while len(selected) < k and available.any():
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+        available &= redundancy < duplicate_threshold
+    return selected
+
+
+def select_distinct(vectors: list[list[float]], threshold: float) -> list[int]:
+    """Drop vectors nearly identical to an earlier one, such as paraphrased queries.
+
+    Each vector is kept unless its cosine similarity to an earlier kept
+    vector reaches `threshold`, so every group of near-duplicates is
+    represented by its first member.
+
+    Args:
+        vectors (list[list[float]]): The vectors, in order of preference.
+        threshold (float): Cosine similarity at which vectors count as near-duplicates.
+
+    Returns:
+        list[int]: Indices of the kept vectors, in their original order.
+    """
+    if not vectors:
+        return []
+    matrix = np.asarray(vectors, dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    # with decreasing relevance and no weight on diversity, MMR keeps the
+    # original order and only drops the near-duplicates
+    return maximal_marginal_relevance(
+        np.linspace(1.0, 0.0, len(vectors)),
+        matrix,
+        len(vectors),
+        lambda_mult=1.0,
+        duplicate_threshold=threshold,
+    )
+
+
+def rerank_documents(
+    documents: list[Document],
+    rankings: list[list[str]],
+    vectors: list[Optional[np.ndarray]],
+    k: int,
+    rrf_k: int = 60,
+    lambda_mult: float = 0.7,
+    duplicate_threshold: float = 0.97,
+) -> list[Document]:
+    """Pick the best `k` documents for the response context.
+
+    Documents with the same normalized text are collapsed first. Documents
+    that appear in no ranking get no relevance from the fusion, and ties keep
+    the original order.
+
+    Args:
+        documents (list[Document]): The candidate documents, identified by their `uuid` metadata.
+        rankings (list[list[str]]): Document uuids of each query's results, best first.
+        vectors (list[Optional[np.ndarray]]): The embedding of each document, or None if unknown.
+        k (int): Maximum number of documents to return.
+        rrf_k (int): Damping constant of the reciprocal rank fusion.
+        lambda_mult (float): Weight of relevance against diversity in MMR.
+        duplicate_threshold (float): Cosine similarity at which documents count as duplicates.
+
+    Returns:
+        list[Document]: Up to `k` documents, best first.
+    """
+    scores = reciprocal_rank_fusion(rankings, rrf_k)
+    seen_texts = set()
+    candidates = []
+    for i, doc in enumerate(documents):
+        text = normalize_text(doc.page_content)
+        if text not in seen_texts:
+            seen_texts.add(text)
+            candidates.append(i)
+    if not candidates:
+        return []
+
+    relevance = np.array(
+        [scores.get(documents[i].metadata.get("uuid"), 0.0) for i in candidates]
+    )
+    if relevance.max() > 0:
+        relevance /= relevance.max()
+
+    dim = max((len(v) for v in vectors if v is not None), default=0)
+    matrix = np.zeros((len(candidates), dim), dtype=np.float32)
+    for row, i in enumerate(candidates):
+        vector = vectors[i]
+        if vector is not None and len(vector) == dim:
+            matrix[row] = vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    selected = maximal_marginal_relevance(
+        relevance, matrix, k, lambda_mult, duplicate_threshold
+    )
+    return [documents[candidates[row]] for row in selected]
@@ -1,15 +1,55 @@
-import os
-from contextlib import contextmanager
-from typing import Iterator
+import asyncio
+import base64
+import hashlib
+import json
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, NamedTuple, Optional, Sequence
 
+import numpy as np
 import weaviate
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
 from langchain_core.retrievers import BaseRetriever
 from langchain_core.runnables import RunnableConfig
-from langchain_weaviate import WeaviateVectorStore
+from weaviate.classes.query import MetadataQuery
 
+from backend.cache import CacheStats, LRUCache, SQLiteStore, normalize_text
 from backend.configuration import BaseConfiguration
 from backend.constants import WEAVIATE_DOCS_INDEX_NAME
+from backend.embeddings import (
+    CachedEmbeddings,
+    aembed_queries,
+    get_disk_embedding_store,
+)
+from backend.index_generation import aget_index_generation, get_index_generation
+from backend.local_index import LocalIndex, get_local_index
+from backend.weaviate_pool import WeaviateClientPool, get_client_pool
+
+RETRIEVAL_CACHE_SIZE = 5_000
+DOCUMENT_VECTOR_CACHE_SIZE = 20_000
+RESULT_STORE_PURGE_INTERVAL = 300
+
+
+class CachedResult(NamedTuple):
+    """A search result in the retrieval result cache."""
+
+    documents: list[Document]
+    vectors: list[Optional[np.ndarray]]
+    """The embedding of each document, or None if the retriever did not return it."""
+    latency: float
+    """Seconds the search took."""
+
+
+_result_cache: LRUCache[CachedResult] = LRUCache(RETRIEVAL_CACHE_SIZE)
+_result_stores: dict[str, tuple[str, SQLiteStore]] = {}
+_result_store_purged_at: dict[str, float] = {}
+_result_stats = CacheStats()
+_document_vectors: LRUCache[np.ndarray] = LRUCache(DOCUMENT_VECTOR_CACHE_SIZE)
 
 
 def make_text_encoder(model: str) -> Embeddings:
@@ -24,39 +64,665 @@ def make_text_encoder(model: str) -> Embeddings:
             raise ValueError(f"Unsupported embedding provider: {provider}")
 
 
-@contextmanager
-def make_weaviate_retriever(
-    configuration: BaseConfiguration, embedding_model: Embeddings
-) -> Iterator[BaseRetriever]:
-    with weaviate.connect_to_weaviate_cloud(
-        cluster_url=os.environ["WEAVIATE_URL"],
-        auth_credentials=weaviate.classes.init.Auth.api_key(
-            os.environ.get("WEAVIATE_API_KEY", "not_provided")
-        ),
-        skip_init_checks=True,
-    ) as weaviate_client:
-        store = WeaviateVectorStore(
+def make_query_encoder(configuration: BaseConfiguration) -> Embeddings:
+    """Create the text encoder for search queries, cached as configured."""
+    embedding_model = make_text_encoder(configuration.embedding_model)
+    match configuration.embedding_cache:
+        case "none":
+            return embedding_model
+        case "memory":
+            return CachedEmbeddings(embedding_model, configuration.embedding_model)
+        case "disk":
+            return CachedEmbeddings(
+                embedding_model,
+                configuration.embedding_model,
+                store=get_disk_embedding_store(configuration.embedding_cache_path),
+            )
+        case _:
+            raise ValueError(
+                f"Unsupported embedding cache: {configuration.embedding_cache}"
+            )
+
+
+def remember_document_vectors(uuids: list[str], vectors: Any) -> None:
+    """Keep the embeddings of retrieved documents for re-ranking."""
+    for uuid, vector in zip(uuids, vectors):
+        _document_vectors.set(uuid, np.asarray(vector, dtype=np.float32))
+
+
+def get_document_vectors(uuids: list[Optional[str]]) -> list[Optional[np.ndarray]]:
+    """Return the embeddings of documents retrieved by this process.
+
+    Vectors are kept in a bounded in-memory LRU, so the result is None for
+    documents that were not retrieved recently. Results served from the
+    retrieval result cache bring the vectors cached with them.
+    """
+    return [_document_vectors.get(uuid) if uuid else None for uuid in uuids]
+
+
+class AdaptiveK(NamedTuple):
+    """Bounds and cutoffs for choosing the number of results of each search."""
+
+    min_k: int
+    max_k: int
+    score_threshold: float
+    """Results scoring below this are cut."""
+    score_gap: float
+    """Results after a drop of at least this much between consecutive scores are cut."""
+
+
+def adaptive_cutoff(scores: Sequence[float], adaptive_k: AdaptiveK) -> int:
+    """Decide how many of a search's results to keep.
+
+    Results are cut at the first one that scores below the threshold, or
+    that scores at least `score_gap` less than the result before it, so a
+    near-exact match followed by weak results is returned alone, while
+    uniformly scored results are kept up to `max_k`. At least `min_k`
+    results are kept, if there are that many.
+
+    Args:
+        scores (Sequence[float]): The scores of the results, best first; higher is better.
+        adaptive_k (AdaptiveK): The bounds and cutoffs.
+
+    Returns:
+        int: The number of results to keep.
+    """
+    scores = np.asarray(scores[: adaptive_k.max_k], dtype=np.float64)
+    keep = len(scores)
+    if keep == 0:
+        return 0
+    cut = scores < adaptive_k.score_threshold
+    if adaptive_k.score_gap > 0:
+        cut[1:] |= scores[:-1] - scores[1:] >= adaptive_k.score_gap
+    if cut.any():
+        keep = int(np.argmax(cut))
+    return min(max(keep, adaptive_k.min_k), len(scores))
+
+
+class SearchRetriever(BaseRetriever):
+    """Base class for the async retrievers used by the researcher graph.
+
+    Subclasses implement `asearch`, which runs a search for a query whose
+    embedding is already known. A precomputed embedding can be passed as
+    `retriever.ainvoke(query, config, vector=...)` to skip the embedding call,
+    and `abatch_search` searches for several queries at once.
+    """
+
+    embedding: Embeddings
+    """Embeddings used to encode the query."""
+    search_kwargs: dict[str, Any] = {}
+    """Keyword arguments for the search, such as `k`."""
+    adaptive_k: Optional[AdaptiveK] = None
+    """If set, searches fetch `max_k` results and cut them with `adaptive_cutoff`,
+    instead of returning `k` results."""
+
+    def _limit(self) -> int:
+        if self.adaptive_k is not None:
+            return self.adaptive_k.max_k
+        return self.search_kwargs.get("k", 4)
+
+    def _cut(
+        self, docs: list[Document], scores: Sequence[Optional[float]]
+    ) -> list[Document]:
+        if self.adaptive_k is None:
+            return docs
+        if any(score is None for score in scores):
+            return docs[: self.search_kwargs.get("k", 4)]
+        return docs[: adaptive_cutoff(scores, self.adaptive_k)]
+
+    async def asearch(self, query: str, vector: list[float]) -> list[Document]:
+        """Search for documents matching a query and its embedding.
+
+        Args:
+            query (str): The search query.
+            vector (list[float]): The embedding of the query.
+
+        Returns:
+            list[Document]: The retrieved documents, best match first.
+        """
+        raise NotImplementedError
+
+    async def abatch_search(
+        self, queries: list[str], vectors: Optional[list[list[float]]] = None
+    ) -> list[list[Document]]:
+        """Search for several queries at once.
+
+        The default implementation embeds any missing vectors in one batch and
+        runs the searches concurrently over the same connection.
+
+        Args:
+            queries (list[str]): The search queries.
+            vectors (Optional[list[list[float]]]): The embeddings of the queries, in the same order.
+                If not provided, the queries are embedded in a single batch.
+
+        Returns:
+            list[list[Document]]: The retrieved documents for each query, in the order of `queries`.
+        """
+        if vectors is None:
+            vectors = await aembed_queries(self.embedding, queries)
+        return list(
+            await asyncio.gather(
+                *(
+                    self.asearch(query, vector)
+                    for query, vector in zip(queries, vectors)
+                )
+            )
+        )
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun,
+        vector: Optional[list[float]] = None,
+    ) -> list[Document]:
+        raise NotImplementedError(
+            f"{type(self).__name__} only supports async retrieval. Use `ainvoke` instead."
+        )
+
+    async def _aget_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: AsyncCallbackManagerForRetrieverRun,
+        vector: Optional[list[float]] = None,
+    ) -> list[Document]:
+        if vector is None:
+            vector = await self.embedding.aembed_query(query)
+        return await self.asearch(query, vector)
+
+
+class WeaviateRetriever(SearchRetriever):
+    """Hybrid search retriever built on the async Weaviate client.
+
+    Unlike `WeaviateVectorStore`, which wraps the synchronous client and runs
+    every search in a worker thread, this retriever awaits the query on the
+    event loop, so concurrent searches are not capped by the size of the
+    default thread pool. It only supports async invocation.
+
+    `abatch_search` pipelines all searches over the single gRPC channel of the
+    borrowed client, so a whole research step costs one connection and one
+    round of concurrent requests.
+    """
+
+    client: Any
+    """A connected `weaviate.WeaviateAsyncClient`."""
+    index_name: str
+    """The Weaviate collection to search."""
+    text_key: str = "text"
+    """The property holding the document text."""
+    search_kwargs: dict[str, Any] = {}
+    """Keyword arguments for the search; `k`, `return_uuids` and everything else
+    accepted by `collection.query.hybrid`. With `adaptive_k`, results are cut by
+    their hybrid scores."""
+    return_vectors: bool = False
+    """Whether to fetch the document embeddings and keep them for re-ranking."""
+
+    async def asearch(self, query: str, vector: list[float]) -> list[Document]:
+        search_kwargs = dict(self.search_kwargs)
+        search_kwargs.pop("k", None)
+        return_uuids = search_kwargs.pop("return_uuids", False)
+        if self.return_vectors:
+            search_kwargs["include_vector"] = True
+        if self.adaptive_k is not None:
+            search_kwargs.setdefault("return_metadata", MetadataQuery(score=True))
+        collection = self.client.collections.get(self.index_name)
+        try:
+            result = await collection.query.hybrid(
+                query=query, vector=vector, limit=self._limit(), **search_kwargs
+            )
+        except weaviate.exceptions.WeaviateQueryException as e:
+            raise ValueError(f"Error during query: {e}")
+
+        if self.return_vectors:
+            objects = [obj for obj in result.objects if obj.vector]
+            remember_document_vectors(
+                [str(obj.uuid) for obj in objects],
+                [
+                    obj.vector.get("default") or next(iter(obj.vector.values()))
+                    for obj in objects
+                ],
+            )
+
+        docs = []
+        for obj in result.objects:
+            properties = dict(obj.properties)
+            text = properties.pop(self.text_key)
+            metadata = {
+                key: value
+                for key, value in vars(obj.metadata).items()
+                if value is not None and key != "score"
+            }
+            docs.append(
+                Document(
+                    page_content=text,
+                    metadata={
+                        **properties,
+                        **metadata,
+                        **({"uuid": str(obj.uuid)} if return_uuids else {}),
+                    },
+                )
+            )
+        return self._cut(docs, [obj.metadata.score for obj in result.objects])
+
+
+def fuse_scores(
+    dense_ids: np.ndarray,
+    dense_scores: np.ndarray,
+    lexical_ids: np.ndarray,
+    lexical_scores: np.ndarray,
+    lexical_weight: float,
+    k: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Fuse dense and lexical search results by weighted, normalized scores.
+
+    Each result list's scores are min-max normalized to [0, 1], a document missing
+    from a list scores 0 there, and documents are ranked by
+    `(1 - lexical_weight) * dense + lexical_weight * lexical`. This is the same
+    relative score fusion Weaviate uses for its hybrid search.
+
+    Args:
+        dense_ids (np.ndarray): Ids of the dense search results.
+        dense_scores (np.ndarray): Their similarity scores, higher is better.
+        lexical_ids (np.ndarray): Ids of the lexical search results.
+        lexical_scores (np.ndarray): Their BM25 scores, higher is better.
+        lexical_weight (float): Weight of the lexical scores, between 0 and 1.
+        k (int): Number of ids to return.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The ids of the top-k fused results, best first, and
+            their fused scores.
+    """
+
+    def normalize(scores: np.ndarray) -> np.ndarray:
+        if len(scores) == 0:
+            return scores
+        spread = scores.max() - scores.min()
+        return (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
+
+    ids, inverse = np.unique(
+        np.concatenate([dense_ids, lexical_ids]), return_inverse=True
+    )
+    fused = np.zeros(len(ids))
+    np.add.at(
+        fused, inverse[: len(dense_ids)], (1 - lexical_weight) * normalize(dense_scores)
+    )
+    np.add.at(
+        fused, inverse[len(dense_ids) :], lexical_weight * normalize(lexical_scores)
+    )
+    top = np.argsort(-fused, kind="stable")[:k]
+    return ids[top], fused[top]
+
+
+class LocalIndexRetriever(SearchRetriever):
+    """Search over an in-process, memory-mapped `LocalIndex`.
+
+    `abatch_search` scores all queries of a research step against the index
+    in a single matrix product. If the index has a BM25 index and
+    `lexical_weight` is positive, dense and lexical candidates are combined
+    with `fuse_scores`, so that exact identifiers such as `RunnableParallel`
+    are found even when the embeddings miss them. With `adaptive_k`, results
+    are cut by their cosine similarity, or by their fused score.
+    """
+
+    index: LocalIndex
+    """The local index to search."""
+    nprobe: Optional[int] = None
+    """Number of IVF lists to scan per query, or None for an exact search."""
+    lexical_weight: float = 0.0
+    """Weight of BM25 scores in the fused ranking; 0 disables lexical search."""
+    fetch_k_multiplier: int = 4
+    """How many more candidates than `k` each search fetches for fusion."""
+
+    async def asearch(self, query: str, vector: list[float]) -> list[Document]:
+        (docs,) = await self.abatch_search([query], [vector])
+        return docs
+
+    async def abatch_search(
+        self, queries: list[str], vectors: Optional[list[list[float]]] = None
+    ) -> list[list[Document]]:
+        if vectors is None:
+            vectors = await aembed_queries(self.embedding, queries)
+        k = self._limit()
+        if self.lexical_weight <= 0 or self.index.bm25 is None:
+            indices, distances = self.index.search(np.asarray(vectors), k, self.nprobe)
+            return [
+                self._cut(self._get_documents(row), 1 - row_distances)
+                for row, row_distances in zip(indices, distances)
+            ]
+
+        fetch_k = k * self.fetch_k_multiplier
+        dense_ids, dense_distances = self.index.search(
+            np.asarray(vectors), fetch_k, self.nprobe
+        )
+        results = []
+        for query, ids, distances in zip(queries, dense_ids, dense_distances):
+            lexical_ids, lexical_scores = self.index.bm25.search(query, fetch_k)
+            fused, scores = fuse_scores(
+                ids, 1 - distances, lexical_ids, lexical_scores, self.lexical_weight, k
+            )
+            results.append(self._cut(self._get_documents(fused), scores))
+        return results
+
+    def _get_documents(self, indices: np.ndarray) -> list[Document]:
+        docs = self.index.get_documents(indices)
+        remember_document_vectors(
+            [doc.metadata["uuid"] for doc in docs], self.index.vectors[indices]
+        )
+        return docs
+
+
+def get_retrieval_cache_stats() -> CacheStats:
+    """Return the process-wide counters of the retrieval result cache.
+
+    `saved_seconds` adds up, for every hit, how long the search took when its
+    result was cached.
+    """
+    return _result_stats
+
+
+def get_disk_result_store(path: str, generation: str) -> SQLiteStore:
+    """Return the on-disk result store at `path`, opening it on first use.
+
+    Results of older index generations are deleted the first time a new
+    generation is seen, and expired results every
+    `RESULT_STORE_PURGE_INTERVAL` seconds.
+    """
+    store_generation, store = _result_stores.get(path, (None, None))
+    if store is None:
+        store = SQLiteStore(path, table="retrieval_results")
+    if store_generation != generation:
+        store.retain_prefix(f"{generation}:")
+        _result_stores[path] = (generation, store)
+    now = time.monotonic()
+    purged_at = _result_store_purged_at.get(path)
+    if purged_at is None or now - purged_at >= RESULT_STORE_PURGE_INTERVAL:
+        store.purge_expired()
+        _result_store_purged_at[path] = now
+    return store
+
+
+def _encode_vector(vector: Optional[np.ndarray]) -> Optional[str]:
+    if vector is None:
+        return None
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode()
+
+
+def _decode_vector(encoded: Optional[str]) -> Optional[np.ndarray]:
+    if encoded is None:
+        return None
+    return np.frombuffer(base64.b64decode(encoded), dtype=np.float32)
+
+
+class CachedRetriever(SearchRetriever):
+    """Serve repeated searches from a result cache.
+
+    Results are cached by normalized query under `key_prefix`, which
+    identifies the index generation and every setting that changes the
+    results. Lookups go to a bounded in-memory LRU shared by the whole process
+    first, then to the optional on-disk store, which can be shared by several
+    worker processes. Only the queries missing from both are searched, and a
+    hit on `ainvoke` also skips embedding the query.
+
+    The embeddings of the documents are cached with the results, and a hit
+    keeps them for re-ranking like a search would.
+    """
+
+    retriever: SearchRetriever
+    """The retriever whose results are cached."""
+    key_prefix: str
+    """Prefix of the cache keys, starting with the index generation."""
+    ttl: float
+    """Seconds a cached result is served for."""
+    store: Optional[SQLiteStore] = None
+    """On-disk store shared across workers, if any."""
+
+    def _key(self, query: str) -> str:
+        digest = hashlib.sha256(normalize_text(query).encode()).hexdigest()
+        return f"{self.key_prefix}:{digest}"
+
+    def _lookup(self, keys: list[str]) -> list[Optional[list[Document]]]:
+        entries = [_result_cache.get(key) for key in keys]
+        missing = [key for key, entry in zip(keys, entries) if entry is None]
+        if self.store is not None and missing:
+            stored = dict(zip(missing, self.store.mget(missing)))
+            now = time.time()
+            for i, key in enumerate(keys):
+                if entries[i] is not None or stored.get(key) is None:
+                    continue
+                value = json.loads(stored[key])
+                if value["expires_at"] > now:
+                    docs = [Document(**doc) for doc in value["documents"]]
+                    # results cached by earlier versions have no vectors
+                    vectors = value.get("vectors") or [None] * len(docs)
+                    entries[i] = CachedResult(
+                        docs, [_decode_vector(v) for v in vectors], value["latency"]
+                    )
+                    _result_cache.set(key, entries[i], ttl=value["expires_at"] - now)
+
+        hits = [entry for entry in entries if entry is not None]
+        for entry in hits:
+            known = [
+                (doc.metadata.get("uuid"), vector)
+                for doc, vector in zip(entry.documents, entry.vectors)
+                if doc.metadata.get("uuid") and vector is not None
+            ]
+            remember_document_vectors(
+                [uuid for uuid, _ in known], [vector for _, vector in known]
+            )
+        _result_stats.hits += len(hits)
+        _result_stats.misses += len(keys) - len(hits)
+        _result_stats.saved_seconds += sum(entry.latency for entry in hits)
+        return [
+            list(entry.documents) if entry is not None else None for entry in entries
+        ]
+
+    def _save(
+        self, keys: list[str], results: list[list[Document]], latency: float
+    ) -> None:
+        # the retriever has just remembered the vectors of the documents it found
+        entries = [
+            CachedResult(
+                docs,
+                get_document_vectors([doc.metadata.get("uuid") for doc in docs]),
+                latency,
+            )
+            for docs in results
+        ]
+        for key, entry in zip(keys, entries):
+            _result_cache.set(key, entry, ttl=self.ttl)
+        if self.store is not None:
+            expires_at = time.time() + self.ttl
+            self.store.mset(
+                [
+                    (
+                        key,
+                        json.dumps(
+                            {
+                                "expires_at": expires_at,
+                                "latency": latency,
+                                "documents": [
+                                    {
+                                        "page_content": doc.page_content,
+                                        "metadata": doc.metadata,
+                                    }
+                                    for doc in entry.documents
+                                ],
+                                "vectors": [
+                                    _encode_vector(vector) for vector in entry.vectors
+                                ],
+                            },
+                            default=str,
+                        ).encode(),
+                    )
+                    for key, entry in zip(keys, entries)
+                ],
+                expires_at=expires_at,
+            )
+
+    async def asearch(self, query: str, vector: list[float]) -> list[Document]:
+        key = self._key(query)
+        (docs,) = self._lookup([key])
+        if docs is None:
+            start = time.perf_counter()
+            docs = await self.retriever.asearch(query, vector)
+            self._save([key], [docs], time.perf_counter() - start)
+        return docs
+
+    async def abatch_search(
+        self, queries: list[str], vectors: Optional[list[list[float]]] = None
+    ) -> list[list[Document]]:
+        keys = [self._key(query) for query in queries]
+        results = self._lookup(keys)
+        missing = [i for i, docs in enumerate(results) if docs is None]
+        if missing:
+            start = time.perf_counter()
+            found = await self.retriever.abatch_search(
+                [queries[i] for i in missing],
+                [vectors[i] for i in missing] if vectors is not None else None,
+            )
+            # the batch runs concurrently, so each query is charged its share
+            latency = (time.perf_counter() - start) / len(missing)
+            self._save([keys[i] for i in missing], found, latency)
+            for i, docs in zip(missing, found):
+                results[i] = docs
+        return results
+
+    async def _aget_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: AsyncCallbackManagerForRetrieverRun,
+        vector: Optional[list[float]] = None,
+    ) -> list[Document]:
+        key = self._key(query)
+        (docs,) = self._lookup([key])
+        if docs is None:
+            start = time.perf_counter()
+            if vector is None:
+                vector = await self.embedding.aembed_query(query)
+            docs = await self.retriever.asearch(query, vector)
+            self._save([key], [docs], time.perf_counter() - start)
+        return docs
+
+
+def cache_results(
+    configuration: BaseConfiguration, retriever: SearchRetriever
+) -> SearchRetriever:
+    """Wrap a retriever in the result cache selected by the configuration."""
+    generation = get_index_generation()
+    search_settings = json.dumps(
+        {
+            "retriever_provider": configuration.retriever_provider,
+            "embedding_model": configuration.embedding_model,
+            "search_kwargs": configuration.search_kwargs,
+            "lexical_weight": configuration.lexical_weight,
+            "local_index_path": configuration.local_index_path,
+            "local_index_nprobe": configuration.local_index_nprobe,
+            "adaptive_k": make_adaptive_k(configuration),
+        },
+        sort_keys=True,
+        default=str,
+    )
+    key_prefix = (
+        f"{generation}:{hashlib.sha256(search_settings.encode()).hexdigest()[:16]}"
+    )
+    match configuration.retrieval_cache:
+        case "none":
+            return retriever
+        case "memory":
+            store = None
+        case "disk":
+            store = get_disk_result_store(
+                configuration.retrieval_cache_path, generation
+            )
+        case _:
+            raise ValueError(
+                f"Unsupported retrieval cache: {configuration.retrieval_cache}"
+            )
+    return CachedRetriever(
+        retriever=retriever,
+        key_prefix=key_prefix,
+        ttl=configuration.retrieval_cache_ttl,
+        store=store,
+        embedding=retriever.embedding,
+        search_kwargs=retriever.search_kwargs,
+    )
+
+
+def make_adaptive_k(configuration: BaseConfiguration) -> Optional[AdaptiveK]:
+    """Return the adaptive k settings of the configuration, or None if k is fixed."""
+    if not configuration.adaptive_k:
+        return None
+    return AdaptiveK(
+        min_k=configuration.adaptive_k_min,
+        max_k=configuration.adaptive_k_max,
+        score_threshold=configuration.adaptive_k_score_threshold,
+        score_gap=configuration.adaptive_k_score_gap,
+    )
+
+
+@asynccontextmanager
+async def make_weaviate_retriever(
+    configuration: BaseConfiguration,
+    embedding_model: Embeddings,
+    pool: Optional[WeaviateClientPool] = None,
+) -> AsyncIterator[SearchRetriever]:
+    pool = pool or get_client_pool()
+    async with pool.connection() as weaviate_client:
+        search_kwargs = {
+            "alpha": 1 - configuration.lexical_weight,
+            **configuration.search_kwargs,
+            "return_uuids": True,
+        }
+        yield WeaviateRetriever(
             client=weaviate_client,
             index_name=WEAVIATE_DOCS_INDEX_NAME,
-            text_key="text",
             embedding=embedding_model,
-            attributes=["source", "title"],
+            search_kwargs=search_kwargs,
+            adaptive_k=make_adaptive_k(configuration),
+            return_vectors=True,
         )
-        search_kwargs = {**configuration.search_kwargs, "return_uuids": True}
-        yield store.as_retriever(search_kwargs=search_kwargs)
 
 
-@contextmanager
-def make_retriever(
+@asynccontextmanager
+async def make_local_retriever(
+    configuration: BaseConfiguration, embedding_model: Embeddings
+) -> AsyncIterator[SearchRetriever]:
+    yield LocalIndexRetriever(
+        index=get_local_index(configuration.local_index_path),
+        nprobe=configuration.local_index_nprobe or None,
+        lexical_weight=configuration.lexical_weight,
+        embedding=embedding_model,
+        search_kwargs=configuration.search_kwargs,
+        adaptive_k=make_adaptive_k(configuration),
+    )
+
+
+@asynccontextmanager
+async def make_retriever(
     config: RunnableConfig,
-) -> Iterator[BaseRetriever]:
-    """Create a retriever for the agent, based on the current configuration."""
+) -> AsyncIterator[SearchRetriever]:
+    """Create a retriever for the agent, based on the current configuration.
+
+    Search results are cached as set by `retrieval_cache`, under the current
+    index generation, which is read again first if it is stale.
+    """
     configuration = BaseConfiguration.from_runnable_config(config)
-    embedding_model = make_text_encoder(configuration.embedding_model)
+    embedding_model = make_query_encoder(configuration)
+    await aget_index_generation()
     match configuration.retriever_provider:
         case "weaviate":
-            with make_weaviate_retriever(configuration, embedding_model) as retriever:
-                yield retriever
+            async with make_weaviate_retriever(
+                configuration, embedding_model
+            ) as retriever:
+                yield cache_results(configuration, retriever)
+
+        case "local":
+            async with make_local_retriever(
+                configuration, embedding_model
+            ) as retriever:
+                yield cache_results(configuration, retriever)
 
         case _:
             raise ValueError(
@@ -3,12 +3,13 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field
+from typing import Literal
 
 from backend.configuration import BaseConfiguration
 from backend.retrieval_graph import prompts
 
 
-@dataclass(kw_only=True)
+@dataclass(kw_only=True, frozen=True)
 class AgentConfiguration(BaseConfiguration):
     """The configuration for the agent."""
 
@@ -28,6 +29,283 @@ class AgentConfiguration(BaseConfiguration):
         },
     )
 
+    # routing
+
+    query_router: Literal["none", "local", "llm"] = field(
+        default="none",
+        metadata={
+            "description": "How to decide whether a message needs research, a request for more information or a general reply. 'local' classifies first-turn questions by their nearest labelled example questions and only asks query_model when unsure or for follow-ups; 'llm' always asks query_model; 'none' researches every message."
+        },
+    )
+
+    router_confidence_threshold: float = field(
+        default=0.8,
+        metadata={
+            "description": "Minimum share of the similarity-weighted votes of the nearest examples for the local router to decide without query_model."
+        },
+    )
+
+    router_k: int = field(
+        default=5,
+        metadata={
+            "description": "Number of nearest example questions that vote in the local router."
+        },
+    )
+
+    router_examples_path: str = field(
+        default=".cache/router_examples.jsonl",
+        metadata={
+            "description": "JSON lines file the decisions of the LLM router are logged to. The local router learns from them, in addition to its built-in examples."
+        },
+    )
+
+    log_router_decisions: bool = field(
+        default=False,
+        metadata={
+            "description": "Whether to log the LLM router's decisions on first-turn questions to router_examples_path. The log holds users' questions verbatim."
+        },
+    )
+
+    router_examples_max: int = field(
+        default=10_000,
+        metadata={
+            "description": "Maximum number of distinct questions logged to router_examples_path; later decisions are not logged."
+        },
+    )
+
+    # research
+
+    fused_planner: bool = field(
+        default=False,
+        metadata={
+            "description": "Whether the planner generates the search queries of each research step along with the plan, in one call. The researchers then skip their own query generation call."
+        },
+    )
+
+    speculative_retrieval: bool = field(
+        default=False,
+        metadata={
+            "description": "Whether to search for the user's latest message while the research plan is generated. Its documents join the research results, and if the plan has no steps the response starts from them right away."
+        },
+    )
+
+    research_mode: Literal["sequential", "parallel", "streaming"] = field(
+        default="parallel",
+        metadata={
+            "description": "How to research the steps of the plan. 'parallel' researches up to max_parallel_research_steps steps at once; 'streaming' streams the plan and starts researching each step as soon as it is generated; 'sequential' researches one step after the other, for plans whose steps build on each other."
+        },
+    )
+
+    max_parallel_research_steps: int = field(
+        default=4,
+        metadata={
+            "description": "Maximum number of plan steps researched at the same time in 'parallel' and 'streaming' research modes. In 'parallel' mode, longer plans are researched in waves of this size."
+        },
+    )
+
+    batch_query_embeddings: bool = field(
+        default=True,
+        metadata={
+            "description": "Whether to embed all queries generated for a research step in one batched call before fanning out retrieval, instead of embedding each query in its own retrieval node."
+        },
+    )
+
+    query_duplicate_threshold: float = field(
+        default=1.01,
+        metadata={
+            "description": "Cosine similarity between the embeddings of a research step's queries at which they count as paraphrases, and only the first one is searched. Requires batch_query_embeddings. Values above 1, like the default, search every query; measure the searches saved and the recall kept with the deployed embedding model before lowering it."
+        },
+    )
+
+    batch_vector_search: bool = field(
+        default=False,
+        metadata={
+            "description": "Whether to search for all queries of a research step in a single node over one pipelined connection, instead of fanning out one retrieval node per query. Per-query retriever runs no longer show up separately in traces."
+        },
+    )
+
+    research_coverage_check: Literal["none", "embedding", "judge"] = field(
+        default="none",
+        metadata={
+            "description": "How to decide, after each research step in 'sequential' mode or each wave in 'parallel' mode, that the documents already cover the question and the rest of the plan can be skipped. 'embedding' requires research_coverage_min_documents documents with an embedding at least research_coverage_threshold similar to the question's; 'judge' also asks query_model to confirm; 'none' always researches the whole plan."
+        },
+    )
+
+    research_coverage_threshold: float = field(
+        default=0.6,
+        metadata={
+            "description": "Cosine similarity between a document's embedding and the question's at which the document counts towards covering the question."
+        },
+    )
+
+    research_coverage_min_documents: int = field(
+        default=4,
+        metadata={
+            "description": "Number of documents relevant to the question by research_coverage_threshold at which the question counts as covered."
+        },
+    )
+
+    # response
+
+    response_top_k: int = field(
+        default=20,
+        metadata={
+            "description": "Maximum number of retrieved documents in the response model's context."
+        },
+    )
+
+    rerank_documents: bool = field(
+        default=False,
+        metadata={
+            "description": "Whether to rank the retrieved documents with reciprocal rank fusion over the per-query results, drop near-duplicates and diversify them with maximal marginal relevance before picking the response context. Otherwise the earliest-retrieved documents are used."
+        },
+    )
+
+    rrf_k: int = field(
+        default=60,
+        metadata={
+            "description": "Damping constant of reciprocal rank fusion; larger values flatten the gap between ranks."
+        },
+    )
+
+    mmr_lambda: float = field(
+        default=0.7,
+        metadata={
+            "description": "Weight of relevance against diversity in maximal marginal relevance, between 0 (most diverse) and 1 (most relevant)."
+        },
+    )
+
+    duplicate_threshold: float = field(
+        default=0.97,
+        metadata={
+            "description": "Cosine similarity between document embeddings at which documents count as near-duplicates and only the better-ranked one is kept."
+        },
+    )
+
+    compress_documents: bool = field(
+        default=False,
+        metadata={
+            "description": "Whether to cut each document in the response context down to the sentences and code blocks that best match the question and the research queries."
+        },
+    )
+
+    compression_keep_ratio: float = field(
+        default=0.5,
+        metadata={
+            "description": "Share of each document's characters kept by compress_documents, between 0 and 1."
+        },
+    )
+
+    context_token_budget: int = field(
+        default=0,
+        metadata={
+            "description": "Maximum number of tokens of retrieved documents in the response model's context, counted with the response model's tokenizer. Documents are kept best first while they fit. 0 turns the budget off."
+        },
+    )
+
+    context_overlap_threshold: float = field(
+        default=0.5,
+        metadata={
+            "description": "Share of a document's text that must already be in the context, through an overlapping chunk of the same source, for the document to be left out."
+        },
+    )
+
+    # answer cache
+
+    answer_cache: bool = field(
+        default=False,
+        metadata={
+            "description": "Whether to answer first-turn questions from a semantic cache of previous answers when a cached question is similar enough, skipping research and response generation."
+        },
+    )
+
+    answer_cache_threshold: float = field(
+        default=0.95,
+        metadata={
+            "description": "Minimum cosine similarity between the embeddings of a question and a cached question for the cached answer to be served."
+        },
+    )
+
+    answer_cache_size: int = field(
+        default=1000,
+        metadata={
+            "description": "Maximum number of cached answers per process; the least recently used answer is evicted first."
+        },
+    )
+
+    answer_cache_ttl: float = field(
+        default=86400.0,
+        metadata={
+            "description": "Seconds a cached answer is served for. Ingestion invalidates cached answers immediately by bumping the index generation."
+        },
+    )
+
+    # follow-ups
+
+    reuse_documents: bool = field(
+        default=False,
+        metadata={
+            "description": "Whether to reuse the previous turn's documents for follow-up questions they are relevant to, skipping or shortening research."
+        },
+    )
+
+    follow_up_relevance_threshold: float = field(
+        default=0.5,
+        metadata={
+            "description": "Cosine similarity between a follow-up question and a previous document's embedding at which the document counts as relevant to the question."
+        },
+    )
+
+    follow_up_min_documents: int = field(
+        default=3,
+        metadata={
+            "description": "Number of relevant previous documents at which a follow-up question is answered without research. With fewer, but at least one, the documents are kept and the research plan is cut to follow_up_max_steps."
+        },
+    )
+
+    follow_up_max_steps: int = field(
+        default=1,
+        metadata={
+            "description": "Maximum number of research steps for a follow-up question that the previous documents partly cover."
+        },
+    )
+
+    # history
+
+    history_tokens: dict[str, int] = field(
+        default_factory=lambda: {
+            "analyze_and_route_query": 1000,
+            "create_research_plan": 2000,
+            "ask_for_more_info": 2000,
+            "respond_to_general_query": 2000,
+            "respond": 4000,
+        },
+        metadata={
+            "description": "Maximum tokens of raw conversation history each node sends to its model, by node name. Only messages that the conversation summary covers are left out, so the budget is exceeded while the summary lags behind, and nothing is left out without `summarize_history`. Nodes that are not listed send the whole conversation."
+        },
+    )
+
+    summarize_history: bool = field(
+        default=False,
+        metadata={
+            "description": "Whether to fold older turns of the conversation into a rolling summary at the end of each turn, for the nodes whose history is truncated."
+        },
+    )
+
+    history_keep_messages: int = field(
+        default=4,
+        metadata={
+            "description": "Number of latest messages that are never folded into the conversation summary."
+        },
+    )
+
+    summary_trigger_tokens: int = field(
+        default=1000,
+        metadata={
+            "description": "Tokens of not yet summarized older messages at which the conversation summary is extended, so each summary call absorbs a batch of messages."
+        },
+    )
+
     # prompts
 
     router_system_prompt: str = field(
@@ -58,6 +336,13 @@ class AgentConfiguration(BaseConfiguration):
         },
     )
 
+    fused_plan_instructions: str = field(
+        default=prompts.FUSED_PLAN_INSTRUCTIONS,
+        metadata={
+            "description": "Instructions appended to the research plan prompt when fused_planner is enabled, asking for the search queries of each step."
+        },
+    )
+
     generate_queries_system_prompt: str = field(
         default=prompts.GENERATE_QUERIES_SYSTEM_PROMPT,
         metadata={
@@ -65,6 +350,20 @@ class AgentConfiguration(BaseConfiguration):
         },
     )
 
+    summary_system_prompt: str = field(
+        default=prompts.SUMMARY_SYSTEM_PROMPT,
+        metadata={
+            "description": "The system prompt used to extend the conversation summary with older messages."
+        },
+    )
+
+    coverage_system_prompt: str = field(
+        default=prompts.COVERAGE_SYSTEM_PROMPT,
+        metadata={
+            "description": "The system prompt used by the 'judge' research coverage check to decide whether the documents answer the question."
+        },
+    )
+
     response_system_prompt: str = field(
         default=prompts.RESPONSE_SYSTEM_PROMPT,
         metadata={"description": "The system prompt used for generating responses."},
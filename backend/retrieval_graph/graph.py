@@ -6,16 +6,408 @@ and key functions for processing & routing user queries, generating research pla
 conducting research, and formulating responses.
 """
 
-from typing import Any, Literal, TypedDict, cast
+import asyncio
+import dataclasses
+import hashlib
+import json
+import logging
+from typing import Any, Literal, Optional, TypedDict, Union, cast
 
-from langchain_core.messages import BaseMessage
-from langchain_core.runnables import RunnableConfig
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    get_buffer_string,
+)
+from langchain_core.runnables import Runnable, RunnableConfig
+from langgraph.constants import Send
 from langgraph.graph import END, START, StateGraph
 
+from backend.answer_cache import SemanticAnswerCache, get_answer_cache
+from backend.compression import compress_documents
+from backend.context_packing import aget_token_counter, pack_context
+from backend.document_store import (
+    ahydrate_documents,
+    astore_documents,
+    is_reference,
+)
+from backend.history import compact_messages, messages_to_summarize
+from backend.index_generation import aget_index_generation, get_index_generation
+from backend.query_router import get_local_router, log_router_decision
+from backend.rerank import rerank_documents
+from backend.retrieval import get_document_vectors, make_query_encoder, make_retriever
 from backend.retrieval_graph.configuration import AgentConfiguration
 from backend.retrieval_graph.researcher_graph.graph import graph as researcher_graph
-from backend.retrieval_graph.state import AgentState, InputState, Router
-from backend.utils import format_docs, load_chat_model
+from backend.retrieval_graph.state import (
+    AgentState,
+    InputState,
+    ResearchStepState,
+    Router,
+)
+from backend.utils import (
+    PROVENANCE_KEY,
+    document_ranking,
+    format_docs,
+    load_chat_model,
+    reduce_docs,
+    with_provenance,
+)
+
+logger = logging.getLogger(__name__)
+
+# clears the research results of the previous turn
+_CLEARED_RESEARCH = {
+    "documents": "delete",
+    "rankings": "delete",
+    "research_queries": "delete",
+    "reused_documents": [],
+    "context_documents": [],
+    "skipped_steps": 0,
+}
+
+
+def _first_turn_question(state: AgentState) -> Optional[str]:
+    """Return the user's question if the conversation has a single user turn.
+
+    Answers to follow-up questions depend on the conversation history, so
+    only first-turn questions are served from or stored in the answer cache,
+    and routed by the local router.
+    """
+    human_messages = [m for m in state.messages if isinstance(m, HumanMessage)]
+    if len(human_messages) != 1 or not isinstance(human_messages[0].content, str):
+        return None
+    return human_messages[0].content
+
+
+async def _prompt_messages(
+    state: AgentState,
+    configuration: AgentConfiguration,
+    node: str,
+    model_name: str,
+    system_prompt: str,
+) -> list[Any]:
+    """Build a node's prompt from its system prompt and compacted conversation history."""
+    return compact_messages(
+        system_prompt,
+        state.messages,
+        state.summary,
+        state.summarized_messages,
+        await aget_token_counter(model_name),
+        configuration.history_tokens.get(node),
+    )
+
+
+# settings of the answer cache itself, which do not change the answers
+_ANSWER_CACHE_FIELDS = frozenset(
+    {"answer_cache", "answer_cache_threshold", "answer_cache_size", "answer_cache_ttl"}
+)
+
+
+async def _stored_documents(
+    documents: list[Document], configuration: AgentConfiguration
+) -> list[Document]:
+    """Return the documents whose references can be hydrated from the document store."""
+    hydrated = await ahydrate_documents(configuration, documents)
+    return [doc for doc, full in zip(documents, hydrated) if not is_reference(full)]
+
+
+async def _hydrate_documents(
+    documents: list[Document], config: RunnableConfig
+) -> list[Document]:
+    """Replace references with the stored documents, retrieving missing ones again.
+
+    A referenced document may have been evicted from the document store, or
+    stored by another host. The queries that retrieved it, from its
+    provenance, are searched again; documents they no longer return, e.g.
+    after an ingestion run, are left out.
+    """
+    configuration = AgentConfiguration.from_runnable_config(config)
+    hydrated = await ahydrate_documents(configuration, documents)
+    missing = [doc for doc in hydrated if is_reference(doc)]
+    if not missing:
+        return hydrated
+    queries = list(
+        dict.fromkeys(
+            entry["query"]
+            for doc in missing
+            for entry in doc.metadata.get(PROVENANCE_KEY, [])
+        )
+    )
+    found: dict[str, Document] = {}
+    if queries:
+        async with make_retriever(config) as retriever:
+            results = await retriever.abatch_search(queries)
+        for docs in results:
+            await astore_documents(configuration, docs)
+            found.update(
+                (doc.metadata["uuid"], doc) for doc in docs if "uuid" in doc.metadata
+            )
+    lost = sum(doc.metadata.get("uuid") not in found for doc in missing)
+    if lost:
+        logger.warning(f"{lost} referenced documents could not be retrieved again")
+    return [
+        found[doc.metadata["uuid"]] if is_reference(doc) else doc
+        for doc in hydrated
+        if not is_reference(doc) or doc.metadata.get("uuid") in found
+    ]
+
+
+def _get_answer_cache(configuration: AgentConfiguration) -> SemanticAnswerCache:
+    # answers depend on the models, the prompts and the retrieval settings, so
+    # every other configuration field is part of the namespace
+    settings = json.dumps(
+        {
+            f.name: getattr(configuration, f.name)
+            for f in dataclasses.fields(configuration)
+            if f.name not in _ANSWER_CACHE_FIELDS
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return get_answer_cache(
+        f"{configuration.embedding_model}:{configuration.response_model}:"
+        f"{hashlib.sha256(settings.encode()).hexdigest()[:16]}",
+        maxsize=configuration.answer_cache_size,
+        ttl=configuration.answer_cache_ttl,
+    )
+
+
+async def _relevant_documents(
+    question: str,
+    documents: list[Document],
+    configuration: AgentConfiguration,
+    threshold: float,
+) -> list[Document]:
+    """Return the documents relevant to a question, best first.
+
+    A document is relevant if the cosine similarity between its embedding
+    and the question's reaches `threshold`. Documents whose embedding is not
+    in this process's vector cache are not considered.
+    """
+    vectors = get_document_vectors([doc.metadata.get("uuid") for doc in documents])
+    known = [(doc, v) for doc, v in zip(documents, vectors) if v is not None]
+    if not known:
+        return []
+    query = np.asarray(
+        await make_query_encoder(configuration).aembed_query(question), np.float32
+    )
+    matrix = np.stack([v for _, v in known]).astype(np.float32)
+    if matrix.shape[1] != len(query):
+        return []
+    similarities = (matrix @ query) / np.maximum(
+        np.linalg.norm(matrix, axis=1) * np.linalg.norm(query), 1e-12
+    )
+    order = np.argsort(-similarities, kind="stable")
+    return [known[i][0] for i in order if similarities[i] >= threshold]
+
+
+async def _reusable_documents(
+    state: AgentState, configuration: AgentConfiguration
+) -> list[Document]:
+    """Return the previous turn's documents relevant to the latest question, best first.
+
+    Relevance is judged by `_relevant_documents`, with `follow_up_relevance_threshold`.
+    """
+    question = state.messages[-1].content
+    if not configuration.reuse_documents or not state.documents:
+        return []
+    if not isinstance(question, str):
+        return []
+    # documents that are no longer stored would have to be retrieved again
+    return await _relevant_documents(
+        question,
+        await _stored_documents(state.documents, configuration),
+        configuration,
+        configuration.follow_up_relevance_threshold,
+    )
+
+
+async def _research_covers_question(
+    state: AgentState, documents: list[Document], configuration: AgentConfiguration
+) -> bool:
+    """Whether the documents researched so far cover the user's question.
+
+    With the 'embedding' check, the question is covered once at least
+    `research_coverage_min_documents` documents are relevant to it by
+    `_relevant_documents`, with `research_coverage_threshold`. The 'judge'
+    check also asks `query_model` whether the relevant documents answer it.
+    """
+    question = state.query or state.messages[-1].content
+    if not isinstance(question, str):
+        return False
+    match configuration.research_coverage_check:
+        case "none":
+            return False
+        case "embedding" | "judge":
+            relevant = await _relevant_documents(
+                question,
+                documents,
+                configuration,
+                configuration.research_coverage_threshold,
+            )
+            if len(relevant) < configuration.research_coverage_min_documents:
+                return False
+            if configuration.research_coverage_check == "embedding":
+                return True
+        case _:
+            raise ValueError(
+                f"Unsupported research coverage check: {configuration.research_coverage_check}"
+            )
+
+    class Coverage(TypedDict):
+        """Whether the documents answer the question."""
+
+        sufficient: bool
+
+    structured_output_kwargs = (
+        {"method": "function_calling"} if "openai" in configuration.query_model else {}
+    )
+    model = load_chat_model(configuration.query_model).with_structured_output(
+        Coverage, **structured_output_kwargs
+    )
+    stored = [
+        doc
+        for doc in await ahydrate_documents(configuration, relevant)
+        if not is_reference(doc)
+    ]
+    context = format_docs(stored[: configuration.response_top_k])
+    messages = [
+        {
+            "role": "system",
+            "content": configuration.coverage_system_prompt.format(context=context),
+        },
+        {"role": "human", "content": question},
+    ]
+    response = cast(
+        Coverage, await model.ainvoke(messages, {"tags": ["langsmith:nostream"]})
+    )
+    return bool(response["sufficient"])
+
+
+async def _remaining_steps(
+    state: AgentState,
+    documents: list[Document],
+    steps: list[str],
+    step_queries: list[list[str]],
+    configuration: AgentConfiguration,
+) -> dict[str, Any]:
+    """Return the steps left to research, or none if the documents already cover the question.
+
+    Skipped steps are counted in 'skipped_steps'.
+    """
+    if steps and await _research_covers_question(state, documents, configuration):
+        return {
+            "steps": [],
+            "step_queries": [],
+            "skipped_steps": state.skipped_steps + len(steps),
+        }
+    return {"steps": steps, "step_queries": step_queries}
+
+
+def _reused_research(state: AgentState) -> dict[str, Any]:
+    """Research results made of the reused documents, ranked by relevance."""
+    return {
+        "documents": state.reused_documents,
+        "rankings": [document_ranking(state.reused_documents)],
+    }
+
+
+async def check_answer_cache(
+    state: AgentState, *, config: RunnableConfig
+) -> dict[str, Any]:
+    """Answer the user's question from the semantic answer cache, if possible.
+
+    The question is embedded and compared with previously answered questions.
+    If one is at least `answer_cache_threshold` similar, its answer and
+    documents are returned and the graph ends without planning or research.
+
+    Args:
+        state (AgentState): The current state of the agent, including conversation history.
+        config (RunnableConfig): Configuration with the answer cache settings.
+
+    Follow-up questions are never answered from the cache. Instead, the
+    documents of the previous turn that are relevant to the follow-up are
+    kept in 'reused_documents', so research can be skipped or shortened.
+
+    Returns:
+        dict[str, Any]: 'answer_cache_hit', plus the cached 'messages', 'answer', and 'documents' and
+            'context_documents', which are the documents the cached answer cites, on a hit.
+            On a miss, the documents of the previous turn are cleared for the new research.
+    """
+    configuration = AgentConfiguration.from_runnable_config(config)
+    # caches and the document store of this run use the current generation
+    await aget_index_generation()
+    question = _first_turn_question(state)
+    if question is None:
+        return {
+            "answer_cache_hit": False,
+            **_CLEARED_RESEARCH,
+            "reused_documents": await _reusable_documents(state, configuration),
+        }
+    if not configuration.answer_cache:
+        return {"answer_cache_hit": False, **_CLEARED_RESEARCH}
+
+    vector = await make_query_encoder(configuration).aembed_query(question)
+    cached = _get_answer_cache(configuration).lookup(
+        vector, get_index_generation(), configuration.answer_cache_threshold
+    )
+    if cached is None:
+        return {"answer_cache_hit": False, **_CLEARED_RESEARCH}
+    return {
+        "messages": [AIMessage(content=cached.answer)],
+        "answer": cached.answer,
+        "documents": cached.documents,
+        "context_documents": cached.documents,
+        "query": question,
+        "answer_cache_hit": True,
+    }
+
+
+def route_answer_cache(
+    state: AgentState,
+) -> Literal["analyze_and_route_query", "__end__"]:
+    """End the run on an answer cache hit, otherwise route the query.
+
+    Args:
+        state (AgentState): The current state of the agent.
+
+    Returns:
+        Literal["analyze_and_route_query", "__end__"]: The next step to take.
+    """
+    return END if state.answer_cache_hit else "analyze_and_route_query"
+
+
+async def speculative_retrieval(
+    state: AgentState, *, config: RunnableConfig
+) -> dict[str, Any]:
+    """Search for the user's latest message while the research plan is generated.
+
+    This hides the latency of one search behind the planner call. Its documents
+    are merged with those of the research; if the plan turns out to have no
+    steps, the response is based on them alone.
+
+    Args:
+        state (AgentState): The current state of the agent, including conversation history.
+        config (RunnableConfig): Configuration with the retriever used to fetch documents.
+
+    Returns:
+        dict[str, Any]: A dictionary with 'documents' containing the retrieved documents
+            and 'rankings' containing their uuids, best first.
+    """
+    question = state.messages[-1].content
+    if not isinstance(question, str):
+        return {}
+    configuration = AgentConfiguration.from_runnable_config(config)
+    async with make_retriever(config) as retriever:
+        documents = await retriever.ainvoke(question, config)
+    return {
+        "documents": with_provenance(
+            await astore_documents(configuration, documents), question
+        ),
+        "rankings": [document_ranking(documents)],
+    }
 
 
 async def analyze_and_route_query(
@@ -23,50 +415,96 @@ async def analyze_and_route_query(
 ) -> dict[str, Router]:
     """Analyze the user's query and determine the appropriate routing.
 
-    This function uses a language model to classify the user's query and decide how to route it
-    within the conversation flow.
+    With the 'local' query router, a first-turn question is first classified by
+    its nearest labelled example questions, which takes milliseconds. Only if
+    the local router is not confident enough, and for every follow-up, whose
+    meaning depends on the conversation, does this function fall back to a
+    language model. With `log_router_decisions`, its decisions on first-turn
+    questions are logged as new examples for the local router.
 
     Args:
         state (AgentState): The current state of the agent, including conversation history.
-        config (RunnableConfig): Configuration with the model used for query analysis.
+        config (RunnableConfig): Configuration with the query router and the model used for query analysis.
 
     Returns:
         dict[str, Router]: A dictionary containing the 'router' key with the classification result (classification type and logic).
     """
-    # allow skipping the router for testing
-    if state.router and state.router["logic"]:
-        return {"router": state.router}
-
     configuration = AgentConfiguration.from_runnable_config(config)
+    if configuration.query_router == "none":
+        return {"router": Router(type="langchain", logic="")}
+
+    question = _first_turn_question(state)
+    if configuration.query_router == "local" and question is not None:
+        encoder = make_query_encoder(configuration)
+        local_router = await get_local_router(
+            configuration.router_examples_path,
+            configuration.embedding_model,
+            encoder,
+            k=configuration.router_k,
+        )
+        decision = local_router.classify(await encoder.aembed_query(question))
+        if decision.confidence >= configuration.router_confidence_threshold:
+            return {"router": Router(type=decision.type, logic=decision.logic)}
+
     structured_output_kwargs = (
         {"method": "function_calling"} if "openai" in configuration.query_model else {}
     )
     model = load_chat_model(configuration.query_model).with_structured_output(
         Router, **structured_output_kwargs
     )
-    messages = [
-        {"role": "system", "content": configuration.router_system_prompt}
-    ] + state.messages
+    messages = await _prompt_messages(
+        state,
+        configuration,
+        "analyze_and_route_query",
+        configuration.query_model,
+        configuration.router_system_prompt,
+    )
     response = cast(Router, await model.ainvoke(messages))
+    if configuration.log_router_decisions and question is not None:
+        log_router_decision(
+            configuration.router_examples_path,
+            question,
+            response,
+            configuration.router_examples_max,
+        )
     return {"router": response}
 
 
 def route_query(
-    state: AgentState,
-) -> Literal["create_research_plan", "ask_for_more_info", "respond_to_general_query"]:
+    state: AgentState, *, config: RunnableConfig
+) -> Union[
+    Literal[
+        "create_research_plan",
+        "reuse_documents",
+        "ask_for_more_info",
+        "respond_to_general_query",
+    ],
+    list[Literal["create_research_plan", "speculative_retrieval"]],
+]:
     """Determine the next step based on the query classification.
 
+    A follow-up question for which at least `follow_up_min_documents` of the
+    previous turn's documents are relevant is answered from those documents,
+    without research. With `speculative_retrieval` enabled, the search for
+    the user's message runs alongside the planner.
+
     Args:
         state (AgentState): The current state of the agent, including the router's classification.
+        config (RunnableConfig): Configuration deciding whether to retrieve speculatively.
 
     Returns:
-        Literal["create_research_plan", "ask_for_more_info", "respond_to_general_query"]: The next step to take.
+        The next step or steps to take.
 
     Raises:
         ValueError: If an unknown router type is encountered.
     """
     _type = state.router["type"]
     if _type == "langchain":
+        configuration = AgentConfiguration.from_runnable_config(config)
+        if len(state.reused_documents) >= configuration.follow_up_min_documents:
+            return "reuse_documents"
+        if configuration.speculative_retrieval:
+            return ["create_research_plan", "speculative_retrieval"]
         return "create_research_plan"
     elif _type == "more-info":
         return "ask_for_more_info"
@@ -76,6 +514,19 @@ def route_query(
         raise ValueError(f"Unknown router type {_type}")
 
 
+def reuse_documents(state: AgentState) -> dict[str, Any]:
+    """Answer a follow-up question from the previous turn's relevant documents.
+
+    Args:
+        state (AgentState): The current state of the agent, including the reused documents.
+
+    Returns:
+        dict[str, Any]: The reused 'documents', their 'rankings' by relevance to the question,
+            and the 'query'.
+    """
+    return {**_reused_research(state), "query": state.messages[-1].content}
+
+
 async def ask_for_more_info(
     state: AgentState, *, config: RunnableConfig
 ) -> dict[str, list[BaseMessage]]:
@@ -95,7 +546,13 @@ async def ask_for_more_info(
     system_prompt = configuration.more_info_system_prompt.format(
         logic=state.router["logic"]
     )
-    messages = [{"role": "system", "content": system_prompt}] + state.messages
+    messages = await _prompt_messages(
+        state,
+        configuration,
+        "ask_for_more_info",
+        configuration.query_model,
+        system_prompt,
+    )
     response = await model.ainvoke(messages)
     return {"messages": [response]}
 
@@ -119,22 +576,116 @@ async def respond_to_general_query(
     system_prompt = configuration.general_system_prompt.format(
         logic=state.router["logic"]
     )
-    messages = [{"role": "system", "content": system_prompt}] + state.messages
+    messages = await _prompt_messages(
+        state,
+        configuration,
+        "respond_to_general_query",
+        configuration.query_model,
+        system_prompt,
+    )
     response = await model.ainvoke(messages)
     return {"messages": [response]}
 
 
+def _split_plan(plan: dict[str, Any]) -> tuple[list[str], list[list[str]]]:
+    """Split planner output into steps and the search queries of each step.
+
+    The fused planner returns the queries of every step in 'queries', in the
+    same order as 'steps'. Steps without queries, like all steps of the
+    default planner, get an empty list.
+    """
+    steps = list(plan.get("steps") or [])
+    queries = list(plan.get("queries") or [])
+    return steps, [
+        list(queries[i] or []) if i < len(queries) else [] for i in range(len(steps))
+    ]
+
+
+def _step_queries(state: AgentState, index: int) -> list[str]:
+    return state.step_queries[index] if index < len(state.step_queries) else []
+
+
+async def _research_while_planning(
+    model: Runnable,
+    messages: list,
+    max_concurrency: int,
+    max_steps: Optional[int] = None,
+    with_queries: bool = False,
+) -> dict[str, Any]:
+    """Stream the research plan and research each step as soon as it is complete.
+
+    While the plan streams, its last step may still be growing, so a step is
+    dispatched once the next one starts, or when the stream ends. With
+    `with_queries`, the fused planner's queries follow the steps, and a step
+    also waits until the queries of the next step start. Models that do not
+    stream partial structured output yield the plan once, at the end.
+    With `max_steps`, the stream is closed as soon as that many steps are dispatched.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def research(step: str, queries: list[str]) -> dict[str, Any]:
+        async with semaphore:
+            return await researcher_graph.ainvoke(
+                {"question": step, "queries": queries}
+            )
+
+    tasks: list[asyncio.Task] = []
+    plan: dict[str, Any] = {}
+    try:
+        async for chunk in model.astream(messages, {"tags": ["langsmith:nostream"]}):
+            if isinstance(chunk, dict):
+                plan = chunk
+            steps, step_queries = _split_plan(plan)
+            complete = len(steps) - 1
+            if with_queries:
+                complete = min(complete, len(plan.get("queries") or []) - 1)
+            if max_steps is not None:
+                complete = min(complete, max_steps)
+            for i in range(len(tasks), complete):
+                tasks.append(asyncio.create_task(research(steps[i], step_queries[i])))
+            if max_steps is not None and len(tasks) >= max_steps:
+                break
+        steps, step_queries = _split_plan(plan)
+        for i in range(len(tasks), len(steps[:max_steps])):
+            tasks.append(asyncio.create_task(research(steps[i], step_queries[i])))
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    return {
+        "documents": [doc for result in results for doc in result["documents"]],
+        "rankings": [ranking for result in results for ranking in result["rankings"]],
+        "research_queries": [
+            query for result in results for query in result["queries"]
+        ],
+    }
+
+
 async def create_research_plan(
     state: AgentState, *, config: RunnableConfig
-) -> dict[str, list[str]]:
+) -> dict[str, Any]:
     """Create a step-by-step research plan for answering a LangChain-related query.
 
+    With `fused_planner` enabled, the plan also holds the search queries of each
+    step, so the researchers do not need to generate them.
+
+    In 'streaming' research mode, the plan is streamed and each step is researched
+    as soon as it is generated, so retrieval overlaps with planning. The research
+    results are returned with an empty plan, which then routes to `build_context`.
+
     Args:
         state (AgentState): The current state of the agent, including conversation history.
         config (RunnableConfig): Configuration with the model used to generate the plan.
 
+    If the previous turn's documents partly cover a follow-up question, they
+    are kept and the plan is cut to `follow_up_max_steps` steps.
+
     Returns:
-        dict[str, list[str]]: A dictionary with a 'steps' key containing the list of research steps.
+        dict[str, Any]: A dictionary with a 'steps' key containing the list of research steps
+            and a 'step_queries' key containing their search queries, plus 'documents' and
+            'rankings' in 'streaming' research mode or when documents are reused.
     """
 
     class Plan(TypedDict):
@@ -142,63 +693,252 @@ async def create_research_plan(
 
         steps: list[str]
 
+    class PlanWithQueries(TypedDict):
+        """Generate research plan with search queries for each step."""
+
+        steps: list[str]
+        queries: list[list[str]]
+
     configuration = AgentConfiguration.from_runnable_config(config)
     structured_output_kwargs = (
         {"method": "function_calling"} if "openai" in configuration.query_model else {}
     )
+    system_prompt = configuration.research_plan_system_prompt
+    if configuration.fused_planner:
+        system_prompt += "\n\n" + configuration.fused_plan_instructions
     model = load_chat_model(configuration.query_model).with_structured_output(
-        Plan, **structured_output_kwargs
+        PlanWithQueries if configuration.fused_planner else Plan,
+        **structured_output_kwargs,
     )
-    messages = [
-        {"role": "system", "content": configuration.research_plan_system_prompt}
-    ] + state.messages
+    messages = await _prompt_messages(
+        state,
+        configuration,
+        "create_research_plan",
+        configuration.query_model,
+        system_prompt,
+    )
+    # the previous turn's documents partly cover a follow-up question
+    reused: dict[str, Any] = {}
+    max_steps = None
+    if state.reused_documents:
+        reused = _reused_research(state)
+        max_steps = configuration.follow_up_max_steps
+    if configuration.research_mode == "streaming":
+        research = await _research_while_planning(
+            model,
+            messages,
+            configuration.max_parallel_research_steps,
+            max_steps,
+            with_queries=configuration.fused_planner,
+        )
+        return {
+            "documents": reused.get("documents", []) + research["documents"],
+            "rankings": reused.get("rankings", []) + research["rankings"],
+            "research_queries": research["research_queries"],
+            "steps": [],
+            "step_queries": [],
+            "query": state.messages[-1].content,
+        }
+
     response = cast(
         Plan, await model.ainvoke(messages, {"tags": ["langsmith:nostream"]})
     )
+    steps, step_queries = _split_plan(response)
     return {
-        "steps": response["steps"],
-        "documents": "delete",
+        **reused,
+        "steps": steps[:max_steps],
+        "step_queries": step_queries[:max_steps],
         "query": state.messages[-1].content,
     }
 
 
-async def conduct_research(state: AgentState) -> dict[str, Any]:
+async def conduct_research(
+    state: AgentState, *, config: RunnableConfig
+) -> dict[str, Any]:
     """Execute the first step of the research plan.
 
     This function takes the first step from the research plan and uses it to conduct research.
+    If the documents researched so far already cover the question, the rest of the plan is skipped.
 
     Args:
         state (AgentState): The current state of the agent, including the research plan steps.
+        config (RunnableConfig): Configuration with the research coverage check.
 
     Returns:
-        dict[str, list[str]]: A dictionary with 'documents' containing the research results and
-                              'steps' containing the remaining research steps.
+        dict[str, list[str]]: A dictionary with 'documents' and 'rankings' containing the research results and
+                              'steps' and 'step_queries' containing the remaining research steps.
 
     Behavior:
-        - Invokes the researcher_graph with the first step of the research plan.
+        - Invokes the researcher_graph with the first step of the research plan and its queries, if any.
         - Updates the state with the retrieved documents and removes the completed step.
     """
-    result = await researcher_graph.ainvoke({"question": state.steps[0]})
-    return {"documents": result["documents"], "steps": state.steps[1:]}
+    configuration = AgentConfiguration.from_runnable_config(config)
+    result = await researcher_graph.ainvoke(
+        {"question": state.steps[0], "queries": _step_queries(state, 0)}
+    )
+    remaining = await _remaining_steps(
+        state,
+        reduce_docs(state.documents, result["documents"]),
+        state.steps[1:],
+        state.step_queries[1:],
+        configuration,
+    )
+    return {
+        "documents": result["documents"],
+        "rankings": result["rankings"],
+        "research_queries": result["queries"],
+        **remaining,
+    }
+
+
+async def conduct_research_step(state: ResearchStepState) -> dict[str, Any]:
+    """Research a single step of the plan, alongside the other steps of its wave.
+
+    Args:
+        state (ResearchStepState): The step of the research plan to research.
+
+    Returns:
+        dict[str, Any]: A dictionary with 'documents' and 'rankings' containing the research results,
+            merged into the agent state with those of the other steps.
+    """
+    result = await researcher_graph.ainvoke(
+        {"question": state.step, "queries": state.queries}
+    )
+    return {
+        "documents": result["documents"],
+        "rankings": result["rankings"],
+        "research_queries": result["queries"],
+    }
+
+
+async def finish_research_wave(
+    state: AgentState, *, config: RunnableConfig
+) -> dict[str, Any]:
+    """Remove the steps researched by the last wave from the plan.
+
+    If the documents researched so far already cover the question, the rest of the plan is skipped.
+
+    Args:
+        state (AgentState): The current state of the agent, including the research plan steps.
+        config (RunnableConfig): Configuration with the size of a research wave and the coverage check.
+
+    Returns:
+        dict[str, Any]: A dictionary with 'steps' and 'step_queries' containing the steps not researched yet,
+            and 'skipped_steps' if the rest of the plan was skipped.
+    """
+    configuration = AgentConfiguration.from_runnable_config(config)
+    wave_size = configuration.max_parallel_research_steps
+    return await _remaining_steps(
+        state,
+        state.documents,
+        state.steps[wave_size:],
+        state.step_queries[wave_size:],
+        configuration,
+    )
+
 
+def route_research(
+    state: AgentState, *, config: RunnableConfig
+) -> Union[Literal["conduct_research", "build_context"], list[Send]]:
+    """Start researching the remaining steps of the plan.
+
+    In 'sequential' research mode, the steps are researched one at a time by
+    `conduct_research`. In 'parallel' mode, the next `max_parallel_research_steps`
+    steps are sent to `conduct_research_step` at once; `finish_research_wave`
+    then removes them from the plan and routes back here.
 
-def check_finished(state: AgentState) -> Literal["respond", "conduct_research"]:
+    Args:
+        state (AgentState): The current state of the agent, including the remaining research steps.
+        config (RunnableConfig): Configuration with the research mode.
+
+    Returns:
+        Union[Literal["conduct_research", "build_context"], list[Send]]: The next step to take, or one
+            Send per step researched in parallel.
+    """
+    configuration = AgentConfiguration.from_runnable_config(config)
+    if not state.steps:
+        return "build_context"
+    if configuration.research_mode == "sequential":
+        return "conduct_research"
+    return [
+        Send(
+            "conduct_research_step",
+            ResearchStepState(step=step, queries=_step_queries(state, i)),
+        )
+        for i, step in enumerate(
+            state.steps[: configuration.max_parallel_research_steps]
+        )
+    ]
+
+
+def check_finished(
+    state: AgentState,
+) -> Literal["build_context", "conduct_research"]:
     """Determine if the research process is complete or if more research is needed.
 
     This function checks if there are any remaining steps in the research plan:
         - If there are, route back to the `conduct_research` node
-        - Otherwise, route to the `respond` node
+        - Otherwise, route to the `build_context` node, which prepares the context of the response
 
     Args:
         state (AgentState): The current state of the agent, including the remaining research steps.
 
     Returns:
-        Literal["respond", "conduct_research"]: The next step to take based on whether research is complete.
+        Literal["build_context", "conduct_research"]: The next step to take based on whether research is complete.
     """
     if len(state.steps or []) > 0:
         return "conduct_research"
     else:
-        return "respond"
+        return "build_context"
+
+
+async def build_context(
+    state: AgentState, *, config: RunnableConfig
+) -> dict[str, list[Document]]:
+    """Select and prepare the documents the response is based on.
+
+    The state holds references to the documents, which are swapped for the stored documents first;
+    documents that are no longer stored are retrieved again.
+    If `rerank_documents` is enabled, the context holds the best-ranked documents rather than the earliest-retrieved ones.
+    With `compress_documents` enabled, each document is cut down to its passages that best match the question and the
+    research queries. The documents are then packed into `context_token_budget` tokens, best first.
+
+    Args:
+        state (AgentState): The current state of the agent, including retrieved documents and their rankings.
+        config (RunnableConfig): Configuration with the re-ranking, compression and context budget settings.
+
+    Returns:
+        dict[str, list[Document]]: A dictionary with a 'context_documents' key containing the documents
+            for the response model's context, in the order they are numbered in the prompt.
+    """
+    configuration = AgentConfiguration.from_runnable_config(config)
+    documents = await _hydrate_documents(state.documents, config)
+    if configuration.rerank_documents:
+        documents = rerank_documents(
+            documents,
+            state.rankings,
+            get_document_vectors([doc.metadata.get("uuid") for doc in documents]),
+            configuration.response_top_k,
+            rrf_k=configuration.rrf_k,
+            lambda_mult=configuration.mmr_lambda,
+            duplicate_threshold=configuration.duplicate_threshold,
+        )
+    else:
+        documents = documents[: configuration.response_top_k]
+    if configuration.compress_documents:
+        documents = compress_documents(
+            documents,
+            [state.query, *state.research_queries],
+            configuration.compression_keep_ratio,
+        )
+    if configuration.context_token_budget > 0:
+        documents = pack_context(
+            documents,
+            await aget_token_counter(configuration.response_model),
+            configuration.context_token_budget,
+            configuration.context_overlap_threshold,
+        ).documents
+    return {"context_documents": documents}
 
 
 async def respond(
@@ -206,10 +946,11 @@ async def respond(
 ) -> dict[str, list[BaseMessage]]:
     """Generate a final response to the user's query based on the conducted research.
 
-    This function formulates a comprehensive answer using the conversation history and the documents retrieved by the researcher.
+    This function formulates a comprehensive answer using the conversation history and the documents
+    selected by `build_context`. The answer cites them by their position in 'context_documents'.
 
     Args:
-        state (AgentState): The current state of the agent, including retrieved documents and conversation history.
+        state (AgentState): The current state of the agent, including the context documents and conversation history.
         config (RunnableConfig): Configuration with the model used to respond.
 
     Returns:
@@ -217,27 +958,138 @@ async def respond(
     """
     configuration = AgentConfiguration.from_runnable_config(config)
     model = load_chat_model(configuration.response_model)
-    # TODO: add a re-ranker here
-    top_k = 20
-    context = format_docs(state.documents[:top_k])
+    context = format_docs(state.context_documents)
     prompt = configuration.response_system_prompt.format(context=context)
-    messages = [{"role": "system", "content": prompt}] + state.messages
+    messages = await _prompt_messages(
+        state, configuration, "respond", configuration.response_model, prompt
+    )
     response = await model.ainvoke(messages)
     return {"messages": [response], "answer": response.content}
 
 
+async def cache_answer(state: AgentState, *, config: RunnableConfig) -> dict:
+    """Store the answer to a first-turn question in the semantic answer cache.
+
+    Args:
+        state (AgentState): The current state of the agent, including the answer and its documents.
+        config (RunnableConfig): Configuration with the answer cache settings.
+
+    Returns:
+        dict: An empty update; the state is not changed.
+    """
+    configuration = AgentConfiguration.from_runnable_config(config)
+    question = _first_turn_question(state)
+    if configuration.answer_cache and question is not None and state.answer:
+        # the question embedding is usually served from the embedding cache
+        vector = await make_query_encoder(configuration).aembed_query(question)
+        _get_answer_cache(configuration).insert(
+            vector,
+            state.answer,
+            state.context_documents,
+            get_index_generation(),
+            configuration.answer_cache_threshold,
+        )
+    return {}
+
+
+async def compact_history(
+    state: AgentState, *, config: RunnableConfig
+) -> dict[str, Any]:
+    """Fold older messages of the conversation into the rolling summary.
+
+    Runs at the end of each turn, after the answer is generated. Once the
+    messages that are neither summarized nor among the latest
+    `history_keep_messages` reach `summary_trigger_tokens`, they are
+    summarized together with the previous summary, so every message is
+    summarized only once.
+
+    Args:
+        state (AgentState): The current state of the agent, including conversation history and summary.
+        config (RunnableConfig): Configuration with the history settings and the model used to summarize.
+
+    Returns:
+        dict[str, Any]: The extended 'summary' and the number of 'summarized_messages',
+            or an empty update if the summary is not due.
+    """
+    configuration = AgentConfiguration.from_runnable_config(config)
+    if not configuration.summarize_history:
+        return {}
+    end = messages_to_summarize(
+        state.messages,
+        state.summarized_messages,
+        configuration.history_keep_messages,
+        await aget_token_counter(configuration.query_model),
+        configuration.summary_trigger_tokens,
+    )
+    if end is None:
+        return {}
+    model = load_chat_model(configuration.query_model)
+    system_prompt = configuration.summary_system_prompt.format(
+        summary=state.summary or "(empty)"
+    )
+    new_messages = get_buffer_string(state.messages[state.summarized_messages : end])
+    response = await model.ainvoke(
+        [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": new_messages},
+        ],
+        {"tags": ["langsmith:nostream"]},
+    )
+    return {"summary": response.content, "summarized_messages": end}
+
+
 # Define the graph
 
 
 builder = StateGraph(AgentState, input=InputState, config_schema=AgentConfiguration)
+builder.add_node(check_answer_cache)
+builder.add_node(analyze_and_route_query)
+builder.add_node(ask_for_more_info)
+builder.add_node(respond_to_general_query)
+builder.add_node(speculative_retrieval)
+builder.add_node(reuse_documents)
 builder.add_node(create_research_plan)
 builder.add_node(conduct_research)
+builder.add_node(conduct_research_step)
+builder.add_node(finish_research_wave)
+builder.add_node(build_context)
 builder.add_node(respond)
+builder.add_node(cache_answer)
+builder.add_node(compact_history)
 
-builder.add_edge(START, "create_research_plan")
-builder.add_edge("create_research_plan", "conduct_research")
+builder.add_edge(START, "check_answer_cache")
+builder.add_conditional_edges("check_answer_cache", route_answer_cache)
+builder.add_conditional_edges(
+    "analyze_and_route_query",
+    route_query,  # type: ignore
+    path_map=[
+        "create_research_plan",
+        "speculative_retrieval",
+        "reuse_documents",
+        "ask_for_more_info",
+        "respond_to_general_query",
+    ],
+)
+builder.add_edge("ask_for_more_info", "compact_history")
+builder.add_edge("respond_to_general_query", "compact_history")
+builder.add_edge("speculative_retrieval", END)
+builder.add_edge("reuse_documents", "build_context")
+builder.add_conditional_edges(
+    "create_research_plan",
+    route_research,  # type: ignore
+    path_map=["conduct_research", "conduct_research_step", "build_context"],
+)
 builder.add_conditional_edges("conduct_research", check_finished)
-builder.add_edge("respond", END)
+builder.add_edge("conduct_research_step", "finish_research_wave")
+builder.add_conditional_edges(
+    "finish_research_wave",
+    route_research,  # type: ignore
+    path_map=["conduct_research_step", "build_context"],
+)
+builder.add_edge("build_context", "respond")
+builder.add_edge("respond", "cache_answer")
+builder.add_edge("cache_answer", "compact_history")
+builder.add_edge("compact_history", END)
 
 # Compile into a graph object that you can invoke and deploy.
 graph = builder.compile()
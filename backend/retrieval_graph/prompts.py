@@ -34,3 +34,24 @@ RESPONSE_SYSTEM_PROMPT = (
     .messages[0]
     .prompt.template
 )
+# appended to the research plan prompt by the fused planner
+FUSED_PLAN_INSTRUCTIONS = """For each step of the plan, also write 3 diverse search \
+queries that would find the documentation needed to complete that step. Return the \
+steps in `steps`, and the queries of each step in `queries`, in the same order as the \
+steps."""
+# used to fold older turns of a long conversation into a rolling summary
+SUMMARY_SYSTEM_PROMPT = """You maintain a running summary of a conversation between a \
+user and an assistant that answers questions about LangChain. Extend the current summary \
+with the new messages the user sends you. Keep the user's goals, the code, libraries and \
+versions they use, errors they hit, and what the assistant already explained or \
+recommended. Be concise and write only the updated summary.
+
+Current summary:
+{summary}"""
+# used to confirm that the documents researched so far answer the question
+COVERAGE_SYSTEM_PROMPT = """You check whether documentation retrieved so far is enough \
+to fully answer a user's question about LangChain. Answer sufficient only if the \
+documents below contain everything needed for a complete and correct answer; if any \
+part of the question is not covered, more research is needed.
+
+{context}"""
@@ -4,18 +4,20 @@ This module defines the core structure and functionality of the researcher graph
 which is responsible for generating search queries and retrieving relevant documents.
 """
 
-from typing import cast
+from typing import Any, Literal, Union, cast
 
-from langchain_core.documents import Document
 from langchain_core.runnables import RunnableConfig
 from langgraph.constants import Send
 from langgraph.graph import END, START, StateGraph
 from typing_extensions import TypedDict
 
 from backend import retrieval
+from backend.document_store import astore_documents
+from backend.embeddings import aembed_queries
+from backend.rerank import select_distinct
 from backend.retrieval_graph.configuration import AgentConfiguration
 from backend.retrieval_graph.researcher_graph.state import QueryState, ResearcherState
-from backend.utils import load_chat_model
+from backend.utils import document_ranking, load_chat_model, with_provenance
 
 
 async def generate_queries(
@@ -53,40 +55,152 @@ async def generate_queries(
     return {"queries": response["queries"]}
 
 
+def check_queries(
+    state: ResearcherState,
+) -> Literal["generate_queries", "embed_queries"]:
+    """Skip query generation if the planner already generated the queries.
+
+    Args:
+        state (ResearcherState): The initial state of the researcher, including any queries it was given.
+
+    Returns:
+        Literal["generate_queries", "embed_queries"]: The first step of the research.
+    """
+    return "embed_queries" if state.queries else "generate_queries"
+
+
+async def embed_queries(
+    state: ResearcherState, *, config: RunnableConfig
+) -> dict[str, Any]:
+    """Embed all generated queries in a single batched call, and drop paraphrases.
+
+    When `batch_query_embeddings` is enabled, this replaces one embedding round-trip
+    per query with a single one per research step, so the retrieval nodes only run
+    vector searches. Otherwise it leaves the embedding to the retrieval nodes.
+
+    Generated queries are often paraphrases of each other, which retrieve
+    nearly the same documents. If `query_duplicate_threshold` is at most 1,
+    queries whose embedding reaches it in cosine similarity with an earlier
+    query are dropped, so only one query of each group is searched.
+
+    Args:
+        state (ResearcherState): The current state of the researcher, including the generated queries.
+        config (RunnableConfig): Configuration with the embedding model.
+
+    Returns:
+        dict[str, Any]: A dictionary with a 'query_vectors' key containing one embedding per query,
+            or an empty list if batching is disabled, and a 'queries' key with the distinct queries
+            if deduplication is enabled.
+    """
+    configuration = AgentConfiguration.from_runnable_config(config)
+    if not configuration.batch_query_embeddings or not state.queries:
+        return {"query_vectors": []}
+
+    encoder = retrieval.make_query_encoder(configuration)
+    vectors = await aembed_queries(encoder, state.queries)
+    if configuration.query_duplicate_threshold > 1:
+        return {"query_vectors": vectors}
+    distinct = select_distinct(vectors, configuration.query_duplicate_threshold)
+    return {
+        "queries": [state.queries[i] for i in distinct],
+        "query_vectors": [vectors[i] for i in distinct],
+    }
+
+
 async def retrieve_documents(
     state: QueryState, *, config: RunnableConfig
-) -> dict[str, list[Document]]:
+) -> dict[str, Any]:
     """Retrieve documents based on a given query.
 
     This function uses a retriever to fetch relevant documents for a given query.
+    If the query was already embedded, its vector is reused.
 
     Args:
-        state (QueryState): The current state containing the query string.
+        state (QueryState): The current state containing the query string and, optionally, its embedding.
         config (RunnableConfig): Configuration with the retriever used to fetch documents.
 
     Returns:
-        dict[str, list[Document]]: A dictionary with a 'documents' key containing the list of retrieved documents.
+        dict[str, Any]: A dictionary with a 'documents' key containing references to the retrieved
+            documents in the document store, tagged with the query and their rank, and a 'rankings'
+            key containing their uuids, best first.
     """
-    with retrieval.make_retriever(config) as retriever:
-        response = await retriever.ainvoke(state.query, config)
-        return {"documents": response}
+    configuration = AgentConfiguration.from_runnable_config(config)
+    async with retrieval.make_retriever(config) as retriever:
+        if state.vector is not None:
+            response = await retriever.ainvoke(state.query, config, vector=state.vector)
+        else:
+            response = await retriever.ainvoke(state.query, config)
+    return {
+        "documents": with_provenance(
+            await astore_documents(configuration, response), state.query
+        ),
+        "rankings": [document_ranking(response)],
+    }
+
+
+async def retrieve_all_documents(
+    state: ResearcherState, *, config: RunnableConfig
+) -> dict[str, Any]:
+    """Retrieve documents for all generated queries in one batched search.
 
+    This function borrows a single retriever and searches for every query at once,
+    reusing the query vectors if they were embedded in a batch.
 
-def retrieve_in_parallel(state: ResearcherState) -> list[Send]:
+    Args:
+        state (ResearcherState): The current state of the researcher, including the generated queries.
+        config (RunnableConfig): Configuration with the retriever used to fetch documents.
+
+    Returns:
+        dict[str, Any]: A dictionary with a 'documents' key containing references to the retrieved
+            documents, grouped by query in the order the queries were generated, and a 'rankings' key
+            containing the uuids of each query's documents, best first.
+    """
+    configuration = AgentConfiguration.from_runnable_config(config)
+    async with retrieval.make_retriever(config) as retriever:
+        results = await retriever.abatch_search(
+            state.queries, state.query_vectors or None
+        )
+    references = [await astore_documents(configuration, docs) for docs in results]
+    return {
+        "documents": [
+            doc
+            for query, docs in zip(state.queries, references)
+            for doc in with_provenance(docs, query)
+        ],
+        "rankings": [document_ranking(docs) for docs in results],
+    }
+
+
+def retrieve_in_parallel(
+    state: ResearcherState, *, config: RunnableConfig
+) -> Union[Literal["retrieve_all_documents"], list[Send]]:
     """Create parallel retrieval tasks for each generated query.
 
     This function prepares parallel document retrieval tasks for each query in the researcher's state.
 
     Args:
         state (ResearcherState): The current state of the researcher, including the generated queries.
+        config (RunnableConfig): Configuration deciding whether to search for all queries in a batch.
 
     Returns:
-        Literal["retrieve_documents"]: A list of Send objects, each representing a document retrieval task.
+        Union[Literal["retrieve_all_documents"], list[Send]]: A list of Send objects, each representing a
+            document retrieval task, or "retrieve_all_documents" if searches are batched.
 
     Behavior:
-        - Creates a Send object for each query in the state.
-        - Each Send object targets the "retrieve_documents" node with the corresponding query.
+        - If `batch_vector_search` is enabled, routes to the "retrieve_all_documents" node.
+        - Otherwise, creates a Send object for each query in the state.
+        - Each Send object targets the "retrieve_documents" node with the corresponding query
+          and, if the queries were embedded in a batch, its vector.
     """
+    configuration = AgentConfiguration.from_runnable_config(config)
+    if configuration.batch_vector_search:
+        return "retrieve_all_documents"
+
+    if state.query_vectors:
+        return [
+            Send("retrieve_documents", QueryState(query=query, vector=vector))
+            for query, vector in zip(state.queries, state.query_vectors)
+        ]
     return [
         Send("retrieve_documents", QueryState(query=query)) for query in state.queries
     ]
@@ -95,14 +209,18 @@ def retrieve_in_parallel(state: ResearcherState) -> list[Send]:
 # Define the graph
 builder = StateGraph(ResearcherState)
 builder.add_node(generate_queries)
+builder.add_node(embed_queries)
 builder.add_node(retrieve_documents)
-builder.add_edge(START, "generate_queries")
+builder.add_node(retrieve_all_documents)
+builder.add_conditional_edges(START, check_queries)
+builder.add_edge("generate_queries", "embed_queries")
 builder.add_conditional_edges(
-    "generate_queries",
+    "embed_queries",
     retrieve_in_parallel,  # type: ignore
-    path_map=["retrieve_documents"],
+    path_map=["retrieve_documents", "retrieve_all_documents"],
 )
 builder.add_edge("retrieve_documents", END)
+builder.add_edge("retrieve_all_documents", END)
 # Compile into a graph object that you can invoke and deploy.
 graph = builder.compile()
 graph.name = "ResearcherGraph"
@@ -3,12 +3,13 @@
 This module defines the state structures used in the researcher graph.
 """
 
+import operator
 from dataclasses import dataclass, field
-from typing import Annotated
+from typing import Annotated, Optional
 
 from langchain_core.documents import Document
 
-from backend.utils import reduce_docs
+from backend.utils import DocumentChannel
 
 
 @dataclass(kw_only=True)
@@ -16,6 +17,8 @@ class QueryState:
     """Private state for the retrieve_documents node in the researcher graph."""
 
     query: str
+    vector: Optional[list[float]] = None
+    """The precomputed embedding of the query, if queries were embedded in a batch."""
 
 
 @dataclass(kw_only=True)
@@ -26,5 +29,9 @@ class ResearcherState:
     """A step in the research plan generated by the retriever agent."""
     queries: list[str] = field(default_factory=list)
     """A list of search queries based on the question that the researcher generates."""
-    documents: Annotated[list[Document], reduce_docs] = field(default_factory=list)
+    query_vectors: list[list[float]] = field(default_factory=list)
+    """Embeddings of the queries, in the same order, when they are embedded in a batch."""
+    documents: Annotated[list[Document], DocumentChannel] = field(default_factory=list)
     """Populated by the retriever. This is a list of documents that the agent can reference."""
+    rankings: Annotated[list[list[str]], operator.add] = field(default_factory=list)
+    """The uuids of the documents retrieved for each query, best first."""
@@ -12,7 +12,7 @@ from langchain_core.messages import AnyMessage
 from langgraph.graph import add_messages
 from typing_extensions import TypedDict
 
-from backend.utils import reduce_docs
+from backend.utils import DocumentChannel, reduce_queries, reduce_rankings
 
 
 # Optional, the InputState is a restricted version of the State that is used to
@@ -66,6 +66,16 @@ class Router(TypedDict):
     type: Literal["more-info", "langchain", "general"]
 
 
+@dataclass(kw_only=True)
+class ResearchStepState:
+    """Private state for the conduct_research_step node in the retrieval graph."""
+
+    step: str
+    """The step of the research plan to research."""
+    queries: list[str] = field(default_factory=list)
+    """Search queries for the step, if the planner generated them."""
+
+
 # This is the primary state of your agent, where you can store any information
 
 
@@ -77,8 +87,26 @@ class AgentState(InputState):
     """The router's classification of the user's query."""
     steps: list[str] = field(default_factory=list)
     """A list of steps in the research plan."""
-    documents: Annotated[list[Document], reduce_docs] = field(default_factory=list)
+    step_queries: list[list[str]] = field(default_factory=list)
+    """Search queries for each step, in the same order, if the fused planner generated them."""
+    documents: Annotated[list[Document], DocumentChannel] = field(default_factory=list)
     """Populated by the retriever. This is a list of documents that the agent can reference."""
+    rankings: Annotated[list[list[str]], reduce_rankings] = field(default_factory=list)
+    """The uuids of the documents retrieved for each research query, best first."""
+    context_documents: list[Document] = field(default_factory=list)
+    """The documents in the response model's context, in the order the answer cites them by number."""
+    reused_documents: list[Document] = field(default_factory=list)
+    """Documents of the previous turn relevant to a follow-up question, best first."""
+    research_queries: Annotated[list[str], reduce_queries] = field(default_factory=list)
+    """The search queries of the research, used to compress the retrieved documents."""
+    skipped_steps: int = field(default=0)
+    """Number of planned research steps skipped because the documents already covered the question."""
+    summary: str = field(default="")
+    """Rolling summary of the conversation before its latest messages."""
+    summarized_messages: int = field(default=0)
+    """Number of messages, from the start of the conversation, covered by `summary`."""
     answer: str = field(default="")
     """Final answer. Useful for evaluations"""
+    answer_cache_hit: bool = field(default=False)
+    """Whether the answer to the latest question was served from the answer cache."""
     query: str = field(default="")
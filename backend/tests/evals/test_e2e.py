@@ -118,7 +118,8 @@ def evaluate_qa_context(run: Run, example: Example) -> dict:
     if not messages:
         return {"score": 0.0}
 
-    documents = run.outputs.get("documents") or []
+    # the documents in the response model's context, as they were formatted
+    documents = run.outputs.get("context_documents") or []
     if not documents:
         return {"score": 0.0}
 
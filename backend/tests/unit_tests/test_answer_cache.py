@@ -0,0 +1,67 @@
+from langchain_core.documents import Document
+
+from backend import answer_cache
+from backend.answer_cache import SemanticAnswerCache, get_answer_cache
+
+DOCS = [Document(page_content="LCEL", metadata={"uuid": "1"})]
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_similar_questions_are_served() -> None:
+    cache = SemanticAnswerCache(10)
+    cache.insert([1.0, 0.0], "answer", DOCS, "g1", 0.95)
+    hit = cache.lookup([0.99, 0.05], "g1", 0.95)
+    assert hit is not None
+    assert (hit.answer, hit.documents) == ("answer", DOCS)
+    assert hit.similarity > 0.99
+    # cosine similarity of about 0.94 is below the threshold
+    assert cache.lookup([0.94, 0.34], "g1", 0.95) is None
+    assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+
+
+def test_a_new_index_generation_empties_the_cache() -> None:
+    cache = SemanticAnswerCache(10)
+    cache.insert([1.0, 0.0], "answer", DOCS, "g1", 0.95)
+    assert cache.lookup([1.0, 0.0], "g2", 0.95) is None
+    assert cache.lookup([1.0, 0.0], "g1", 0.95) is None
+
+
+def test_answers_expire(monkeypatch) -> None:
+    clock = Clock()
+    monkeypatch.setattr(answer_cache.time, "monotonic", clock)
+    cache = SemanticAnswerCache(10, ttl=60)
+    cache.insert([1.0, 0.0], "answer", DOCS, "g1", 0.95)
+    clock.now += 59
+    assert cache.lookup([1.0, 0.0], "g1", 0.95) is not None
+    clock.now += 1
+    assert cache.lookup([1.0, 0.0], "g1", 0.95) is None
+
+
+def test_similar_questions_replace_each_other_and_the_lru_is_evicted() -> None:
+    cache = SemanticAnswerCache(2)
+    cache.insert([1.0, 0.0, 0.0], "first", DOCS, "g1", 0.95)
+    cache.insert([0.99, 0.05, 0.0], "first again", DOCS, "g1", 0.95)
+    cache.insert([0.0, 1.0, 0.0], "second", DOCS, "g1", 0.95)
+    assert cache.lookup([1.0, 0.0, 0.0], "g1", 0.95).answer == "first again"
+    # "second" is now the least recently used entry
+    cache.insert([0.0, 0.0, 1.0], "third", DOCS, "g1", 0.95)
+    assert cache.lookup([0.0, 1.0, 0.0], "g1", 0.95) is None
+    assert cache.lookup([1.0, 0.0, 0.0], "g1", 0.95).answer == "first again"
+    assert cache.lookup([0.0, 0.0, 1.0], "g1", 0.95).answer == "third"
+
+
+def test_each_namespace_has_its_own_cache(monkeypatch) -> None:
+    monkeypatch.setattr(answer_cache, "_caches", {})
+    cache = get_answer_cache("model-a:settings", maxsize=10)
+    assert get_answer_cache("model-a:settings", maxsize=10) is cache
+    other = get_answer_cache("model-b:settings", maxsize=10)
+    assert other is not cache
+    cache.insert([1.0, 0.0], "answer", DOCS, "g1", 0.95)
+    assert other.lookup([1.0, 0.0], "g1", 0.95) is None
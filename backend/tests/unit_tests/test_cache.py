@@ -0,0 +1,69 @@
+import sqlite3
+
+from backend import cache
+from backend.cache import LRUCache, SQLiteStore
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_lru_cache_evicts_the_least_recently_used() -> None:
+    lru: LRUCache[int] = LRUCache(2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1
+    lru.set("c", 3)
+    assert lru.get("b") is None
+    assert (lru.get("a"), lru.get("c"), len(lru)) == (1, 3, 2)
+
+
+def test_lru_cache_expires_entries(monkeypatch) -> None:
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    lru: LRUCache[int] = LRUCache(10)
+    lru.set("short", 1, ttl=5)
+    lru.set("forever", 2)
+    clock.now += 4
+    assert lru.get("short") == 1
+    clock.now += 1
+    assert lru.get("short") is None
+    assert len(lru) == 1
+    assert lru.get("forever") == 2
+
+
+def test_sqlite_store_is_shared_between_connections(tmp_path) -> None:
+    path = str(tmp_path / "store" / "cache.sqlite")
+    store = SQLiteStore(path, table="entries")
+    store.mset([("g1:a", b"1"), ("g1:b", b"2")])
+    store.mset([("g1:a", b"3")])
+    other = SQLiteStore(path, table="entries")
+    assert other.mget(["g1:a", "g1:b", "g1:c"]) == [b"3", b"2", None]
+    assert other.mget([]) == []
+
+
+def test_sqlite_store_retains_one_generation(tmp_path) -> None:
+    store = SQLiteStore(str(tmp_path / "cache.sqlite"), table="entries")
+    store.mset([("g1:a", b"1"), ("g2:a", b"2"), ("g2:b", b"3")])
+    store.retain_prefix("g2:")
+    assert store.mget(["g1:a", "g2:a", "g2:b"]) == [None, b"2", b"3"]
+
+
+def test_sqlite_store_purges_expired_entries(tmp_path, monkeypatch) -> None:
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "time", clock)
+    path = str(tmp_path / "cache.sqlite")
+    # a table created before entries could expire
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE entries (key TEXT PRIMARY KEY, value BLOB)")
+        conn.execute("INSERT INTO entries VALUES ('old', x'31')")
+    store = SQLiteStore(path, table="entries")
+    store.mset([("a", b"1")], expires_at=110)
+    store.mset([("b", b"2")], expires_at=120)
+    clock.now += 10
+    assert store.purge_expired() == 1
+    assert store.mget(["old", "a", "b"]) == [b"1", None, b"2"]
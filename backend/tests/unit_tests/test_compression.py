@@ -0,0 +1,110 @@
+import re
+
+import pytest
+from langchain_core.documents import Document
+
+from backend.compression import compress_documents, split_passages
+
+FENCE_RE = re.compile(r"^[ \t]*```", re.MULTILINE)
+
+PROSE = (
+    "Streaming lets you show output as it is produced. "
+    "Every runnable exposes a stream method for this. "
+    "Chat models stream tokens as they arrive."
+)
+CODE = "for chunk in model.stream(messages):\n    print(chunk.content)"
+
+
+def fences(text: str) -> int:
+    return len(FENCE_RE.findall(text))
+
+
+def kinds(text: str) -> list[str]:
+    return [
+        "code" if p.text.startswith("```") else "prose" for p in split_passages(text)
+    ]
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        # starts and ends outside a code block
+        (
+            f"{PROSE}\n\n```python\n{CODE}\n```\n\n{PROSE}",
+            ["prose"] * 3 + ["code"] + ["prose"] * 3,
+        ),
+        # starts inside a code block
+        (f"{CODE}\n```\n\n{PROSE}", ["code"] + ["prose"] * 3),
+        # ends inside a code block
+        (f"{PROSE}\n\n```python\n{CODE}", ["prose"] * 3 + ["code"]),
+        # starts and ends inside a code block
+        (
+            f"{CODE}\n```\n\n{PROSE}\n\n```python\n{CODE}",
+            ["code"] + ["prose"] * 3 + ["code"],
+        ),
+        # starts and ends inside code blocks without languages
+        (
+            f"{CODE}\n```\n\n{PROSE}\n\n```\n{CODE}",
+            ["code"] + ["prose"] * 3 + ["code"],
+        ),
+        # ends inside a code block without a language
+        (f"{PROSE}\n\n```\n{CODE}", ["prose"] * 3 + ["code"]),
+    ],
+)
+def test_split_passages_finds_code_blocks(text: str, expected: list[str]) -> None:
+    passages = split_passages(text)
+    assert kinds(text) == expected
+    for passage in passages:
+        if passage.text.startswith("```"):
+            assert fences(passage.text) == 2
+            assert passage.text.endswith("```")
+        else:
+            assert fences(passage.text) == 0
+
+
+def test_split_passages_keeps_offsets() -> None:
+    text = f"{PROSE}\n\n```python\n{CODE}\n```"
+    for passage in split_passages(text):
+        if not passage.text.startswith("```"):
+            assert text[passage.start : passage.end] == passage.text
+
+
+def test_split_passages_keeps_last_sentence_before_a_fence() -> None:
+    text = f"{PROSE}\n```python\n{CODE}\n```"
+    assert split_passages(text)[2].text == "Chat models stream tokens as they arrive."
+
+
+def test_compress_documents_keeps_matching_passages() -> None:
+    text = (
+        "Retrievers return documents for a query. "
+        "Vector stores can be used as retrievers. "
+        "Callbacks let you log every step. "
+        "Tracing sends runs to LangSmith. "
+        "Output parsers turn text into objects."
+    )
+    doc = Document(page_content=text, metadata={"source": "docs"})
+    (compressed,) = compress_documents([doc], ["vector store retrievers"], 0.3)
+    assert compressed.metadata == doc.metadata
+    assert "Vector stores can be used as retrievers." in compressed.page_content
+    assert "Output parsers" not in compressed.page_content
+    assert "..." in compressed.page_content
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        f"{CODE}\n```\n\n{PROSE}\n\n```python\n{CODE}",
+        f"{PROSE}\n\n```python\n{CODE}\n```\n\n{PROSE}\n\n```\n{CODE}",
+    ],
+)
+def test_compress_documents_balances_fences(text: str) -> None:
+    (compressed,) = compress_documents(
+        [Document(page_content=text)], ["stream chunk content"], 0.5
+    )
+    assert fences(compressed.page_content) % 2 == 0
+
+
+def test_compress_documents_keeps_short_and_unmatched_documents() -> None:
+    short = Document(page_content="One sentence only.")
+    unmatched = Document(page_content=PROSE)
+    assert compress_documents([short, unmatched], ["weaviate"]) == [short, unmatched]
@@ -0,0 +1,61 @@
+from langchain_core.documents import Document
+
+from backend.context_packing import TokenCounter, pack_context
+
+COUNTER = TokenCounter(None)
+
+
+def doc(text: str, source: str = "") -> Document:
+    return Document(page_content=text, metadata={"source": source} if source else {})
+
+
+def words(start: int, stop: int) -> str:
+    return " ".join(f"word{i}" for i in range(start, stop))
+
+
+def test_documents_are_kept_best_first_until_the_budget_is_spent() -> None:
+    documents = [doc("a" * 400), doc("b" * 400), doc("c" * 400)]
+    size = COUNTER.count_document(documents[0])
+    assert size == COUNTER.count_document(documents[2])
+
+    packed = pack_context(documents, COUNTER, 2 * size)
+    assert packed.documents == documents[:2]
+    assert (packed.tokens, packed.over_budget, packed.overlapping) == (2 * size, 1, 0)
+
+    packed = pack_context(documents, COUNTER, 2 * size - 1)
+    assert packed.documents == documents[:1]
+    assert packed.over_budget == 2
+
+
+def test_smaller_documents_fill_the_rest_of_the_budget() -> None:
+    documents = [doc("a" * 400), doc("b" * 2000), doc("c" * 40)]
+    budget = COUNTER.count_document(documents[0]) + COUNTER.count_document(documents[2])
+    packed = pack_context(documents, COUNTER, budget)
+    assert packed.documents == [documents[0], documents[2]]
+    assert packed.over_budget == 1
+
+
+def test_overlapping_chunks_of_a_source_are_dropped() -> None:
+    first = doc(words(0, 100), source="page")
+    # 60 of the 100 words are shared with the first chunk
+    overlapping = doc(words(40, 140), source="page")
+    other_source = doc(words(40, 140), source="other")
+
+    packed = pack_context(
+        [first, overlapping, other_source], COUNTER, 10_000, overlap_threshold=0.5
+    )
+    assert packed.documents == [first, other_source]
+    assert packed.overlapping == 1
+
+    packed = pack_context(
+        [first, overlapping, other_source], COUNTER, 10_000, overlap_threshold=0.7
+    )
+    assert packed.documents == [first, overlapping, other_source]
+    assert packed.overlapping == 0
+
+
+def test_a_budget_of_zero_keeps_nothing() -> None:
+    documents = [doc("a" * 400), doc("")]
+    packed = pack_context(documents, COUNTER, 0)
+    assert packed.documents == []
+    assert (packed.tokens, packed.over_budget) == (0, 2)
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+
+import pytest
+from langchain_core.documents import Document
+
+from backend import document_store
+from backend.cache import LRUCache
+from backend.configuration import BaseConfiguration
+from backend.document_store import (
+    PREVIEW_CHARS,
+    ahydrate_documents,
+    astore_documents,
+    hydrate_documents,
+    is_reference,
+    store_documents,
+)
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    monkeypatch.setenv("INDEX_GENERATION", "test")
+    monkeypatch.setattr(document_store, "_memory_store", LRUCache(100))
+    monkeypatch.setattr(document_store, "_disk_stores", {})
+
+
+def chunk(i: int) -> Document:
+    return Document(page_content=f"{i} " * 500, metadata={"uuid": f"uuid-{i}"})
+
+
+def test_references_carry_a_preview() -> None:
+    configuration = BaseConfiguration(document_store="memory")
+    (reference,) = store_documents(configuration, [chunk(1)])
+    assert is_reference(reference)
+    assert len(reference.page_content) == PREVIEW_CHARS
+    assert hydrate_documents(configuration, [reference]) == [chunk(1)]
+
+
+def test_disk_store_is_shared_across_processes(tmp_path) -> None:
+    configuration = BaseConfiguration(
+        document_store="disk", document_store_path=str(tmp_path / "documents.sqlite")
+    )
+    references = store_documents(configuration, [chunk(1), chunk(2)])
+    # another worker process has an empty memory store
+    document_store._memory_store = LRUCache(100)
+    assert hydrate_documents(configuration, references) == [chunk(1), chunk(2)]
+
+
+def test_disk_store_is_used_off_the_event_loop(tmp_path, monkeypatch) -> None:
+    configuration = BaseConfiguration(
+        document_store="disk", document_store_path=str(tmp_path / "documents.sqlite")
+    )
+    threads = []
+    mset = document_store.SQLiteStore.mset
+    mget = document_store.SQLiteStore.mget
+
+    def record(method):
+        def recorded(self, *args):
+            threads.append(threading.current_thread())
+            return method(self, *args)
+
+        return recorded
+
+    monkeypatch.setattr(document_store.SQLiteStore, "mset", record(mset))
+    monkeypatch.setattr(document_store.SQLiteStore, "mget", record(mget))
+
+    async def main() -> list[Document]:
+        references = await astore_documents(configuration, [chunk(1)])
+        document_store._memory_store = LRUCache(100)
+        return await ahydrate_documents(configuration, references)
+
+    assert asyncio.run(main()) == [chunk(1)]
+    assert len(threads) == 2
+    assert threading.main_thread() not in threads
+
+
+def test_missing_documents_stay_references() -> None:
+    configuration = BaseConfiguration(document_store="memory")
+    references = store_documents(configuration, [chunk(1), chunk(2)])
+    document_store._memory_store = LRUCache(100)
+    store_documents(configuration, [chunk(2)])
+    hydrated = hydrate_documents(configuration, references)
+    assert is_reference(hydrated[0]) and hydrated[0] == references[0]
+    assert hydrated[1] == chunk(2)
+
+
+def test_documents_are_kept_without_a_store() -> None:
+    configuration = BaseConfiguration(document_store="none")
+    assert store_documents(configuration, [chunk(1)]) == [chunk(1)]
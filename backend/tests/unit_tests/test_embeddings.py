@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from backend import embeddings
+from backend.cache import LRUCache, SQLiteStore
+from backend.embeddings import CachedEmbeddings, aembed_queries
+
+
+class CountingEmbeddings(Embeddings):
+    """Embed texts by their length and record what was sent to the model."""
+
+    def __init__(self, offset: float = 0.0) -> None:
+        self.offset = offset
+        self.documents: list[str] = []
+        self.queries: list[str] = []
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.documents.extend(texts)
+        return [[float(len(text)), self.offset] for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        self.queries.append(text)
+        return [float(len(text)), self.offset + 1]
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    monkeypatch.setattr(embeddings, "_memory_cache", LRUCache(100))
+
+
+def test_memory_tier_embeds_each_text_once() -> None:
+    model = CountingEmbeddings()
+    cached = CachedEmbeddings(model, "fake/model")
+    assert cached.embed_documents(["a", "bb"]) == [[1.0, 0.0], [2.0, 0.0]]
+    # normalized text is looked up, and only the new text is embedded
+    assert cached.embed_documents([" bb ", "ccc"]) == [[2.0, 0.0], [3.0, 0.0]]
+    assert asyncio.run(cached.aembed_documents(["a", "ccc"])) == [
+        [1.0, 0.0],
+        [3.0, 0.0],
+    ]
+    assert model.documents == ["a", "bb", "ccc"]
+
+
+def test_disk_tier_is_shared_across_processes(tmp_path) -> None:
+    path = str(tmp_path / "embeddings.sqlite")
+    model = CountingEmbeddings()
+    CachedEmbeddings(model, "fake/model", SQLiteStore(path, "embeddings")).embed_query(
+        "a"
+    )
+
+    # another worker process has an empty memory cache
+    embeddings._memory_cache = LRUCache(100)
+    other = CountingEmbeddings()
+    cached = CachedEmbeddings(other, "fake/model", SQLiteStore(path, "embeddings"))
+    assert cached.embed_query("a") == [1.0, 1.0]
+    assert other.queries == []
+
+
+def test_vectors_are_namespaced_by_model_and_kind() -> None:
+    first = CountingEmbeddings(offset=0.0)
+    second = CountingEmbeddings(offset=10.0)
+    assert CachedEmbeddings(first, "fake/first").embed_documents(["a"]) == [[1.0, 0.0]]
+    assert CachedEmbeddings(second, "fake/second").embed_documents(["a"]) == [
+        [1.0, 10.0]
+    ]
+    # queries and documents of the same text are embedded separately
+    assert CachedEmbeddings(first, "fake/first").embed_query("a") == [1.0, 1.0]
+    assert (first.documents, first.queries) == (["a"], ["a"])
+    assert second.documents == ["a"]
+
+
+def test_batched_queries_share_the_cache_of_single_queries() -> None:
+    model = CountingEmbeddings()
+    cached = CachedEmbeddings(model, "fake/model")
+    cached.embed_query("a")
+    vectors = asyncio.run(aembed_queries(cached, ["a", "bb", "ccc"]))
+    assert vectors == [[1.0, 1.0], [2.0, 1.0], [3.0, 1.0]]
+    assert cached.embed_query("ccc") == [3.0, 1.0]
+    # embedded as queries, not as documents
+    assert (model.queries, model.documents) == (["a", "bb", "ccc"], [])
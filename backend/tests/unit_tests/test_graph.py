@@ -0,0 +1,300 @@
+import asyncio
+import json
+import sys
+import types
+from typing import Any, Optional
+
+import pytest
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langgraph.checkpoint.memory import MemorySaver
+
+# placeholder prompts, instead of pulling them from the LangSmith hub
+prompts = types.ModuleType("backend.retrieval_graph.prompts")
+for name in (
+    "ROUTER_SYSTEM_PROMPT",
+    "GENERATE_QUERIES_SYSTEM_PROMPT",
+    "MORE_INFO_SYSTEM_PROMPT",
+    "RESEARCH_PLAN_SYSTEM_PROMPT",
+    "GENERAL_SYSTEM_PROMPT",
+    "FUSED_PLAN_INSTRUCTIONS",
+):
+    setattr(prompts, name, "{logic}")
+prompts.SUMMARY_SYSTEM_PROMPT = "{summary}"
+prompts.COVERAGE_SYSTEM_PROMPT = "{context}"
+prompts.RESPONSE_SYSTEM_PROMPT = "{context}"
+sys.modules.setdefault("backend.retrieval_graph.prompts", prompts)
+
+from backend import document_store, retrieval  # noqa: E402
+from backend.cache import LRUCache  # noqa: E402
+from backend.local_index import write_local_index  # noqa: E402
+from backend.retrieval_graph import graph as retrieval_graph  # noqa: E402
+from backend.retrieval_graph.researcher_graph import (  # noqa: E402
+    graph as researcher_graph,
+)
+from backend.utils import PROVENANCE_KEY  # noqa: E402
+
+TEXTS = [
+    "LCEL composes runnables with the pipe operator",
+    "RunnableParallel runs runnables concurrently",
+    "Stream tokens from a chat model",
+    "Split documents into chunks",
+    "Trace a chain with LangSmith",
+    "Add memory to a LangGraph agent",
+    "Retrieve documents from a vector store",
+    "Call tools from a chat model",
+]
+PLAN = {
+    "steps": [
+        "Find how runnables are composed.",
+        "Find how runnables run in parallel.",
+        "Find how chains are streamed.",
+    ]
+}
+QUERIES = {"queries": ["LCEL pipe operator", "RunnableParallel"]}
+
+
+class FakeEmbeddings(DeterministicFakeEmbedding):
+    """Fake embeddings of plain floats, like a real model's, which checkpoints can store."""
+
+    def _get_embedding(self, seed: int) -> list[float]:
+        return [float(x) for x in super()._get_embedding(seed)]
+
+
+class FakeChatModel(BaseChatModel):
+    """A chat model that returns a fixed response for each structured output schema."""
+
+    responses: dict[str, str]
+    """Response text by schema name, and "text" for plain responses."""
+    schema_name: str = "text"
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> Any:
+        return (
+            self.model_copy(update={"schema_name": schema.__name__})
+            | JsonOutputParser()
+        )
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        text = self.responses[self.schema_name]
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+
+@pytest.fixture
+def model(monkeypatch) -> FakeChatModel:
+    model = FakeChatModel(
+        responses={
+            "Plan": json.dumps(PLAN),
+            "Response": json.dumps(QUERIES),
+            "text": "Use the pipe operator.",
+        }
+    )
+    for module in (retrieval_graph, researcher_graph):
+        monkeypatch.setattr(module, "load_chat_model", lambda name: model)
+    return model
+
+
+@pytest.fixture
+def configurable(model, monkeypatch, tmp_path) -> dict[str, Any]:
+    """Settings that search a local index of `TEXTS` and keep everything in memory."""
+    encoder = FakeEmbeddings(size=64)
+    monkeypatch.setattr(retrieval, "make_text_encoder", lambda name: encoder)
+    monkeypatch.setattr(retrieval, "_document_vectors", LRUCache(1000))
+    monkeypatch.setattr(document_store, "_memory_store", LRUCache(1000))
+    monkeypatch.setenv("INDEX_GENERATION", "test")
+    index_path = str(tmp_path / "index")
+    write_local_index(
+        index_path,
+        (
+            (f"uuid-{i}", text, {"source": f"doc-{i}"}, vector)
+            for i, (text, vector) in enumerate(
+                zip(TEXTS, encoder.embed_documents(TEXTS))
+            )
+        ),
+    )
+    return {
+        "retriever_provider": "local",
+        "local_index_path": index_path,
+        "embedding_cache": "none",
+        "retrieval_cache": "none",
+        "document_store": "memory",
+    }
+
+
+def run(
+    questions: list[str], configurable: dict[str, Any]
+) -> tuple[list[list[str]], dict[str, Any]]:
+    """Ask the questions in turn in one thread.
+
+    Returns:
+        The nodes that ran in each turn, in order, and the final state.
+    """
+    graph = retrieval_graph.builder.compile(checkpointer=MemorySaver())
+    config = {"configurable": {**configurable, "thread_id": "test"}}
+
+    async def main() -> list[list[str]]:
+        turns = []
+        for question in questions:
+            nodes = []
+            async for update in graph.astream(
+                {"messages": [("human", question)]}, config, stream_mode="updates"
+            ):
+                nodes.extend(update)
+            turns.append(nodes)
+        return turns
+
+    turns = asyncio.run(main())
+    return turns, graph.get_state(config).values
+
+
+def test_parallel_research_runs_the_plan_in_waves(configurable) -> None:
+    turns, state = run(
+        ["How do I use LCEL?"],
+        {**configurable, "research_mode": "parallel", "max_parallel_research_steps": 2},
+    )
+    assert turns == [
+        [
+            "check_answer_cache",
+            "analyze_and_route_query",
+            "create_research_plan",
+            "conduct_research_step",
+            "conduct_research_step",
+            "finish_research_wave",
+            "conduct_research_step",
+            "finish_research_wave",
+            "build_context",
+            "respond",
+            "cache_answer",
+            "compact_history",
+        ]
+    ]
+    assert state["steps"] == []
+    assert len(state["rankings"]) == 3 * len(QUERIES["queries"])
+    assert state["context_documents"]
+
+
+def test_sequential_research_runs_one_step_at_a_time(configurable) -> None:
+    turns, state = run(
+        ["How do I use LCEL?"], {**configurable, "research_mode": "sequential"}
+    )
+    (nodes,) = turns
+    assert nodes.count("conduct_research") == 3
+    assert "conduct_research_step" not in nodes
+    assert len(state["rankings"]) == 3 * len(QUERIES["queries"])
+
+
+def queries_of(documents: list[Document]) -> set[str]:
+    return {p["query"] for doc in documents for p in doc.metadata[PROVENANCE_KEY]}
+
+
+def test_speculative_retrieval_is_merged_with_the_research(configurable) -> None:
+    question = "How do I use LCEL?"
+    turns, state = run([question], {**configurable, "speculative_retrieval": True})
+    (nodes,) = turns
+    assert nodes.count("speculative_retrieval") == 1
+    assert nodes.index("speculative_retrieval") < nodes.index("build_context")
+    assert len(state["rankings"]) == 1 + 3 * len(QUERIES["queries"])
+    assert queries_of(state["documents"]) == {question, *QUERIES["queries"]}
+
+
+def test_speculative_retrieval_answers_a_plan_without_steps(
+    model, configurable
+) -> None:
+    model.responses["Plan"] = json.dumps({"steps": []})
+    question = "How do I use LCEL?"
+    _, state = run([question], configurable)
+    assert state["context_documents"] == []
+
+    _, state = run([question], {**configurable, "speculative_retrieval": True})
+    assert state["context_documents"]
+    assert queries_of(state["documents"]) == {question}
+
+
+def test_follow_ups_reuse_the_previous_documents(configurable) -> None:
+    questions = ["How do I use LCEL?", "And how do I stream it?"]
+    reuse = {
+        **configurable,
+        "reuse_documents": True,
+        # every document of the previous turn is relevant to the follow-up
+        "follow_up_relevance_threshold": -1.0,
+    }
+
+    turns, state = run(questions, {**reuse, "follow_up_min_documents": 1})
+    assert turns[1] == [
+        "check_answer_cache",
+        "analyze_and_route_query",
+        "reuse_documents",
+        "build_context",
+        "respond",
+        "cache_answer",
+        "compact_history",
+    ]
+    assert state["documents"] and state["context_documents"]
+
+    # too few relevant documents: they are kept and the plan is cut short
+    turns, _ = run(
+        questions,
+        {**reuse, "follow_up_min_documents": 100, "follow_up_max_steps": 1},
+    )
+    assert "reuse_documents" not in turns[1]
+    assert turns[1].count("conduct_research_step") == 1
+
+    turns, _ = run(questions, configurable)
+    assert turns[1].count("conduct_research_step") == 3
+
+
+@pytest.mark.parametrize(
+    "research_mode, research_node",
+    [("sequential", "conduct_research"), ("parallel", "conduct_research_step")],
+)
+def test_research_stops_once_the_question_is_covered(
+    configurable, research_mode, research_node
+) -> None:
+    covered = {
+        **configurable,
+        "research_mode": research_mode,
+        "max_parallel_research_steps": 1,
+        "research_coverage_check": "embedding",
+        # every researched document is relevant to the question
+        "research_coverage_threshold": -1.0,
+        "research_coverage_min_documents": 1,
+    }
+    (nodes,), state = run(["How do I use LCEL?"], covered)
+    assert nodes.count(research_node) == 1
+    assert state["skipped_steps"] == 2
+    assert nodes[-4:] == ["build_context", "respond", "cache_answer", "compact_history"]
+
+    (nodes,), state = run(
+        ["How do I use LCEL?"], {**covered, "research_coverage_min_documents": 100}
+    )
+    assert nodes.count(research_node) == 3
+    assert state["skipped_steps"] == 0
+
+
+def test_the_coverage_judge_can_continue_the_research(model, configurable) -> None:
+    model.responses["Coverage"] = json.dumps({"sufficient": False})
+    (nodes,), state = run(
+        ["How do I use LCEL?"],
+        {
+            **configurable,
+            "research_coverage_check": "judge",
+            "research_coverage_threshold": -1.0,
+            "research_coverage_min_documents": 1,
+        },
+    )
+    assert nodes.count("conduct_research_step") == 3
+    assert state["skipped_steps"] == 0
@@ -0,0 +1,71 @@
+from langchain_core.messages import AIMessage, HumanMessage
+
+from backend.context_packing import CHARS_PER_TOKEN, TokenCounter
+from backend.history import compact_messages, messages_to_summarize
+
+# estimates tokens from the text length, without a tokenizer
+COUNTER = TokenCounter(None)
+
+
+def turns(count: int, tokens: int) -> list:
+    """Return `count` turns of a user and an assistant message of about `tokens` tokens together."""
+    text = "x" * (tokens // 2 * CHARS_PER_TOKEN)
+    messages = []
+    for i in range(count):
+        messages += [HumanMessage(f"{i} {text}"), AIMessage(f"{i} {text}")]
+    return messages
+
+
+def kept(prompt: list) -> list:
+    return prompt[1:]
+
+
+def test_unsummarized_messages_are_never_dropped() -> None:
+    # three turns of about 650 tokens are over a budget of 1000 tokens, but
+    # below the summary trigger, so the summary covers none of them
+    messages = turns(3, 650)
+    assert messages_to_summarize(messages, 0, 4, COUNTER, 1000) is None
+    prompt = compact_messages("System", messages, "", 0, COUNTER, 1000)
+    assert kept(prompt) == messages
+    assert prompt[0]["content"] == "System"
+
+
+def test_summarized_messages_are_dropped_over_the_budget() -> None:
+    messages = turns(3, 650)
+    prompt = compact_messages("System", messages, "Summary", 4, COUNTER, 1000)
+    assert kept(prompt) == messages[4:]
+    assert "Summary" in prompt[0]["content"]
+
+
+def test_summarized_messages_are_kept_within_the_budget() -> None:
+    messages = turns(3, 200)
+    prompt = compact_messages("System", messages, "Summary", 4, COUNTER, 1000)
+    assert kept(prompt) == messages
+    assert prompt[0]["content"] == "System"
+
+
+def test_kept_messages_start_with_a_user_message() -> None:
+    messages = turns(3, 650)
+    # the budget fits the assistant message of the second turn, not its question
+    prompt = compact_messages("System", messages, "Summary", 4, COUNTER, 1200)
+    assert kept(prompt) == messages[4:]
+
+
+def test_no_budget_keeps_everything() -> None:
+    messages = turns(3, 650)
+    assert kept(compact_messages("System", messages, "Summary", 4, COUNTER, None)) == (
+        messages
+    )
+
+
+def test_summary_is_extended_once_the_trigger_is_reached() -> None:
+    messages = turns(4, 650)
+    # the latest four messages are kept; the two turns before them are due
+    assert messages_to_summarize(messages, 0, 4, COUNTER, 1000) == 4
+    assert messages_to_summarize(messages, 0, 4, COUNTER, 2000) is None
+    assert messages_to_summarize(messages, 4, 4, COUNTER, 0) is None
+
+
+def test_summary_does_not_split_a_turn() -> None:
+    messages = turns(4, 650)
+    assert messages_to_summarize(messages, 0, 3, COUNTER, 0) == 4
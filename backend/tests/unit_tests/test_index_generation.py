@@ -0,0 +1,127 @@
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from backend import index_generation
+from backend.index_generation import (
+    aget_index_generation,
+    bump_index_generation,
+    get_index_generation,
+)
+
+
+class FakeCollection:
+    def __init__(self, store: dict) -> None:
+        self.store = store
+        self.query = self
+        self.data = self
+
+    # synchronous client, used by ingestion
+    def exists(self, uuid: str) -> bool:
+        return uuid in self.store
+
+    def insert(self, properties: dict, uuid: str) -> None:
+        self.store[uuid] = properties
+
+    def replace(self, uuid: str, properties: dict) -> None:
+        self.store[uuid] = properties
+
+    # async client, used by the server
+    async def fetch_object_by_id(self, uuid: str):
+        properties = self.store.get(uuid)
+        return SimpleNamespace(properties=properties) if properties else None
+
+
+class FakeCollections:
+    def __init__(self) -> None:
+        self.collections: dict[str, dict] = {}
+
+    def create(self, name: str, **kwargs) -> None:
+        self.collections[name] = {}
+
+    def get(self, name: str) -> FakeCollection:
+        return FakeCollection(self.collections[name])
+
+
+class FakeClient:
+    def __init__(self, collections: FakeCollections) -> None:
+        self.collections = collections
+        collections.exists = lambda name: name in collections.collections
+
+
+class FakeAsyncClient:
+    def __init__(self, collections: FakeCollections) -> None:
+        async def exists(name: str) -> bool:
+            return name in collections.collections
+
+        self.collections = SimpleNamespace(exists=exists, get=collections.get)
+
+
+class FakePool:
+    def __init__(self, collections: FakeCollections) -> None:
+        self.client = FakeAsyncClient(collections)
+        self.reads = 0
+
+    @asynccontextmanager
+    async def connection(self):
+        self.reads += 1
+        yield self.client
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    monkeypatch.setenv("INDEX_GENERATION_PATH", str(tmp_path / "generation"))
+    monkeypatch.delenv("INDEX_GENERATION", raising=False)
+    monkeypatch.delenv("WEAVIATE_URL", raising=False)
+    monkeypatch.setattr(index_generation, "_generation", None)
+
+
+def test_file_generation_is_bumped() -> None:
+    assert get_index_generation() == "0"
+    generation = bump_index_generation()
+    assert get_index_generation() == generation
+    assert bump_index_generation() != generation
+
+
+def test_pinned_generation_wins(monkeypatch) -> None:
+    bump_index_generation()
+    monkeypatch.setenv("INDEX_GENERATION", "pinned")
+    assert get_index_generation() == "pinned"
+    assert asyncio.run(aget_index_generation()) == "pinned"
+
+
+def test_weaviate_generation_is_read_with_a_ttl(monkeypatch) -> None:
+    monkeypatch.setenv("WEAVIATE_URL", "https://example.weaviate.network")
+    monkeypatch.setenv("INDEX_GENERATION_TTL", "60")
+    collections = FakeCollections()
+    pool = FakePool(collections)
+    assert asyncio.run(aget_index_generation(pool)) == "0"
+
+    generation = bump_index_generation(FakeClient(collections))
+    # the previous read is still fresh
+    assert asyncio.run(aget_index_generation(pool)) == "0"
+    assert pool.reads == 1
+
+    monkeypatch.setenv("INDEX_GENERATION_TTL", "0")
+    assert asyncio.run(aget_index_generation(pool)) == generation
+    assert get_index_generation() == generation
+    assert bump_index_generation(FakeClient(collections)) != generation
+
+
+def test_failed_read_keeps_the_last_generation(monkeypatch) -> None:
+    monkeypatch.setenv("WEAVIATE_URL", "https://example.weaviate.network")
+    monkeypatch.setenv("INDEX_GENERATION_TTL", "0")
+    collections = FakeCollections()
+    pool = FakePool(collections)
+    generation = bump_index_generation(FakeClient(collections))
+    assert asyncio.run(aget_index_generation(pool)) == generation
+
+    class BrokenPool:
+        @asynccontextmanager
+        async def connection(self):
+            raise ConnectionError("unreachable")
+            yield
+
+    assert asyncio.run(aget_index_generation(BrokenPool())) == generation
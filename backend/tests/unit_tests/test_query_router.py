@@ -0,0 +1,90 @@
+import asyncio
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from backend import query_router
+from backend.query_router import (
+    SEED_EXAMPLES,
+    LocalQueryRouter,
+    get_local_router,
+    log_router_decision,
+)
+
+DECISION = {"type": "langchain", "logic": "About LangChain."}
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    embedded: list[str] = []
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+
+@pytest.fixture
+def path(tmp_path, monkeypatch):
+    monkeypatch.setattr(query_router, "_logged_questions", {})
+    monkeypatch.setattr(query_router, "_routers", {})
+    return str(tmp_path / "router_examples.jsonl")
+
+
+def logged_questions(path: str) -> list[str]:
+    with open(path) as f:
+        return [line for line in f if line.strip()]
+
+
+def test_classify_votes_for_the_nearest_examples() -> None:
+    examples = [
+        {"question": "a", "type": "langchain", "logic": "first"},
+        {"question": "b", "type": "langchain", "logic": "second"},
+        {"question": "c", "type": "general", "logic": "third"},
+    ]
+    vectors = np.array([[1.0, 0.0], [0.9, 0.1], [0.0, 1.0]], dtype=np.float32)
+    router = LocalQueryRouter(examples, vectors, k=2)
+    decision = router.classify([1.0, 0.05])
+    assert (decision.type, decision.logic, decision.confidence) == (
+        "langchain",
+        "first",
+        1.0,
+    )
+    router.add(
+        [{"question": "d", "type": "general", "logic": "fourth"}],
+        np.array([[1.0, 0.05]], dtype=np.float32),
+    )
+    assert router.classify([1.0, 0.05]).logic == "fourth"
+
+
+def test_logged_questions_are_deduplicated(path) -> None:
+    assert log_router_decision(path, "How do I use LCEL?", DECISION)
+    assert not log_router_decision(path, "  how do I use  LCEL? ", DECISION)
+    # a new process reads the questions logged before
+    query_router._logged_questions.clear()
+    assert not log_router_decision(path, "How do I use LCEL?", DECISION)
+    # seed examples are never logged
+    assert not log_router_decision(path, SEED_EXAMPLES[0]["question"], DECISION)
+    assert len(logged_questions(path)) == 1
+
+
+def test_log_is_capped(path) -> None:
+    for i in range(5):
+        log_router_decision(path, f"question {i}", DECISION, max_examples=3)
+    assert len(logged_questions(path)) == 3
+
+
+def test_logged_examples_are_added_without_rebuilding(path) -> None:
+    encoder = CountingEmbeddings(size=16)
+    encoder.embedded = []
+    router = asyncio.run(get_local_router(path, "fake", encoder))
+    assert len(encoder.embedded) == len(SEED_EXAMPLES)
+
+    log_router_decision(path, "How do I stream from a chat model?", DECISION)
+    log_router_decision(path, "hi", {"type": "general", "logic": "A greeting."})
+    assert asyncio.run(get_local_router(path, "fake", encoder)) is router
+    # only the new question is embedded; "hi" is a seed example already
+    assert encoder.embedded[len(SEED_EXAMPLES) :] == [
+        "How do I stream from a chat model?"
+    ]
+    vector = encoder.embed_query("How do I stream from a chat model?")
+    assert router.classify(vector).logic == "About LangChain."
@@ -0,0 +1,73 @@
+import numpy as np
+from langchain_core.documents import Document
+
+from backend.rerank import (
+    maximal_marginal_relevance,
+    reciprocal_rank_fusion,
+    rerank_documents,
+    select_distinct,
+)
+
+
+def doc(uuid: str, text: str = "") -> Document:
+    return Document(page_content=text or f"text of {uuid}", metadata={"uuid": uuid})
+
+
+def test_documents_found_by_several_queries_rank_first() -> None:
+    scores = reciprocal_rank_fusion([["a", "b"], ["c", "b"]], k=60)
+    assert scores["b"] == 1 / 62 + 1 / 62
+    assert sorted(scores, key=scores.get, reverse=True) == ["b", "a", "c"]
+
+    documents = [doc("a"), doc("b"), doc("c"), doc("d")]
+    reranked = rerank_documents(
+        documents, [["a", "b"], ["c", "b"]], [None] * len(documents), k=10
+    )
+    # "d" is in no ranking and comes last
+    assert [d.metadata["uuid"] for d in reranked] == ["b", "a", "c", "d"]
+
+
+def test_near_duplicates_are_dropped_at_the_threshold() -> None:
+    documents = [doc("a"), doc("b"), doc("c")]
+    # "b" has cosine similarity of about 0.98 to "a"
+    vectors = [np.array([1.0, 0.0]), np.array([0.98, 0.2]), np.array([0.0, 1.0])]
+    rankings = [["a", "b", "c"]]
+
+    reranked = rerank_documents(
+        documents, rankings, vectors, k=10, lambda_mult=1.0, duplicate_threshold=0.97
+    )
+    assert [d.metadata["uuid"] for d in reranked] == ["a", "c"]
+    reranked = rerank_documents(
+        documents, rankings, vectors, k=10, lambda_mult=1.0, duplicate_threshold=0.99
+    )
+    assert [d.metadata["uuid"] for d in reranked] == ["a", "b", "c"]
+
+
+def test_documents_with_the_same_text_are_collapsed() -> None:
+    documents = [doc("a", "LCEL  chains"), doc("b", "LCEL chains "), doc("c")]
+    reranked = rerank_documents(documents, [["b", "a", "c"]], [None] * 3, k=10)
+    assert [d.metadata["uuid"] for d in reranked] == ["a", "c"]
+
+
+def test_mmr_trades_relevance_against_diversity() -> None:
+    relevance = np.array([1.0, 0.9, 0.1])
+    # the second candidate is similar to the first, the third is unrelated
+    vectors = np.array([[1.0, 0.0], [0.8, 0.6], [0.0, 1.0]])
+
+    assert maximal_marginal_relevance(relevance, vectors, 3, lambda_mult=1.0) == [
+        0,
+        1,
+        2,
+    ]
+    assert maximal_marginal_relevance(relevance, vectors, 3, lambda_mult=0.0) == [
+        0,
+        2,
+        1,
+    ]
+    assert maximal_marginal_relevance(relevance, vectors, 2, lambda_mult=0.0) == [0, 2]
+
+
+def test_select_distinct_keeps_the_first_of_each_group() -> None:
+    vectors = [[1.0, 0.0], [0.0, 2.0], [0.99, 0.05], [0.05, 0.99]]
+    assert select_distinct(vectors, 0.95) == [0, 1]
+    assert select_distinct(vectors, 1.0) == [0, 1, 2, 3]
+    assert select_distinct([], 0.95) == []
@@ -0,0 +1,236 @@
+import asyncio
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from backend import retrieval
+from backend.cache import LRUCache
+from backend.local_index import LocalIndex, write_local_index
+from backend.retrieval import (
+    AdaptiveK,
+    CachedRetriever,
+    LocalIndexRetriever,
+    SearchRetriever,
+    adaptive_cutoff,
+    fuse_scores,
+    get_disk_result_store,
+    get_document_vectors,
+    remember_document_vectors,
+)
+
+TEXTS = [
+    "RunnableParallel runs runnables concurrently",
+    "Stream tokens from a chat model",
+    "Split documents into chunks",
+    "Trace a chain with LangSmith",
+    "Add memory to a LangGraph agent",
+    "Use LCEL to chain a prompt and a model",
+]
+
+
+@pytest.mark.parametrize(
+    "scores, expected",
+    [
+        # uniform scores are kept up to max_k
+        ([0.9, 0.88, 0.86, 0.85, 0.84, 0.83], 4),
+        # a near-exact match followed by weak results is returned alone, or with min_k
+        ([0.95, 0.6, 0.58], 1),
+        # results below the threshold are cut
+        ([0.8, 0.75, 0.3, 0.28], 2),
+        ([], 0),
+    ],
+)
+def test_adaptive_cutoff(scores, expected) -> None:
+    adaptive_k = AdaptiveK(min_k=1, max_k=4, score_threshold=0.5, score_gap=0.2)
+    assert adaptive_cutoff(scores, adaptive_k) == expected
+
+
+def test_adaptive_cutoff_keeps_min_k() -> None:
+    adaptive_k = AdaptiveK(min_k=2, max_k=4, score_threshold=0.5, score_gap=0.2)
+    assert adaptive_cutoff([0.95, 0.6, 0.58], adaptive_k) == 2
+    assert adaptive_cutoff([0.3], adaptive_k) == 1
+
+
+def test_fuse_scores() -> None:
+    ids, scores = fuse_scores(
+        dense_ids=np.array([1, 2, 3]),
+        dense_scores=np.array([0.9, 0.8, 0.7]),
+        lexical_ids=np.array([3, 4]),
+        lexical_scores=np.array([12.0, 2.0]),
+        lexical_weight=0.6,
+        k=3,
+    )
+    # 3 is last among the dense results but first among the lexical ones
+    assert ids.tolist() == [3, 1, 2]
+    np.testing.assert_allclose(scores, [0.6, 0.4, 0.2])
+
+
+def vectors(size: int) -> list[list[float]]:
+    rng = np.random.default_rng(0)
+    return rng.normal(size=(size, 16)).tolist()
+
+
+@pytest.fixture
+def index_path(tmp_path) -> str:
+    path = str(tmp_path / "index")
+    records = [
+        (f"uuid-{i}", text, {"source": f"doc-{i}"}, vector)
+        for i, (text, vector) in enumerate(zip(TEXTS, vectors(len(TEXTS))))
+    ]
+    assert write_local_index(path, records) == len(TEXTS)
+    return path
+
+
+def test_local_index_finds_the_nearest_chunk(index_path) -> None:
+    index = LocalIndex(index_path)
+    queries = np.asarray(vectors(len(TEXTS)))[[4, 1]]
+    indices, distances = index.search(queries, 2)
+    assert indices[:, 0].tolist() == [4, 1]
+    np.testing.assert_allclose(distances[:, 0], 0.0, atol=1e-6)
+    (doc,) = index.get_documents([4])
+    assert doc.page_content == TEXTS[4]
+    assert doc.metadata == {"source": "doc-4", "uuid": "uuid-4"}
+
+
+def test_local_index_ivf_search_matches_exact_search(tmp_path) -> None:
+    rng = np.random.default_rng(1)
+    matrix = rng.normal(size=(400, 16))
+    path = str(tmp_path / "ivf")
+    write_local_index(
+        path, ((str(i), f"chunk {i}", {}, v) for i, v in enumerate(matrix)), nlist=8
+    )
+    index = LocalIndex(path)
+    assert index.has_ivf
+    queries = matrix[:20] + rng.normal(scale=0.05, size=(20, 16))
+    exact, _ = index.search(queries, 5)
+    approximate, _ = index.search(queries, 5, nprobe=8)
+    assert (approximate == exact).all()
+    nearest, _ = index.search(queries, 1, nprobe=2)
+    assert nearest[:, 0].tolist() == list(range(20))
+
+
+def test_lexical_search_finds_exact_identifiers(index_path) -> None:
+    index = LocalIndex(index_path)
+    ids, scores = index.bm25.search("RunnableParallel", 3)
+    assert ids.tolist() == [0] and scores[0] > 0
+    retriever = LocalIndexRetriever(
+        embedding=DeterministicFakeEmbedding(size=16),
+        index=index,
+        lexical_weight=0.5,
+        search_kwargs={"k": 2},
+    )
+    # the query vector is far from the chunk; the identifier still finds it
+    query_vector = (-np.asarray(vectors(len(TEXTS))[0])).tolist()
+    (docs,) = asyncio.run(
+        retriever.abatch_search(["How does RunnableParallel work?"], [query_vector])
+    )
+    assert docs[0].metadata["uuid"] == "uuid-0"
+    without_lexical = retriever.model_copy(update={"lexical_weight": 0.0})
+    (docs,) = asyncio.run(
+        without_lexical.abatch_search(
+            ["How does RunnableParallel work?"], [query_vector]
+        )
+    )
+    assert "uuid-0" not in [doc.metadata["uuid"] for doc in docs]
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingRetriever(SearchRetriever):
+    """Return two documents per query and remember their vectors, like Weaviate."""
+
+    searched: list[str] = []
+
+    async def asearch(self, query: str, vector: list[float]) -> list[Document]:
+        self.searched.append(query)
+        uuids = [f"{query}-{i}" for i in range(2)]
+        remember_document_vectors(uuids, [[1.0, float(i)] for i in range(2)])
+        return [Document(page_content=uuid, metadata={"uuid": uuid}) for uuid in uuids]
+
+
+@pytest.fixture
+def empty_caches(monkeypatch) -> None:
+    monkeypatch.setattr(retrieval, "_result_cache", LRUCache(100))
+    monkeypatch.setattr(retrieval, "_document_vectors", LRUCache(100))
+    monkeypatch.setattr(retrieval, "_result_stores", {})
+    monkeypatch.setattr(retrieval, "_result_store_purged_at", {})
+
+
+def cached(store=None, ttl: float = 60) -> CachedRetriever:
+    return CachedRetriever(
+        retriever=CountingRetriever(embedding=DeterministicFakeEmbedding(size=2)),
+        key_prefix="g1:settings",
+        ttl=ttl,
+        store=store,
+        embedding=DeterministicFakeEmbedding(size=2),
+    )
+
+
+def test_cached_retriever_searches_each_query_once(empty_caches) -> None:
+    retriever = cached()
+    first = asyncio.run(retriever.abatch_search(["a", "b"], [[0.0, 1.0]] * 2))
+    # normalized queries are looked up, and only the new query is searched
+    second = asyncio.run(retriever.abatch_search([" a ", "c"], [[0.0, 1.0]] * 2))
+    assert second[0] == first[0]
+    assert retriever.retriever.searched == ["a", "b", "c"]
+    assert asyncio.run(retriever.ainvoke("b")) == first[1]
+    assert retriever.retriever.searched == ["a", "b", "c"]
+
+
+def test_cache_hits_bring_their_document_vectors(empty_caches) -> None:
+    retriever = cached()
+    asyncio.run(retriever.asearch("a", [0.0, 1.0]))
+    retriever_vectors = get_document_vectors(["a-0", "a-1"])
+    # the vectors were evicted, e.g. by later searches
+    retrieval._document_vectors = LRUCache(100)
+    asyncio.run(retriever.asearch("a", [0.0, 1.0]))
+    assert retriever.retriever.searched == ["a"]
+    for vector, expected in zip(
+        get_document_vectors(["a-0", "a-1"]), retriever_vectors
+    ):
+        np.testing.assert_array_equal(vector, expected)
+
+
+def test_disk_results_are_shared_across_processes(empty_caches, tmp_path) -> None:
+    path = str(tmp_path / "results.sqlite")
+    asyncio.run(cached(get_disk_result_store(path, "g1")).asearch("a", [0.0, 1.0]))
+
+    # another worker process has empty memory caches and its own connection
+    retrieval._result_cache = LRUCache(100)
+    retrieval._document_vectors = LRUCache(100)
+    retrieval._result_stores = {}
+    retriever = cached(get_disk_result_store(path, "g1"))
+    docs = asyncio.run(retriever.asearch("a", [0.0, 1.0]))
+    assert [doc.metadata["uuid"] for doc in docs] == ["a-0", "a-1"]
+    assert retriever.retriever.searched == []
+    np.testing.assert_array_equal(get_document_vectors(["a-1"])[0], [1.0, 1.0])
+
+
+def test_expired_disk_results_are_purged(empty_caches, tmp_path, monkeypatch) -> None:
+    clock = Clock()
+    monkeypatch.setattr(retrieval.time, "time", clock)
+    monkeypatch.setattr(retrieval.time, "monotonic", clock)
+    path = str(tmp_path / "results.sqlite")
+    retriever = cached(get_disk_result_store(path, "g1"), ttl=60)
+    asyncio.run(retriever.asearch("a", [0.0, 1.0]))
+    key = retriever._key("a")
+
+    clock.now += 60
+    asyncio.run(retriever.asearch("a", [0.0, 1.0]))
+    assert retriever.retriever.searched == ["a", "a"]
+
+    clock.now += 60
+    store = get_disk_result_store(path, "g1")
+    # the store is purged at most every RESULT_STORE_PURGE_INTERVAL seconds
+    assert store.mget([key]) != [None]
+    clock.now += retrieval.RESULT_STORE_PURGE_INTERVAL
+    store = get_disk_result_store(path, "g1")
+    assert store.mget([key]) == [None]
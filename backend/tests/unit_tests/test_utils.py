@@ -0,0 +1,88 @@
+from langchain_core.documents import Document
+
+from backend.utils import (
+    PROVENANCE_KEY,
+    DocumentChannel,
+    DocumentList,
+    reduce_docs,
+    with_provenance,
+)
+
+
+def chunks(*ids: int) -> list[Document]:
+    return [Document(page_content=f"Chunk {i}", metadata={"uuid": str(i)}) for i in ids]
+
+
+def provenance(docs: list[Document]) -> dict[str, list[str]]:
+    return {
+        doc.metadata["uuid"]: [p["query"] for p in doc.metadata[PROVENANCE_KEY]]
+        for doc in docs
+    }
+
+
+def test_with_provenance_tags_copies_with_query_and_rank() -> None:
+    docs = chunks(1, 2)
+    tagged = with_provenance(docs, "a")
+    assert [doc.metadata[PROVENANCE_KEY] for doc in tagged] == [
+        [{"query": "a", "rank": 1}],
+        [{"query": "a", "rank": 2}],
+    ]
+    assert PROVENANCE_KEY not in docs[0].metadata
+
+
+def test_reduce_docs_merges_by_uuid() -> None:
+    first = reduce_docs([], with_provenance(chunks(1, 2), "a"))
+    merged = reduce_docs(first, with_provenance(chunks(3, 1), "b"))
+    assert isinstance(merged, DocumentList)
+    # known documents keep their position and gain the new provenance
+    assert provenance(merged) == {"1": ["a", "b"], "2": ["a"], "3": ["b"]}
+    assert [doc.metadata["uuid"] for doc in merged] == ["1", "2", "3"]
+    assert merged[0].metadata[PROVENANCE_KEY][1] == {"query": "b", "rank": 2}
+    # the existing list is never changed
+    assert provenance(first) == {"1": ["a"], "2": ["a"]}
+
+
+def test_reduce_docs_merges_into_plain_and_restored_lists() -> None:
+    restored = list(reduce_docs([], with_provenance(chunks(1), "a")))
+    merged = reduce_docs(restored, with_provenance(chunks(1, 2), "b"))
+    assert provenance(merged) == {"1": ["a", "b"], "2": ["b"]}
+    assert len(restored) == 1
+    # a list derived from an older list gets its own index
+    older = reduce_docs(restored, with_provenance(chunks(3), "c"))
+    assert [doc.metadata["uuid"] for doc in older] == ["1", "3"]
+    assert [doc.metadata["uuid"] for doc in reduce_docs(merged, chunks(3))] == [
+        "1",
+        "2",
+        "3",
+    ]
+
+
+def test_reduce_docs_converts_inputs_and_deletes() -> None:
+    docs = reduce_docs(None, ["some text", {"page_content": "more text"}])
+    assert [doc.page_content for doc in docs] == ["some text", "more text"]
+    assert all(doc.metadata["uuid"] for doc in docs)
+    assert len(reduce_docs(docs, "a string")) == 3
+    assert reduce_docs(docs, "delete") == []
+
+
+def test_channel_merges_all_updates_of_a_step() -> None:
+    channel = DocumentChannel(list)
+    channel.update(
+        [with_provenance(chunks(1, 2), "a"), with_provenance(chunks(2, 3), "b")]
+    )
+    assert provenance(channel.get()) == {"1": ["a"], "2": ["a", "b"], "3": ["b"]}
+    channel.update(["delete", with_provenance(chunks(4), "c")])
+    assert provenance(channel.get()) == {"4": ["c"]}
+
+
+def test_channel_copies_share_no_merges() -> None:
+    # LangGraph evaluates conditional edges on a copy of the channel, which
+    # shares its value, and then applies the same update to the channel
+    channel = DocumentChannel(list)
+    channel.update([with_provenance(chunks(1), "a")])
+    published = channel.get()
+    update = [with_provenance(chunks(1, 2), "b")]
+    channel.copy().update(update)
+    channel.update(update)
+    assert provenance(published) == {"1": ["a"]}
+    assert provenance(channel.get()) == {"1": ["a", "b"], "2": ["b"]}
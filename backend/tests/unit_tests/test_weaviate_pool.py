@@ -0,0 +1,105 @@
+import asyncio
+import threading
+
+import pytest
+
+from backend.weaviate_pool import WeaviateClientPool
+
+
+class FakeClient:
+    """Stands in for an async Weaviate client, which only works on its own loop."""
+
+    def __init__(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.ready = True
+        self.closed = False
+
+    async def is_ready(self) -> bool:
+        assert asyncio.get_running_loop() is self.loop
+        return self.ready
+
+    async def close(self) -> None:
+        assert asyncio.get_running_loop() is self.loop
+        self.closed = True
+
+
+class FakeConnect:
+    def __init__(self) -> None:
+        self.clients: list[FakeClient] = []
+
+    async def __call__(self) -> FakeClient:
+        self.clients.append(FakeClient())
+        return self.clients[-1]
+
+
+async def borrow(pool: WeaviateClientPool) -> FakeClient:
+    async with pool.connection() as client:
+        return client
+
+
+def test_returned_clients_are_reused() -> None:
+    connect = FakeConnect()
+    pool = WeaviateClientPool(connect, max_idle=1)
+
+    async def main() -> None:
+        first = await borrow(pool)
+        assert await borrow(pool) is first
+        async with pool.connection() as a, pool.connection() as b:
+            assert a is first and b is not first
+        # only one client is kept idle: b, which was returned first
+        assert first.closed and not b.closed
+        await pool.close()
+        assert b.closed
+        with pytest.raises(RuntimeError):
+            await borrow(pool)
+
+    asyncio.run(main())
+
+
+def test_unhealthy_clients_are_replaced() -> None:
+    connect = FakeConnect()
+    pool = WeaviateClientPool(connect, health_check_interval=0.0)
+
+    async def main() -> None:
+        first = await borrow(pool)
+        first.ready = False
+        second = await borrow(pool)
+        assert second is not first and first.closed
+        with pytest.raises(ValueError):
+            async with pool.connection() as client:
+                client.ready = False
+                raise ValueError
+        assert client.closed
+
+    asyncio.run(main())
+
+
+def test_idle_clients_are_closed_on_their_loop_when_the_loop_changes() -> None:
+    connect = FakeConnect()
+    pool = WeaviateClientPool(connect)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+    try:
+        first = asyncio.run_coroutine_threadsafe(borrow(pool), loop).result()
+        second = asyncio.run(borrow(pool))
+        assert second is not first
+        # the close was scheduled on the first loop, before this
+        asyncio.run_coroutine_threadsafe(asyncio.sleep(0), loop).result()
+        assert first.closed
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+def test_idle_clients_of_a_stopped_loop_are_closed() -> None:
+    connect = FakeConnect()
+    pool = WeaviateClientPool(connect)
+    loop = asyncio.new_event_loop()
+    try:
+        client = loop.run_until_complete(borrow(pool))
+        pool.close_idle_elsewhere()
+        assert client.closed
+    finally:
+        loop.close()
@@ -1,19 +1,25 @@
 """Shared utility functions used in the project.
 
 Functions:
+    format_doc: Convert a document to an xml-formatted string.
     format_docs: Convert documents to an xml-formatted string.
-    load_chat_model: Load a chat model from a model name.
+    load_chat_model: Load a chat model from a model name, reusing loaded models.
+    reduce_docs: Merge retrieved documents into the state, by uuid.
 """
 
 import uuid
-from typing import Any, Literal, Optional, Union
+from typing import Any, Literal, Optional, Sequence, Union
 
 from langchain.chat_models import init_chat_model
 from langchain_core.documents import Document
 from langchain_core.language_models import BaseChatModel
+from langgraph.channels.binop import BinaryOperatorAggregate
 
+PROVENANCE_KEY = "provenance"
+"""Metadata key listing the queries that retrieved a document, with its rank for each."""
 
-def _format_doc(doc: Document) -> str:
+
+def format_doc(doc: Document) -> str:
     """Format a single document as XML.
 
     Args:
@@ -23,7 +29,7 @@ def _format_doc(doc: Document) -> str:
         str: The formatted document as an XML string.
     """
     metadata = doc.metadata or {}
-    meta = "".join(f" {k}={v!r}" for k, v in metadata.items())
+    meta = "".join(f" {k}={v!r}" for k, v in metadata.items() if k != PROVENANCE_KEY)
     if meta:
         meta = f" {meta}"
 
@@ -58,17 +64,26 @@ def format_docs(docs: Optional[list[Document]]) -> str:
     """
     if not docs:
         return "<documents></documents>"
-    formatted = "\n".join(_format_doc(doc) for doc in docs)
+    formatted = "\n".join(format_doc(doc) for doc in docs)
     return f"""<documents>
 {formatted}
 </documents>"""
 
 
-def load_chat_model(fully_specified_name: str) -> BaseChatModel:
+_chat_models: dict[tuple[str, str, tuple[tuple[str, Any], ...]], BaseChatModel] = {}
+
+
+def load_chat_model(fully_specified_name: str, **kwargs: Any) -> BaseChatModel:
     """Load a chat model from a fully specified name.
 
+    Models are cached by provider, model and keyword arguments, so every
+    node of every run shares one instance per model, together with its HTTP
+    clients and their connection pools. Chat models are stateless between
+    calls, so sharing them between concurrent runs is safe.
+
     Args:
         fully_specified_name (str): String in the format 'provider/model'.
+        **kwargs: Extra arguments for the model, overriding the defaults.
     """
     if "/" in fully_specified_name:
         provider, model = fully_specified_name.split("/", maxsplit=1)
@@ -76,10 +91,102 @@ def load_chat_model(fully_specified_name: str) -> BaseChatModel:
         provider = ""
         model = fully_specified_name
 
-    model_kwargs = {"temperature": 0}
+    model_kwargs: dict[str, Any] = {"temperature": 0}
     if provider == "google_genai":
         model_kwargs["convert_system_message_to_human"] = True
-    return init_chat_model(model, model_provider=provider, **model_kwargs)
+    model_kwargs.update(kwargs)
+    key = (provider, model, tuple(sorted(model_kwargs.items())))
+    if key not in _chat_models:
+        _chat_models[key] = init_chat_model(
+            model, model_provider=provider, **model_kwargs
+        )
+    return _chat_models[key]
+
+
+def with_provenance(docs: list[Document], query: str) -> list[Document]:
+    """Record in each document's metadata that `query` retrieved it, and at which rank.
+
+    Args:
+        docs (list[Document]): The documents retrieved for `query`, best first.
+        query (str): The search query.
+
+    Returns:
+        list[Document]: Shallow copies of the documents with a 'provenance' entry, ranks starting at 1.
+    """
+    return [
+        Document(
+            id=doc.id,
+            page_content=doc.page_content,
+            metadata={**doc.metadata, PROVENANCE_KEY: [{"query": query, "rank": rank}]},
+        )
+        for rank, doc in enumerate(docs, start=1)
+    ]
+
+
+class _DocumentIndex:
+    """Positions of document uuids, shared by a DocumentList and the lists derived from it."""
+
+    __slots__ = ("positions", "size")
+
+    def __init__(self, docs: list[Document]) -> None:
+        self.positions: dict[str, int] = {}
+        for i, doc in enumerate(docs):
+            self.positions.setdefault(doc.metadata.get("uuid"), i)
+        self.size = len(docs)
+
+
+class DocumentList(list[Document]):
+    """A list of documents that carries an index of their uuids.
+
+    Merges only ever append, so a document keeps its position in every list
+    derived from this one, and the index is extended in place instead of
+    being rebuilt. Lists it was derived from stay valid, because their
+    documents are a prefix of the index. The index is not serialized; a list
+    restored from a checkpoint, or one that is not the latest derived from
+    its index, gets a new index on its next merge.
+    """
+
+    __slots__ = ("_index",)
+
+    def index_for_merge(self) -> _DocumentIndex:
+        """Return the uuid index of this list, rebuilding it if it belongs to another list."""
+        index = getattr(self, "_index", None)
+        if index is None or index.size != len(self):
+            index = _DocumentIndex(self)
+        self._index = index
+        return index
+
+
+def _as_document(item: Union[Document, dict[str, Any], str]) -> Document:
+    if isinstance(item, str):
+        return Document(page_content=item, metadata={"uuid": str(uuid.uuid4())})
+    if isinstance(item, dict):
+        metadata = item.get("metadata", {})
+        return Document(
+            **item,
+            metadata={**metadata, "uuid": metadata.get("uuid", str(uuid.uuid4()))},
+        )
+    if item.metadata.get("uuid") is None:
+        return Document(
+            id=item.id,
+            page_content=item.page_content,
+            metadata={**item.metadata, "uuid": str(uuid.uuid4())},
+        )
+    return item
+
+
+def _merge_provenance(existing: Document, new: Document) -> Document:
+    provenance = new.metadata.get(PROVENANCE_KEY)
+    if not provenance:
+        return existing
+    return Document(
+        id=existing.id,
+        page_content=existing.page_content,
+        metadata={
+            **existing.metadata,
+            PROVENANCE_KEY: existing.metadata.get(PROVENANCE_KEY, []) + provenance,
+        },
+    )
 
 
 def reduce_docs(
@@ -95,52 +202,108 @@ def reduce_docs(
     """Reduce and process documents based on the input type.
 
     This function handles various input types and converts them into a sequence of Document objects.
-    It also combines existing documents with the new one based on the document ID.
+    It also combines existing documents with the new one based on the document ID. A document
+    that is already present keeps its position, and its provenance is extended with the new one's.
+
+    The result is a DocumentList, so that merging a batch costs one copy of the list
+    plus the work for the new documents, rather than rebuilding the set of known uuids.
+    `existing` is never changed, since LangGraph may share it; `DocumentChannel` saves
+    the copy for all but the first update of a step. Documents without a uuid get one
+    on a shallow copy.
 
     Args:
         existing (Optional[Sequence[Document]]): The existing docs in the state, if any.
         new (Union[Sequence[Document], Sequence[dict[str, Any]], Sequence[str], str, Literal["delete"]]):
             The new input to process. Can be a sequence of Documents, dictionaries, strings, or a single string.
     """
+    if new == "delete":
+        return DocumentList()
+
+    if isinstance(existing, DocumentList):
+        # the copy shares the index, which stays valid for `existing`
+        index = existing.index_for_merge()
+        docs = DocumentList(existing)
+        docs._index = index
+    else:
+        docs = DocumentList(existing or [])
+    return _merge_docs(docs, new)
+
+
+def _merge_docs(
+    docs: DocumentList,
+    new: Union[list[Document], list[dict[str, Any]], list[str], str],
+) -> DocumentList:
+    """Merge new documents into `docs` in place, as `reduce_docs` does into a copy."""
+    index = docs.index_for_merge()
+    for item in [new] if isinstance(new, str) else new:
+        doc = _as_document(item)
+        item_id = doc.metadata["uuid"]
+        position = index.positions.get(item_id)
+        if position is None:
+            index.positions[item_id] = len(docs)
+            docs.append(doc)
+        else:
+            docs[position] = _merge_provenance(docs[position], doc)
+    index.size = len(docs)
+    return docs
+
+
+class DocumentChannel(BinaryOperatorAggregate[list[Document]]):
+    """A state channel that merges documents like `reduce_docs`, copying the list once per step.
+
+    `reduce_docs` merges into a copy, because the list it is given may be
+    shared: LangGraph hands a channel's value to the copies it makes of the
+    channel, e.g. to evaluate conditional edges, and keeps it in the latest
+    checkpoint. A step that fans out to many researchers updates the channel
+    with all of their documents at once, so this channel copies the list for
+    the first update of the step and merges the others into that copy in
+    place.
+
+    Use it as `Annotated[list[Document], DocumentChannel]`.
+    """
+
+    def __init__(self, typ: Any, operator: Any = reduce_docs) -> None:
+        super().__init__(typ, operator)
+
+    def update(self, values: Sequence[Any]) -> bool:
+        if not values:
+            return False
+        docs: Optional[DocumentList] = None
+        for value in values:
+            if docs is None or value == "delete":
+                docs = reduce_docs(docs if docs is not None else self.value, value)
+            else:
+                _merge_docs(docs, value)
+        self.value = docs
+        return True
+
+
+def document_ranking(docs: list[Document]) -> list[str]:
+    """Return the uuids of a query's retrieved documents, in rank order."""
+    return [doc.metadata["uuid"] for doc in docs if "uuid" in doc.metadata]
+
+
+def reduce_rankings(
+    existing: Optional[list[list[str]]],
+    new: Union[list[list[str]], Literal["delete"]],
+) -> list[list[str]]:
+    """Append per-query rankings of document uuids, or clear them on "delete".
+
+    Args:
+        existing (Optional[list[list[str]]]): The rankings in the state, if any.
+        new (Union[list[list[str]], Literal["delete"]]): The rankings to add, one list of
+            uuids per query, best first, or "delete" to clear them.
+    """
     if new == "delete":
         return []
+    return (existing or []) + new
 
-    existing_list = list(existing) if existing else []
-    if isinstance(new, str):
-        return existing_list + [
-            Document(page_content=new, metadata={"uuid": str(uuid.uuid4())})
-        ]
-
-    new_list = []
-    if isinstance(new, list):
-        existing_ids = set(doc.metadata.get("uuid") for doc in existing_list)
-        for item in new:
-            if isinstance(item, str):
-                item_id = str(uuid.uuid4())
-                new_list.append(Document(page_content=item, metadata={"uuid": item_id}))
-                existing_ids.add(item_id)
-
-            elif isinstance(item, dict):
-                metadata = item.get("metadata", {})
-                item_id = metadata.get("uuid", str(uuid.uuid4()))
-
-                if item_id not in existing_ids:
-                    new_list.append(
-                        Document(**item, metadata={**metadata, "uuid": item_id})
-                    )
-                    existing_ids.add(item_id)
-
-            elif isinstance(item, Document):
-                item_id = item.metadata.get("uuid")
-                if item_id is None:
-                    item_id = str(uuid.uuid4())
-                    new_item = item.copy(deep=True)
-                    new_item.metadata["uuid"] = item_id
-                else:
-                    new_item = item
-
-                if item_id not in existing_ids:
-                    new_list.append(new_item)
-                    existing_ids.add(item_id)
-
-    return existing_list + new_list
+
+def reduce_queries(
+    existing: Optional[list[str]],
+    new: Union[list[str], Literal["delete"]],
+) -> list[str]:
+    """Append search queries, or clear them on "delete"."""
+    if new == "delete":
+        return []
+    return (existing or []) + new
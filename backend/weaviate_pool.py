@@ -0,0 +1,228 @@
+"""Process-wide pool of async Weaviate clients.
+
+Opening a Weaviate Cloud connection costs a TLS handshake plus gRPC channel
+setup, which is far more expensive than a single search. Retrievers borrow
+clients from the shared pool returned by `get_client_pool` instead of
+connecting for every query. The pool is closed when the process exits.
+"""
+
+import asyncio
+import atexit
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+import weaviate
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_IDLE = 8
+DEFAULT_HEALTH_CHECK_INTERVAL = 30.0
+EXIT_CLOSE_TIMEOUT = 5.0
+
+
+async def connect_to_weaviate_cloud() -> weaviate.WeaviateAsyncClient:
+    """Open a new async client for the cluster configured in the environment."""
+    client = weaviate.use_async_with_weaviate_cloud(
+        cluster_url=os.environ["WEAVIATE_URL"],
+        auth_credentials=weaviate.classes.init.Auth.api_key(
+            os.environ.get("WEAVIATE_API_KEY", "not_provided")
+        ),
+        skip_init_checks=True,
+    )
+    await client.connect()
+    return client
+
+
+class WeaviateClientPool:
+    """A pool of connected async Weaviate clients.
+
+    Borrowing never waits for another borrower: when every pooled client is in
+    use a new one is opened, and on return it is kept only if fewer than
+    `max_idle` clients are idle. Clients that sat idle for longer than
+    `health_check_interval` seconds are checked before being handed out, and
+    clients that fail a health check are closed and replaced.
+
+    Async clients are bound to the event loop they were connected on, so if
+    the pool is used from a different loop, its idle clients are closed on
+    their own loop and new ones are connected.
+
+    Args:
+        connect (Callable[[], Awaitable[weaviate.WeaviateAsyncClient]]): Factory
+            that opens a new, connected client.
+        max_idle (int): Maximum number of idle clients kept open. Use 0 to disable pooling.
+        health_check_interval (float): Seconds a client may sit idle before it is
+            checked again on borrow.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[
+            [], Awaitable[weaviate.WeaviateAsyncClient]
+        ] = connect_to_weaviate_cloud,
+        *,
+        max_idle: int = DEFAULT_MAX_IDLE,
+        health_check_interval: float = DEFAULT_HEALTH_CHECK_INTERVAL,
+    ) -> None:
+        self._connect = connect
+        self._max_idle = max_idle
+        self._health_check_interval = health_check_interval
+        # (client, monotonic time it was last known to be healthy)
+        self._idle: list[tuple[weaviate.WeaviateAsyncClient, float]] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closed = False
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[weaviate.WeaviateAsyncClient]:
+        """Borrow a client for the duration of the `async with` block.
+
+        If the block raises, the client is health-checked before it goes back
+        into the pool so that a dropped connection is not handed out again.
+        """
+        client = await self._acquire()
+        healthy = True
+        try:
+            yield client
+        except Exception:
+            healthy = await self._is_healthy(client)
+            raise
+        finally:
+            await self._release(client, healthy)
+
+    async def close(self) -> None:
+        """Close all idle clients and stop pooling returned ones."""
+        self._closed = True
+        if self._loop is not asyncio.get_running_loop():
+            self.close_idle_elsewhere()
+            return
+        idle, self._idle = self._idle, []
+        await self._discard_all([client for client, _ in idle])
+
+    def close_idle_elsewhere(self, timeout: Optional[float] = None) -> None:
+        """Close the idle clients from outside the event loop they were connected on.
+
+        Clients can only be closed on their own loop. If it is running in
+        another thread, they are closed there; if it is stopped, it is run
+        until they are closed. If it is closed, or another loop is running in
+        this thread, they are dropped and their sockets are closed when they
+        are garbage collected.
+
+        Args:
+            timeout (Optional[float]): Seconds to wait for a loop running in another
+                thread to close the clients, or None not to wait.
+        """
+        idle, self._idle = self._idle, []
+        loop = self._loop
+        if not idle or loop is None or loop.is_closed():
+            return
+        clients = [client for client, _ in idle]
+        if loop.is_running():
+            future = asyncio.run_coroutine_threadsafe(self._discard_all(clients), loop)
+            if timeout is not None:
+                try:
+                    future.result(timeout)
+                except Exception:
+                    logger.warning("Timed out closing idle Weaviate clients")
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            loop.run_until_complete(self._discard_all(clients))
+        else:
+            logger.warning(
+                f"Dropping {len(clients)} idle Weaviate clients of a stopped event loop"
+            )
+
+    async def _acquire(self) -> weaviate.WeaviateAsyncClient:
+        if self._closed:
+            raise RuntimeError("The Weaviate client pool has been closed.")
+
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # clients from another loop can't be used (or closed) from this one
+            self.close_idle_elsewhere()
+            self._loop = loop
+
+        if not self._idle:
+            return await self._connect()
+
+        client, last_healthy = self._idle.pop()
+        if time.monotonic() - last_healthy > self._health_check_interval:
+            if not await self._is_healthy(client):
+                logger.warning("Discarding unhealthy Weaviate client, reconnecting")
+                await self._discard(client)
+                return await self._connect()
+        return client
+
+    async def _release(
+        self, client: weaviate.WeaviateAsyncClient, healthy: bool
+    ) -> None:
+        if (
+            healthy
+            and not self._closed
+            and self._loop is asyncio.get_running_loop()
+            and len(self._idle) < self._max_idle
+        ):
+            self._idle.append((client, time.monotonic()))
+        else:
+            await self._discard(client)
+
+    @staticmethod
+    async def _is_healthy(client: weaviate.WeaviateAsyncClient) -> bool:
+        try:
+            return await client.is_ready()
+        except Exception:
+            return False
+
+    @staticmethod
+    async def _discard(client: weaviate.WeaviateAsyncClient) -> None:
+        try:
+            await client.close()
+        except Exception:
+            logger.exception("Failed to close Weaviate client")
+
+    @classmethod
+    async def _discard_all(cls, clients: list[weaviate.WeaviateAsyncClient]) -> None:
+        await asyncio.gather(*(cls._discard(client) for client in clients))
+
+
+_pool: Optional[WeaviateClientPool] = None
+
+
+def get_client_pool() -> WeaviateClientPool:
+    """Return the process-wide client pool, creating it on first use.
+
+    The pool size can be tuned with the `WEAVIATE_POOL_SIZE` environment
+    variable. The pool is closed when the process exits.
+    """
+    global _pool
+    if _pool is None:
+        _pool = WeaviateClientPool(
+            max_idle=int(os.environ.get("WEAVIATE_POOL_SIZE", DEFAULT_MAX_IDLE))
+        )
+    return _pool
+
+
+@atexit.register
+def _close_client_pool_at_exit() -> None:
+    # the serving loop may still run in another thread, be stopped, or be closed
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        pool._closed = True
+        pool.close_idle_elsewhere(timeout=EXIT_CLOSE_TIMEOUT)
+
+
+async def close_client_pool() -> None:
+    """Close the process-wide client pool, if it was created.
+
+    Await this on the serving event loop during shutdown so that pooled
+    connections are closed before the loop stops. Otherwise, the pool is
+    closed when the process exits.
+    """
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        await pool.close()
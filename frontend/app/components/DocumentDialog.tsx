@@ -15,6 +15,9 @@ interface DocumentDialogProps {
 }
 
 export function DocumentDialog(props: DocumentDialogProps) {
+  // research results carry references to stored documents, with a preview
+  // of their text
+  const isPreview = Boolean(props.document.metadata.content_ref);
   const trigger = props.trigger || (
     <TooltipIconButton
       tooltip={props.document.metadata.title}
@@ -55,7 +58,14 @@ export function DocumentDialog(props: DocumentDialogProps) {
         <div className="mt-2 overflow-hidden">
           <p className="whitespace-pre-wrap text-gray-200 break-words overflow-wrap-anywhere">
             {props.document.page_content}
+            {isPreview && "…"}
           </p>
+          {isPreview && (
+            <p className="mt-2 text-sm text-gray-400">
+              This is a preview of the document. Open the source for the full
+              text.
+            </p>
+          )}
         </div>
       </DialogContent>
     </Dialog>
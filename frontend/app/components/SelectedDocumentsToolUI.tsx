@@ -15,11 +15,13 @@ export const useSelectedDocumentsUI = () =>
         return null;
       }
 
-      // Filter out duplicate documents
+      // Filter out duplicate documents, by their index uuid if they have one
+      const documentKey = (document: Document) =>
+        document.metadata.uuid ?? document.page_content;
       const uniqueDocuments = (input.args.documents as Document[]).reduce(
         (acc, current) => {
           const x = acc.find(
-            (item) => item.page_content === current.page_content,
+            (item) => documentKey(item) === documentKey(current),
           );
           if (!x) {
             return acc.concat([current]);
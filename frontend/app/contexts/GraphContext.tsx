@@ -17,7 +17,13 @@ import { useThreads } from "../hooks/useThreads";
 import { ModelOptions } from "../types";
 import { useRuns } from "../hooks/useRuns";
 import { useUser } from "../hooks/useUser";
-import { addDocumentLinks, createClient, nodeToStep } from "./utils";
+import {
+  addDocumentLinks,
+  createClient,
+  nodeToStep,
+  RESEARCH_NODES,
+  eventNode,
+} from "./utils";
 import { Thread } from "@langchain/langgraph-sdk";
 import { useQueryState } from "nuqs";
 
@@ -174,12 +180,12 @@ export function GraphProvider({ children }: { children: ReactNode }) {
         }
 
         if (chunk.data.event === "on_chain_start") {
-          const node = chunk?.data?.metadata?.langgraph_node;
+          const node = eventNode(chunk.data);
           if (
             [
               "analyze_and_route_query",
               "create_research_plan",
-              "conduct_research",
+              ...RESEARCH_NODES,
               "respond",
             ].includes(node)
           ) {
@@ -222,7 +228,7 @@ export function GraphProvider({ children }: { children: ReactNode }) {
                   {
                     name: "selected_documents",
                     args: {
-                      documents: chunk.data.data.input.documents,
+                      documents: chunk.data.data.input.context_documents,
                     },
                   },
                 ],
@@ -342,11 +348,20 @@ export function GraphProvider({ children }: { children: ReactNode }) {
 
                     let updatedToolCall;
                     if (existingToolCalls[0].name === "generating_questions") {
-                      // Update existing tool call
+                      // Update existing tool call. In 'streaming' research
+                      // mode, steps are researched while the plan streams, so
+                      // keep the results already attached to them.
+                      const previousQuestions: Record<string, any>[] =
+                        existingToolCalls[0].args.questions || [];
                       updatedToolCall = {
                         ...existingToolCalls[0],
                         args: {
-                          questions,
+                          questions: questions.map((q) => ({
+                            ...previousQuestions.find(
+                              (previous) => previous.question === q.question,
+                            ),
+                            ...q,
+                          })),
                         },
                       };
                     } else {
@@ -427,7 +442,7 @@ export function GraphProvider({ children }: { children: ReactNode }) {
 
         if (chunk.data.event === "on_chain_end") {
           if (
-            chunk.data.metadata.langgraph_node === "conduct_research" &&
+            RESEARCH_NODES.includes(eventNode(chunk.data)) &&
             chunk.data.data?.output &&
             typeof chunk.data.data.output === "object" &&
             "question" in chunk.data.data.output
@@ -528,7 +543,8 @@ export function GraphProvider({ children }: { children: ReactNode }) {
           }
 
           if (chunk.data.metadata.langgraph_node === "respond") {
-            const inputDocuments = chunk.data.data.input.documents;
+            // the answer cites the documents by their position in the context
+            const inputDocuments = chunk.data.data.input.context_documents;
             const message = chunk.data.data.output.messages[0];
             setMessages((prevMessages) => {
               const existingMessageIndex = prevMessages.findIndex(
@@ -550,6 +566,62 @@ export function GraphProvider({ children }: { children: ReactNode }) {
               }
             });
           }
+
+          if (
+            chunk.data.metadata.langgraph_node === "check_answer_cache" &&
+            chunk.data.data?.output?.answer_cache_hit
+          ) {
+            // The answer was served from the answer cache, so there is no
+            // research and no response to stream. Show it like a response.
+            const documents = chunk.data.data.output.context_documents || [];
+            const message = chunk.data.data.output.messages[0];
+            setMessages((prevMessages) => {
+              const selectedDocumentsAIMessage = new AIMessage({
+                content: "",
+                tool_calls: [
+                  {
+                    name: "selected_documents",
+                    args: { documents },
+                  },
+                ],
+              });
+              const answerHeaderToolMsg = new AIMessage({
+                content: "",
+                tool_calls: [
+                  {
+                    name: "answer_header",
+                    args: {},
+                  },
+                ],
+              });
+              const newMessageWithLinks = new AIMessage({
+                ...message,
+                id: message.id ?? uuidv4(),
+                content: addDocumentLinks(message.content, documents),
+              });
+              return [
+                ...prevMessages.map((msg) =>
+                  msg.id === progressAIMessageId
+                    ? new AIMessage({
+                        id: progressAIMessageId,
+                        content: "",
+                        tool_calls: [
+                          {
+                            name: "progress",
+                            args: {
+                              step: 4,
+                            },
+                          },
+                        ],
+                      })
+                    : msg,
+                ),
+                ...(documents.length ? [selectedDocumentsAIMessage] : []),
+                answerHeaderToolMsg,
+                newMessageWithLinks,
+              ];
+            });
+          }
         }
       }
     } catch (e) {
@@ -633,7 +705,8 @@ export function GraphProvider({ children }: { children: ReactNode }) {
                 ],
               })
             : undefined;
-          const selectedDocumentsAIMessage = threadValues.documents?.length
+          const selectedDocumentsAIMessage = threadValues.context_documents
+            ?.length
             ? new AIMessage({
                 content: "",
                 id: uuidv4(),
@@ -641,7 +714,7 @@ export function GraphProvider({ children }: { children: ReactNode }) {
                   {
                     name: "selected_documents",
                     args: {
-                      documents: threadValues.documents,
+                      documents: threadValues.context_documents,
                     },
                   },
                 ],
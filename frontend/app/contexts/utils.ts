@@ -7,6 +7,22 @@ export function createClient() {
   });
 }
 
+// nodes that research the steps of the plan: one step at a time in
+// 'sequential' research mode, one node per step in 'parallel' mode
+export const RESEARCH_NODES = ["conduct_research", "conduct_research_step"];
+
+// Return the graph node an event belongs to. In 'streaming' research mode,
+// create_research_plan runs the researcher graph for each step while the
+// plan is still streaming; those runs are reported as conduct_research, as
+// in 'sequential' mode.
+export function eventNode(event: Record<string, any>): string {
+  const node = event?.metadata?.langgraph_node;
+  if (node === "create_research_plan" && event.name === "ResearcherGraph") {
+    return "conduct_research";
+  }
+  return node;
+}
+
 export function nodeToStep(node: string) {
   switch (node) {
     case "analyze_and_route_query":
@@ -14,6 +30,7 @@ export function nodeToStep(node: string) {
     case "create_research_plan":
       return 1;
     case "conduct_research":
+    case "conduct_research_step":
       return 2;
     case "respond":
       return 3;